@@ -3,397 +3,590 @@
 """
 Created on Wed Jan 26 09:33:39 2022
 @author: scotwheeler
+
+Market participation calculations for flexibility auctions.
+
+The asset, cost and market parameters are held in a MarketParams object that
+is passed to each function. Any parameter can be a numpy array, and the
+functions broadcast over them, so a sweep of many market configurations is a
+single call e.g.
+
+    params = MarketParams.grid(tcv=np.linspace(0.1, 0.5, 41),
+                               exp_util_hrs=np.arange(0.0, 21.0))
+    avail, util = maxout_tcv(params, params.exp_util_hrs, 0.5)
+
+Importing this module has no side effects and does not import any plotting
+libraries, these are imported by the plotting functions when they are used.
 """
 
-__version__ = '0.2.0'
+__version__ = '0.3.0'
 
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.ticker as ticker
-import seaborn as sns
 
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import plotly.io as pio
-pio.renderers.default = 'browser'
+# Columns of the cost matrix returned by calc_costs
+COST_COLUMNS = ["Utilisation hrs",
+                "energy (kWh)",
+                "Availability bid (£/kW/h)",
+                "Utilisation bid (£/kWh)",
+                "Marginal cost (£)",
+                "Auction fixed cost (£)",
+                "Total service cost (£)",
+                "Revenue (£)",
+                "Profit (£)",
+                "TCV (£/kWh)"]
 
-np.seterr(divide='ignore') 
+# Bid weightings of the profit matrices
+WEIGHT_RANGE = np.linspace(0.0, 1.0, 11)
 
-# =============================================================================
-# Inputs
-# =============================================================================
-#%% asset parameters
-asset_type = 'storage'      # storage/gen/dsr
-cap = 16.0                  # kW
-person_rate = 15.0          # £/hour
-
-
-#%% costs
-# fixed costs
-fixed_person_hrs = 10/60    # number of hrs for a person to enter an auction (inc. forecasting of availability)
-
-# other fixed costs to be inc. e.g. metering, data storage, installation etc
-other_fixed = 0.0
-
-# SRMC - marginal costs
-
-# not sure how to generalise DUOS charges as it depends on when the service is delivered vs when the asset recharges
-DUOS_event = 0.055          # £/kWh - DUOS during event
-DUOS_recharge = 0.006       # £/kWh - DUOS outside of event when 'recharge' scheduled
-energy_cost = 0.120         # £/kWh
-LCOS_battery = 0.03         # £/kWh - based on $400 / MWh and 10% of battery associated with flex.
-roundtrip_eff = 0.9
-util_person_hrs = 5/60      # number of hrs for a person to respond to a utilisation instruction (inc. asset dispatch, delivery and data upload)  
-other_SRMC = 0.0            # £/kWh
-
-#%% market parameters
-tot_avail_hrs = 20.0        # hours available in the service auction
-service_type = 'turn-up'    # the type of service
-tcv = 0.30                  # £/kWh
-avail_ceil = 0.045          # £/kW/h
-util_ceil = 0.30            # £/kWh
-exp_util_hrs = 6.0          # hrs - expected utilisation hours
-hrs_per_service_win = 4.0   # hrs per service window e.g. 4 if window is 3-7pm every day
-hrs_per_util = 1.0          # number of hrs in a single utilisation - this is hard to know and could vary between 1 and service window
 
 # =============================================================================
-# Calculations
+# Inputs
 # =============================================================================
-## fixed
-tot_fixed = ((fixed_person_hrs * person_rate)
-            + other_fixed)
-
-## marginal
-# marginal energy (kWh)
-if (asset_type == 'storage') and (service_type == "turn-up"):
-    energy_SRMC = (((1/roundtrip_eff) * energy_cost)    # additional energy due to roundtrip eff
-                   + (DUOS_recharge - DUOS_event)            # difference between DUOS rates  
-                   + LCOS_battery)                      # battery deg cost
-else:
-    raise Exception("Only 'storage' asset for 'turn_up' service programmed so far")
-
-# marginal person (£/kWh)
-person_SRMC = ((util_person_hrs * person_rate) / (cap * hrs_per_util))
+class MarketParams:
+    """
+    The asset, cost and market parameters of an auction. Every numerical
+    parameter can be a float or a numpy array, arrays are broadcast against
+    each other by the calculations.
 
-# tot marginal
-tot_SRMC = (energy_SRMC
-            + person_SRMC
-            + other_SRMC)
+    Parameters
+    ----------
+    asset_type : str
+        storage/gen/dsr
+    cap : float or np.ndarray
+        Capacity of the asset (kW).
+    person_rate : float or np.ndarray
+        Personnel rate (£/hour).
+    fixed_person_hrs : float or np.ndarray
+        Number of hrs for a person to enter an auction (inc. forecasting of
+        availability).
+    other_fixed : float or np.ndarray
+        Other fixed costs e.g. metering, data storage, installation etc (£).
+    DUOS_event : float or np.ndarray
+        DUOS during event (£/kWh). Not sure how to generalise DUOS charges as
+        it depends on when the service is delivered vs when the asset
+        recharges.
+    DUOS_recharge : float or np.ndarray
+        DUOS outside of event when 'recharge' scheduled (£/kWh).
+    energy_cost : float or np.ndarray
+        Energy cost (£/kWh).
+    LCOS_battery : float or np.ndarray
+        Battery degradation cost (£/kWh) - based on $400 / MWh and 10% of
+        battery associated with flex.
+    roundtrip_eff : float or np.ndarray
+        Roundtrip efficiency of the asset.
+    util_person_hrs : float or np.ndarray
+        Number of hrs for a person to respond to a utilisation instruction
+        (inc. asset dispatch, delivery and data upload).
+    other_SRMC : float or np.ndarray
+        Other marginal costs (£/kWh).
+    tot_avail_hrs : float or np.ndarray
+        Hours available in the service auction.
+    service_type : str
+        The type of service.
+    tcv : float or np.ndarray
+        Total contract value limit (£/kWh).
+    avail_ceil : float or np.ndarray
+        Availability bid ceiling (£/kW/h).
+    util_ceil : float or np.ndarray
+        Utilisation bid ceiling (£/kWh).
+    exp_util_hrs : float or np.ndarray
+        Expected utilisation hours.
+    hrs_per_service_win : float or np.ndarray
+        Hrs per service window e.g. 4 if window is 3-7pm every day.
+    hrs_per_util : float or np.ndarray
+        Number of hrs in a single utilisation - this is hard to know and
+        could vary between 1 and service window.
 
+    """
 
-def break_even():
+    def __init__(self, asset_type='storage', cap=16.0, person_rate=15.0,
+                 fixed_person_hrs=10/60, other_fixed=0.0, DUOS_event=0.055,
+                 DUOS_recharge=0.006, energy_cost=0.120, LCOS_battery=0.03,
+                 roundtrip_eff=0.9, util_person_hrs=5/60, other_SRMC=0.0,
+                 tot_avail_hrs=20.0, service_type='turn-up', tcv=0.30,
+                 avail_ceil=0.045, util_ceil=0.30, exp_util_hrs=6.0,
+                 hrs_per_service_win=4.0, hrs_per_util=1.0):
+
+        if (asset_type != 'storage') or (service_type != "turn-up"):
+            raise Exception("Only 'storage' asset for 'turn_up' service "
+                            "programmed so far")
+
+        #%% asset parameters
+        self.asset_type = asset_type
+        self.cap = np.asarray(cap, dtype=float)
+        self.person_rate = np.asarray(person_rate, dtype=float)
+
+        #%% costs
+        self.fixed_person_hrs = np.asarray(fixed_person_hrs, dtype=float)
+        self.other_fixed = np.asarray(other_fixed, dtype=float)
+        self.DUOS_event = np.asarray(DUOS_event, dtype=float)
+        self.DUOS_recharge = np.asarray(DUOS_recharge, dtype=float)
+        self.energy_cost = np.asarray(energy_cost, dtype=float)
+        self.LCOS_battery = np.asarray(LCOS_battery, dtype=float)
+        self.roundtrip_eff = np.asarray(roundtrip_eff, dtype=float)
+        self.util_person_hrs = np.asarray(util_person_hrs, dtype=float)
+        self.other_SRMC = np.asarray(other_SRMC, dtype=float)
+
+        #%% market parameters
+        self.tot_avail_hrs = np.asarray(tot_avail_hrs, dtype=float)
+        self.service_type = service_type
+        self.tcv = np.asarray(tcv, dtype=float)
+        self.avail_ceil = np.asarray(avail_ceil, dtype=float)
+        self.util_ceil = np.asarray(util_ceil, dtype=float)
+        self.exp_util_hrs = np.asarray(exp_util_hrs, dtype=float)
+        self.hrs_per_service_win = np.asarray(hrs_per_service_win,
+                                              dtype=float)
+        self.hrs_per_util = np.asarray(hrs_per_util, dtype=float)
+
+    @classmethod
+    def grid(cls, **params):
+        """
+        Creates the parameters of every combination of the given parameter
+        values, each parameter is placed on its own axis (in the order given)
+        so that the results of the calculations are an N-dimensional grid.
+
+        Parameters
+        ----------
+        **params : 1D array-like
+            The values of each parameter to sweep. Other parameters are left
+            at their defaults.
+
+        Returns
+        -------
+        MarketParams
+
+        """
+        n_axes = len(params)
+        grid_params = {}
+        for axis, (name, values) in enumerate(params.items()):
+            shape = [1] * n_axes
+            shape[axis] = -1
+            grid_params[name] = np.reshape(values, shape)
+
+        return cls(**grid_params)
+
+    @property
+    def shape(self):
+        """
+        The broadcast shape of the numerical parameters.
+        """
+        return np.broadcast_shapes(*[value.shape for value
+                                     in vars(self).values()
+                                     if isinstance(value, np.ndarray)])
+
+    # =========================================================================
+    # Calculations
+    # =========================================================================
+    ## fixed
+    @property
+    def tot_fixed(self):
+        return ((self.fixed_person_hrs * self.person_rate)
+                + self.other_fixed)
+
+    ## marginal
+    # marginal energy (£/kWh)
+    @property
+    def energy_SRMC(self):
+        return (((1/self.roundtrip_eff) * self.energy_cost)    # additional energy due to roundtrip eff
+                + (self.DUOS_recharge - self.DUOS_event)       # difference between DUOS rates
+                + self.LCOS_battery)                           # battery deg cost
+
+    # marginal person (£/kWh)
+    @property
+    def person_SRMC(self):
+        return ((self.util_person_hrs * self.person_rate)
+                / (self.cap * self.hrs_per_util))
+
+    # tot marginal
+    @property
+    def tot_SRMC(self):
+        return (self.energy_SRMC
+                + self.person_SRMC
+                + self.other_SRMC)
+
+
+def break_even(params):
     """
     Calculates the availability and utilisation bids such that an asset
     breaks even (i.e 0 profit) for any number of actual utilisation hours.
-    
+
     Fixed costs inform availability price
     SRMC inform utilisation price
-    
+
     This does not guarentee that the TCV will be low than the TCV limit, or
     that availability or utilisation bids will be under the respective
     ceiling prices.
 
+    Parameters
+    ----------
+    params : MarketParams
+        The market parameters.
+
     Returns
     -------
-    avail: float
+    avail: float or np.ndarray
         The availability bid
-        
-    util: float
+
+    util: float or np.ndarray
         The utilisation bid
 
     """
-    util = tot_SRMC
-    avail = tot_fixed / cap / tot_avail_hrs
-    
+    util = params.tot_SRMC
+    avail = params.tot_fixed / params.cap / params.tot_avail_hrs
+
     return avail, util
 
-def inde_maxTCV(exp_util_hrs):
+
+def inde_maxTCV(params, exp_util_hrs=None):
     """
     Determines the availability and utilisation bid that maximises the TCV for
     the expected number of hours, but ensures profit is independent of actual
     utilisation hours. This does not guarantee bids will be under the
     individual ceiling prices.
-    
+
     Parameters
     ----------
-    exp_util_hrs : float
-        The expected number of utilisation hours.
+    params : MarketParams
+        The market parameters.
+    exp_util_hrs : float or np.ndarray, optional
+        The expected number of utilisation hours. The default is
+        params.exp_util_hrs.
 
     Returns
     -------
-    Returns
-    -------
-    avail_bid : float
+    avail_bid : float or np.ndarray
         Availability bid.
-    util_bid : float
+    util_bid : float or np.ndarray
         Utilisation bid.
-    weight : float
+    weight : float or np.ndarray
         Corresponding bid weighting.
 
     """
-    util_bid = tot_SRMC
-    remaining_tcv = tcv - util_bid
-    weight = util_bid / tcv
-    avail_bid = ((remaining_tcv * exp_util_hrs * cap) 
-                 / cap 
-                 / tot_avail_hrs)
-    
+    if exp_util_hrs is None:
+        exp_util_hrs = params.exp_util_hrs
+
+    util_bid = params.tot_SRMC
+    remaining_tcv = params.tcv - util_bid
+    weight = util_bid / params.tcv
+    avail_bid = ((remaining_tcv * exp_util_hrs * params.cap)
+                 / params.cap
+                 / params.tot_avail_hrs)
+
     return avail_bid, util_bid, weight
 
-def calc_costs(cap, avail_bid, util_bid, fixed_cost, marginal_rate,
-               tot_hrs = tot_avail_hrs):
+
+def _hours_axis(params):
+    """
+    The actual utilisation hours (0 to the largest tot_avail_hrs) and the mask
+    of the hours within the tot_avail_hrs of each configuration.
+    """
+    util_hours = np.arange(0.0, params.tot_avail_hrs.max() + 1, 1.0)
+    valid = util_hours <= params.tot_avail_hrs[..., None]
+
+    return util_hours, valid
+
+
+def calc_costs(params, avail_bid, util_bid):
     """
     Calculates the costs matrix of participation, revenue and profit as a
-    function 
+    function of the actual utilisation hours.
+
+    The bids and parameters are broadcast against each other and the actual
+    utilisation hours are the last axis. When the configurations have
+    different tot_avail_hrs, the hours beyond the tot_avail_hrs of a
+    configuration are NaN.
 
     Parameters
     ----------
-    cap : float
-        Capacity of the asset.
-    avail_bid : float
+    params : MarketParams
+        The market parameters.
+    avail_bid : float or np.ndarray
         Availability bid to calculate costs.
-    util_bid : float
+    util_bid : float or np.ndarray
         Utilisation bid to calculate costs.
-    fixed_cost : float
-        The fixed costs of market participation
-    marginal_rate : float
-        The marginal (per kWh) cost of utilisation.
-    tot_hrs : float, optional
-        The total possible hours in the auctioned service. 
-        The default is the global parameter tot_avail_hrs.
 
     Returns
     -------
     cost_matrix : np.array
-        Numpy array used for plotting
-    
+        Numpy array of shape (10, *configurations, actual utilisation hours)
+        with the rows of COST_COLUMNS, used for plotting
+
     cost_df : pd.DataFrame
-        A dataframe version of the cost_matrix array
+        A dataframe version of the cost_matrix array. For more than one
+        configuration, the index is the configuration (flat index of the
+        broadcast shape)
 
     """
-    # create lists
-    util_hours = np.arange(0, (tot_hrs+1), 1.0)
-    #marginal_cost = [0] * len(util_hours)
-    #fixed_cost = [0] * len(util_hours)
-    #tot_cost = [0] * len(util_hours)
-    if isinstance(avail_bid, float):
-       avail_bids = [avail_bid] * len(util_hours)
-    elif isinstance(avail_bid,list): # if different bids can be entered into 1 auction in future
-        # should also check length is correct
-       avail_bids = avail_bid
-    else: raise Exception("Wrong avail bid format")
-    if isinstance(util_bid, float):
-       util_bids = [util_bid] * len(util_hours)
-    elif isinstance(avail_bid,list):
-        # should also check length is correct
-       util_bids = util_bid
-    else: raise Exception("Wrong util bid format")
-    #revenue = [0] * len(util_hours)
-    #profit = [0] * len(util_hours)
-    #tcv = [0] * len(util_hours)
-    
+    avail_bid = np.asarray(avail_bid, dtype=float)[..., None]
+    util_bid = np.asarray(util_bid, dtype=float)[..., None]
+    cap = params.cap[..., None]
+    tot_avail_hrs = params.tot_avail_hrs[..., None]
+    util_hours, valid = _hours_axis(params)
+
     energy = util_hours * cap
-    marginal_cost = marginal_rate * energy
-    fixed_cost = np.ones(util_hours.shape) * fixed_cost
+    marginal_cost = params.tot_SRMC[..., None] * energy
+    fixed_cost = params.tot_fixed[..., None] * np.ones(util_hours.shape)
     tot_cost = marginal_cost + fixed_cost
-    revenue = (util_bids * energy) + (avail_bid * cap * tot_avail_hrs)
+    revenue = (util_bid * energy) + (avail_bid * cap * tot_avail_hrs)
     profit = revenue - tot_cost
-    tcv = revenue / energy
-    
-    cost_matrix = np.array([util_hours, energy, avail_bids, util_bids,
-                            marginal_cost, fixed_cost, tot_cost, revenue,
-                            profit, tcv])
-    cost_df = pd.DataFrame(cost_matrix.T,
-                           columns=["Utilisation hrs",
-                                    "energy (kWh)",
-                                    "Availability bid (£/kW/h)",
-                                    "Utilisation bid (£/kWh)",
-                                    "Marginal cost (£)",
-                                    "Auction fixed cost (£)",
-                                    "Total service cost (£)",
-                                    "Revenue (£)",
-                                    "Profit (£)",
-                                    "TCV (£/kWh)"])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tcv = revenue / energy
+
+    cost_matrix = np.array(np.broadcast_arrays(util_hours, energy, avail_bid,
+                                               util_bid, marginal_cost,
+                                               fixed_cost, tot_cost, revenue,
+                                               profit, tcv, valid))
+    valid = cost_matrix[-1].astype(bool)
+    cost_matrix = np.where(valid, cost_matrix[:-1], np.nan)
+
+    # one row per configuration and valid actual utilisation hours
+    n_hours = cost_matrix.shape[-1]
+    flat_matrix = cost_matrix.reshape(len(COST_COLUMNS), -1, n_hours)
+    flat_valid = valid.reshape(-1, n_hours)
+    config = np.broadcast_to(np.arange(flat_valid.shape[0])[:, None],
+                             flat_valid.shape)
+    cost_df = pd.DataFrame(flat_matrix[:, flat_valid].T,
+                           columns=COST_COLUMNS)
+    if flat_valid.shape[0] > 1:
+        cost_df.index = pd.Index(config[flat_valid], name='Configuration')
+
     return cost_matrix, cost_df
 
-def maxout_tcv(exp_util_hrs, bid_weight):
+
+def calc_profit(params, avail_bid, util_bid):
+    """
+    Calculates only the profit row of calc_costs, without the memory of the
+    full cost matrix, for sweeps of many configurations.
+
+    Returns
+    -------
+    profit : np.ndarray
+        Array of shape (*configurations, actual utilisation hours), NaN for
+        the hours beyond the tot_avail_hrs of a configuration
+
+    """
+    avail_bid = np.asarray(avail_bid, dtype=float)[..., None]
+    util_bid = np.asarray(util_bid, dtype=float)[..., None]
+    cap = params.cap[..., None]
+    util_hours, valid = _hours_axis(params)
+
+    # profit = revenue - (marginal cost + fixed cost), in the same order of
+    # operations as calc_costs so that the results are identical
+    energy = util_hours * cap
+    tot_cost = params.tot_SRMC[..., None] * energy + params.tot_fixed[..., None]
+    revenue = (util_bid * energy) + (avail_bid * cap
+                                     * params.tot_avail_hrs[..., None])
+    profit = revenue - tot_cost
+
+    return np.where(valid, profit, np.nan)
+
+
+def maxout_tcv(params, exp_util_hrs, bid_weight):
     """
     This calculates the availability and utilisation bids to max out the tcv
     for a given expected number of hours of delivery and chosen weighting
-    between availability and utilisation. 
+    between availability and utilisation.
 
     Parameters
     ----------
-    exp_util_hrs : float
+    params : MarketParams
+        The market parameters.
+    exp_util_hrs : float or np.ndarray
         The expected number of utilisation hours.
-    bid_weight : float
+    bid_weight : float or np.ndarray
         A value between 0 and 1. The weighting of the tcv between availability
         and utilisation.
 
     Returns
     -------
-    avail : float
+    avail : float or np.ndarray
         Availability bid.
-    util : float
+    util : float or np.ndarray
         Utilisation bid.
 
     """
-        
-    util_max = bid_weight * tcv
-    avail_max = ((((1 - bid_weight)* tcv) * exp_util_hrs * cap) 
-                 / cap 
-                 / tot_avail_hrs)
-    
-    util = np.min([util_max, util_ceil])
-    avail = np.min([avail_ceil, avail_max])
-    
+    util_max = bid_weight * params.tcv
+    avail_max = ((((1 - bid_weight) * params.tcv) * exp_util_hrs
+                  * params.cap)
+                 / params.cap
+                 / params.tot_avail_hrs)
+
+    util = np.minimum(util_max, params.util_ceil)
+    avail = np.minimum(params.avail_ceil, avail_max)
+
     return avail, util
 
-def calc_avail_bid(exp_util_hrs, util_bid):
+
+def calc_avail_bid(params, exp_util_hrs, util_bid):
     """
-    Given a chosen utilisation bid, calculate max availability bid that 
+    Given a chosen utilisation bid, calculate max availability bid that
     ensures the TCV is not exceeded.
 
     Parameters
     ----------
-    exp_util_hrs : float
+    params : MarketParams
+        The market parameters.
+    exp_util_hrs : float or np.ndarray
         The expected number of utilisation hours.
-    util_bid : float
+    util_bid : float or np.ndarray
         The user defined utilisation bid.
 
     Returns
     -------
-    avail : float
+    avail : float or np.ndarray
         The max possible availability bid.
-    weight : float
+    weight : float or np.ndarray
         The corresponding weighting assuming this combination of utilisation
         and availability bid.
 
     """
-    remaining_tcv = tcv - util_bid
-    weight = util_bid / tcv
-    avail_max = ((remaining_tcv * exp_util_hrs * cap) 
-                 / cap 
-                 / tot_avail_hrs)
-    avail = np.min([avail_ceil, avail_max])
+    remaining_tcv = params.tcv - util_bid
+    weight = util_bid / params.tcv
+    avail_max = ((remaining_tcv * exp_util_hrs * params.cap)
+                 / params.cap
+                 / params.tot_avail_hrs)
+    avail = np.minimum(params.avail_ceil, avail_max)
+
     return avail, weight
 
-def calc_util_bid(exp_util_hrs, avail_bid):
+
+def calc_util_bid(params, exp_util_hrs, avail_bid):
     """
-    Given a chosen availability bid, calculate max utilisation bid that 
+    Given a chosen availability bid, calculate max utilisation bid that
     ensures the TCV is not exceeded.
 
     Parameters
     ----------
-    exp_util_hrs : float
+    params : MarketParams
+        The market parameters.
+    exp_util_hrs : float or np.ndarray
         The expected number of utilisation hours.
-    avail_bid : float
+    avail_bid : float or np.ndarray
         The user defined availability bid.
 
     Returns
     -------
-    util : float
+    util : float or np.ndarray
         The max possible utilisation bid.
-    weight : float
+    weight : float or np.ndarray
         The corresponding weighting assuming this comibination of availability
         and utilisation bid.
 
     """
-    util_max = (((tcv * exp_util_hrs * cap) - (avail_bid * tot_avail_hrs * cap))
-               / (exp_util_hrs * cap))
-    util = np.min([util_ceil, util_max])
-    weight = util / tcv
+    with np.errstate(divide='ignore', invalid='ignore'):
+        util_max = (((params.tcv * exp_util_hrs * params.cap)
+                     - (avail_bid * params.tot_avail_hrs * params.cap))
+                    / (exp_util_hrs * params.cap))
+    util = np.minimum(params.util_ceil, util_max)
+    weight = util / params.tcv
+
     return util, weight
 
-def profit_vs_expected_util_vs_weight(avail_bid=None, util_bid=None, weight=None):
+
+def profit_vs_expected_util_vs_weight(params):
     """
-    Calculate 3D matrix of profit for expected utilisation vs actual
-    utilisation for a particular set of bids and strategy weight. 
-    
-    Parameters
-    ----------
-    avail_bid : Float
-        Availability bid to use for the analysis. If supplied, util_bid must
-        also be supplied and None for weight.
-        
-    util_bid : Float
-        Utilisation bid to use for the analysis. If supplied, avail_bid must
-        also be supplied and None for weight.
-        
-    weight : float
-        Decimal between 0 and 1. If supplied, avail_bid and util_bid should
-        be left blank.
+    Calculate matrix of profit for expected utilisation vs actual
+    utilisation for the bids that max out the TCV for each strategy weight.
 
     Returns
     -------
-    3d  array with axis [expected utilisation, weight, actual utilisation]
-    To get test scenario back where expected utilisation = 3, and weight = 0.5
-    use ndarray[3][5]
-    
-    To get profit as a function of bid weight for a given expected utilisation and actual utilisation
-    use profits[exp,:,act]
-    
-    
-    To do: add error checking for input parameter rules
+    array with axis [*configurations, expected utilisation, weight, actual
+    utilisation]. For a single configuration, to get test scenario back where
+    expected utilisation = 3, and weight = 0.5 use ndarray[3][5]
+
+    To get profit as a function of bid weight for a given expected utilisation
+    and actual utilisation use profits[exp,:,act]
+
+    Expected and actual utilisation hours beyond the tot_avail_hrs of a
+    configuration are NaN.
 
     """
-    
-    
-    exp_util_range = np.arange(0.0, tot_avail_hrs+1, 1.0)
-    weight_range = np.linspace(0.0,1.0,11)
-    profits = np.zeros((len(exp_util_range), len(weight_range),
-                        len(exp_util_range)))
-    revenues = np.zeros((len(exp_util_range), len(weight_range),
-                         len(exp_util_range)))
-    for i, exp_util in enumerate(exp_util_range):
-        for j, weight in enumerate(weight_range):
-            bids = maxout_tcv(exp_util, weight)
-            costs = calc_costs(cap, bids[0], bids[1],
-                                  tot_fixed, tot_SRMC)[0]
-            profits[i][j] = costs[8]
-            revenues[i][j] = costs[7]
-
-    return profits
-
-def profit_vs_expected_util(avail_bid=None, util_bid=None):
-    exp_util_range = np.arange(0.0, tot_avail_hrs+1, 1.0)
-    #weight_range = np.linspace(0.0,1.0,11)
-    profits = np.zeros((len(exp_util_range), len(exp_util_range)))
-    revenues = np.zeros((len(exp_util_range), len(exp_util_range)))
-    for i, exp_util in enumerate(exp_util_range):
-        costs = calc_costs(cap, avail_bid, util_bid, tot_fixed, tot_SRMC)[0]
-        profits[i] = costs[8]
-        revenues[i] = costs[7]
-
-    return profits
-    
-
-def plot_weight_vs_actual(profits, exp_util):
-    
+    util_hours, valid = _hours_axis(params)
+
+    # bids for each [*configurations, expected utilisation, weight]
+    exp_util = util_hours[:, None]
+    bids = maxout_tcv(params_axes(params, 2), exp_util, WEIGHT_RANGE)
+    profits = calc_profit(params_axes(params, 2), bids[0], bids[1])
+
+    # mask the expected utilisation hours beyond tot_avail_hrs
+    return np.where(valid[..., :, None, None], profits, np.nan)
+
+
+def profit_vs_expected_util(params, avail_bid, util_bid):
+    """
+    Calculate matrix of profit for expected utilisation vs actual utilisation
+    for a particular set of bids. As the bids are fixed, the profit is the
+    same for every expected utilisation.
+
+    Returns
+    -------
+    array with axis [*configurations, expected utilisation, actual
+    utilisation]
+
+    """
+    util_hours, valid = _hours_axis(params)
+    profits = calc_profit(params, avail_bid, util_bid)
+    profits = np.broadcast_to(profits[..., None, :],
+                              profits.shape[:-1] + (len(util_hours),
+                                                    profits.shape[-1]))
+
+    return np.where(valid[..., :, None], profits, np.nan)
+
+
+def params_axes(params, n_axes):
+    """
+    Returns a copy of the parameters with n_axes trailing axes of length 1
+    added to every numerical parameter, so that they broadcast against
+    arrays of bids with extra trailing axes.
+    """
+    expanded = MarketParams.__new__(MarketParams)
+    for name, value in vars(params).items():
+        if isinstance(value, np.ndarray):
+            value = value.reshape(value.shape + (1,) * n_axes)
+        setattr(expanded, name, value)
+
+    return expanded
+
+
+# =============================================================================
+# Plotting
+# =============================================================================
+def plot_weight_vs_actual(params, profits, exp_util):
+
     # make x axis utilisation factor = ratio of actual / expected. Add line indicating flat profile.
-    
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    tot_avail_hrs = float(params.tot_avail_hrs)
     fig, ax = plt.subplots(figsize=(15,6))
     sns.heatmap(profits[exp_util], ax=ax, annot=profits[exp_util], fmt='.2f', annot_kws={"fontsize":6})
     ax.set_xticklabels(['{:,.0f}'.format(x) for x in np.arange(0.0, tot_avail_hrs+1, 1.0)], rotation=45, ha='right', rotation_mode='anchor')
-    plt.gca().set_yticklabels(['{:,.1f}'.format(x) for x in np.linspace(0.0,1.0,11)], rotation=0, ha='right', rotation_mode='anchor')
+    plt.gca().set_yticklabels(['{:,.1f}'.format(x) for x in WEIGHT_RANGE], rotation=0, ha='right', rotation_mode='anchor')
     ax.set_xlabel("Actual Utilisation Hours")
     ax.set_ylabel("Utilisation bid weighting")
     plt.show()
-    
-def plot_exp_vs_actual(profits, weight):
+
+def plot_exp_vs_actual(params, profits, weight):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    tot_avail_hrs = float(params.tot_avail_hrs)
     fig, ax = plt.subplots(figsize=(15,6))
     sns.heatmap(profits[:,int(weight*10),:], ax=ax, annot=profits[:,int(weight*10),:], fmt='.2f', annot_kws={"fontsize":6})
     ax.set_xticklabels(['{:,.0f}'.format(x) for x in np.arange(0.0, tot_avail_hrs+1, 1.0)], rotation=45, ha='right', rotation_mode='anchor')
     ax.set_yticklabels(['{:,.0f}'.format(x) for x in np.arange(0.0, tot_avail_hrs+1, 1.0)], rotation=0, ha='right', rotation_mode='anchor')
-    
+
     ax.set_xlabel("Actual Utilisation Hours")
     ax.set_ylabel("Expected Utilisation Hours")
     plt.show()
-    
-def plot_exp_vs_act_heatmap_plotly(profits, weight):
-    
+
+def plot_exp_vs_act_heatmap_plotly(params, profits, weight, renderer='browser'):
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    tot_avail_hrs = float(params.tot_avail_hrs)
+    exp_util_hrs = float(params.exp_util_hrs)
     weight_range = np.round(np.linspace(0.0, 1.0, profits.shape[1]),decimals=4)
     weight_index = np.where(weight_range == weight)
 
@@ -407,41 +600,44 @@ def plot_exp_vs_act_heatmap_plotly(profits, weight):
                               text=data,
                               colorbar={"title": 'Profit (£)'}))
 
-    
+
     fig.add_shape(
         type='rect',
         x0=exp_util_hrs-0.5, x1=exp_util_hrs+0.5, y0=exp_util_hrs-0.5, y1=exp_util_hrs+0.5,
         xref='x', yref='y',
         line_color='black'
         )
-    
+
     fig.update_yaxes(title_text="Expected Utilisation Hours",
                      nticks=int(tot_avail_hrs+1),
                      range=[-0.5,tot_avail_hrs+0.5])
     fig.update_xaxes(title_text="Actual Utilisation Hours",
                      nticks=int(tot_avail_hrs+1),
                      range=[-0.5,tot_avail_hrs+0.5])
-    fig.show()
+    fig.show(renderer=renderer)
     return fig
-    
-def plot_weight_vs_act_heatmap_plotly(profits, exp_util_hrs):
-    
+
+def plot_weight_vs_act_heatmap_plotly(params, profits, exp_util_hrs, renderer='browser'):
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    tot_avail_hrs = float(params.tot_avail_hrs)
     exp_range = np.round(np.arange(0.0, tot_avail_hrs+1, 1.0), decimals=1)
     exp_index = np.where(exp_range == exp_util_hrs)
 
     data = profits[exp_index[0][0],:,:]
     fig = make_subplots(specs=[[{"secondary_y": True}]])
     fig.add_trace(go.Heatmap(x = np.arange(0.0, tot_avail_hrs+1, 1.0),
-                              y = np.linspace(0.0, util_ceil, profits.shape[1]),
+                              y = np.linspace(0.0, float(params.util_ceil), profits.shape[1]),
                               z=data,
                               colorscale='RdBu',
                               zmid=0,
                               text=data,
                               colorbar={"title": 'Profit (£)'},
                               ), secondary_y=True)
-    
-    
-    
+
+
+
     fig.add_trace(go.Heatmap(x = np.arange(0.0, tot_avail_hrs+1, 1.0),
                               y = np.linspace(0.0, 1.0, profits.shape[1]),
                               z=data,
@@ -450,115 +646,116 @@ def plot_weight_vs_act_heatmap_plotly(profits, exp_util_hrs):
                               text=data,
                               colorbar={"title": 'Profit (£)'}))
     fig.add_vrect(x0=exp_util_hrs-0.5, x1=exp_util_hrs+0.5, line_width=1)
-    
-    
 
-    
+
+
+
     fig.update_yaxes(title_text="Bid weighting")
     fig.update_xaxes(title_text="Actual Utilisation Hours",
                      nticks=int(tot_avail_hrs+1),
                      range=[0,tot_avail_hrs])
     fig.update_yaxes(title_text="Utilisation bid", secondary_y=True)
-    fig.show()
+    fig.show(renderer=renderer)
     return fig
-    
-def profit_vs_actual_plotly(exp_util_hrs, avail_bid, util_bid):
-    
-    bids = maxout_tcv(exp_util_hrs, 0.0)
-    max_avail_profit = calc_costs(cap, bids[0], bids[1],
-                              tot_fixed, tot_SRMC)[1]["Profit (£)"]
-    
-    bids = maxout_tcv(exp_util_hrs, 1.0)
-    max_util_profit = calc_costs(cap, bids[0], bids[1],
-                              tot_fixed, tot_SRMC)[1]["Profit (£)"]
-    
-    user_def_prof = calc_costs(cap, avail_bid, util_bid,
-                              tot_fixed, tot_SRMC)[1]["Profit (£)"]
+
+def profit_vs_actual_plotly(params, exp_util_hrs, avail_bid, util_bid, renderer='browser'):
+    import plotly.express as px
+
+    tot_avail_hrs = float(params.tot_avail_hrs)
+
+    bids = maxout_tcv(params, exp_util_hrs, 0.0)
+    max_avail_profit = calc_costs(params, bids[0], bids[1])[1]["Profit (£)"]
+
+    bids = maxout_tcv(params, exp_util_hrs, 1.0)
+    max_util_profit = calc_costs(params, bids[0], bids[1])[1]["Profit (£)"]
+
+    user_def_prof = calc_costs(params, avail_bid, util_bid)[1]["Profit (£)"]
 
 
     data = pd.DataFrame({"max availability": max_avail_profit,
                          "max utilisation": max_util_profit,
-                         "user defined": user_def_prof},
-                         index = np.arange(0.0, tot_avail_hrs+1, 1.0))
-    
+                         "user defined": user_def_prof})
+    data.index = np.arange(0.0, tot_avail_hrs+1, 1.0)
+
     fig = px.line(data, x=data.index, y=["max availability",
                                          "max utilisation",
                                          "user defined" ])
-    
+
     fig.update_yaxes(title_text="Profit (£)")
     fig.update_xaxes(title_text="Actual Utilisation Hours",
                      nticks=int(tot_avail_hrs+1),
                      range=[0,tot_avail_hrs])
     fig.add_vline(x=exp_util_hrs, fillcolor='black')
-    fig.add_vrect(x0=0, x1=exp_util_hrs, 
+    fig.add_vrect(x0=0, x1=exp_util_hrs,
               annotation_text="""
-              If expecting to be under-utilised, <br> 
+              If expecting to be under-utilised, <br>
               weight bid towards availability to <br>
-              increase profit""", 
+              increase profit""",
               annotation_position="top right",
               fillcolor="blue", opacity=0.1, line_width=0)
-    fig.add_vrect(x0=exp_util_hrs, x1=tot_avail_hrs, 
+    fig.add_vrect(x0=exp_util_hrs, x1=tot_avail_hrs,
               annotation_text="""
-              If expecting to be over-utilised, <br> 
+              If expecting to be over-utilised, <br>
               weight bid towards utilisation to <br>
-              increase profit""", 
+              increase profit""",
               annotation_position="top left",
               fillcolor="red", opacity=0.1, line_width=0)
     fig.update_layout(legend_title_text='Bid Weighting Scenario')
-    fig.show()
+    fig.show(renderer=renderer)
     return fig
-        
+
 
 if __name__ == "__main__":
-    
+
+    params = MarketParams()
+    exp_util_hrs = float(params.exp_util_hrs)
+
+    def exp_profit(cost_df):
+        return cost_df["Profit (£)"][cost_df["Utilisation hrs"]==exp_util_hrs].values[0]
+
     #%% Scenarios
     ## Break even
     # this calculates the utilisation bid and availability bid such that an
-    # asset breaks even (i.e. 0 profit) no matter what number the actual 
+    # asset breaks even (i.e. 0 profit) no matter what number the actual
     # utilisation hours are. This does not guarentee a bid will be under the
-    # TCV or utilisation or availability ceiling prices. The cost matrix is 
-    # generated with calc_costs function. 
-    break_even_df = calc_costs(cap, break_even()[0], break_even()[1],
-                              tot_fixed, tot_SRMC)[1]
-    exp_profit = break_even_df["Profit (£)"][break_even_df["Utilisation hrs"]==exp_util_hrs].values[0]
-    print("Break even profit: £{:0.2f}".format(exp_profit))
-    
+    # TCV or utilisation or availability ceiling prices. The cost matrix is
+    # generated with calc_costs function.
+    break_even_df = calc_costs(params, *break_even(params))[1]
+    print("Break even profit: £{:0.2f}".format(exp_profit(break_even_df)))
+
     ## Maximum availability scenario
-    bids = maxout_tcv(exp_util_hrs, 0.0)
-    max_avail_df = calc_costs(cap, bids[0], bids[1],
-                              tot_fixed, tot_SRMC)[1]
-    exp_profit = max_avail_df["Profit (£)"][max_avail_df["Utilisation hrs"]==exp_util_hrs].values[0]
-    print("Max availability profit: £{:0.2f}".format(exp_profit))
-    
+    max_avail_df = calc_costs(params, *maxout_tcv(params, exp_util_hrs, 0.0))[1]
+    print("Max availability profit: £{:0.2f}".format(exp_profit(max_avail_df)))
+
     ## Maximum utilisation scenario
-    bids = maxout_tcv(exp_util_hrs, 1.0)
-    max_util_df = calc_costs(cap, bids[0], bids[1],
-                              tot_fixed, tot_SRMC)[1]
-    exp_profit = max_util_df["Profit (£)"][max_util_df["Utilisation hrs"]==exp_util_hrs].values[0]
-    print("Max utilisation profit: £{:0.2f}".format(exp_profit))
-    
+    max_util_df = calc_costs(params, *maxout_tcv(params, exp_util_hrs, 1.0))[1]
+    print("Max utilisation profit: £{:0.2f}".format(exp_profit(max_util_df)))
+
     ## Middle weighting
-    # This splits the total contract equally between availability and 
+    # This splits the total contract equally between availability and
     # utilisation. This ensures TCV is equal to the TCV limit.
-    bids = maxout_tcv(exp_util_hrs, 0.5)
-    middle_df = calc_costs(cap, bids[0], bids[1],
-                              tot_fixed, tot_SRMC)[1]
-    exp_profit = middle_df["Profit (£)"][middle_df["Utilisation hrs"]==exp_util_hrs].values[0]
-    print("Middle profit: £{:0.2f}".format(exp_profit))
-    
+    middle_df = calc_costs(params, *maxout_tcv(params, exp_util_hrs, 0.5))[1]
+    print("Middle profit: £{:0.2f}".format(exp_profit(middle_df)))
+
     ## Independent scenario
     # this ensures profit is independent of actual hours vs expected utilisation.
-    bids = inde_maxTCV(exp_util_hrs)
-    inde_df = calc_costs(cap, bids[0], bids[1],
-                              tot_fixed, tot_SRMC)[1]
-    exp_profit = inde_df["Profit (£)"][inde_df["Utilisation hrs"]==exp_util_hrs].values[0]
-    print("Independent profit: £{:0.2f}".format(exp_profit))
-    
-    
+    inde_df = calc_costs(params, *inde_maxTCV(params)[:2])[1]
+    print("Independent profit: £{:0.2f}".format(exp_profit(inde_df)))
+
+    ## Sweep
+    # the profit at the expected utilisation hours of the middle weighting for
+    # a range of TCV limits and expected utilisation hours in one call
+    sweep = MarketParams.grid(tcv=np.linspace(0.1, 0.5, 5),
+                              exp_util_hrs=np.arange(0.0, 21.0, 5.0))
+    bids = maxout_tcv(sweep, sweep.exp_util_hrs, 0.5)
+    sweep_profits = calc_profit(sweep, *bids)
+    exp_index = sweep.exp_util_hrs.astype(int)[..., None]
+    print(pd.DataFrame(np.take_along_axis(sweep_profits, exp_index, axis=-1)[..., 0],
+                       index=pd.Index(sweep.tcv.ravel(), name='TCV (£/kWh)'),
+                       columns=pd.Index(sweep.exp_util_hrs.ravel(), name='Expected utilisation hrs')))
+
     ## User defined
     avail_bid = 0.03
     util_bid = 0.2
-    user_df = calc_costs(cap, avail_bid, util_bid,
-                              tot_fixed, tot_SRMC)[1]
-    exp_profit = user_df["Profit (£)"][user_df["Utilisation hrs"]==exp_util_hrs].values[0]
-    profit_vs_actual_plotly(exp_util_hrs, avail_bid, util_bid)
+    user_df = calc_costs(params, avail_bid, util_bid)[1]
+    profit_vs_actual_plotly(params, exp_util_hrs, avail_bid, util_bid)
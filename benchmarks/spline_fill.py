@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the spline gap filling of the Project LEO Data Cleaning app.
+
+A half-hourly power profile with short gaps (1 to 6 missing values) is filled
+with a local spline around each gap, once with a pandas 'interpolate' call per
+gap (method='spline', order=3, on the gap and its context) and once with the
+batched 'spline_fill' of 'data-cleaning/scripts/dash_timeseriesClean.py'.
+The gap count is doubled at each step to show how each approach scales, e.g.
+
+    python benchmarks/spline_fill.py --gaps 500 --steps 4
+"""
+
+import argparse
+import pathlib
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / 'data-cleaning'))
+from scripts.dash_timeseriesClean import spline_fill, SPLINE_CONTEXT, SPLINE_MAX_GAP
+
+
+def synthetic_gaps(n_gaps, context=SPLINE_CONTEXT, max_gap=SPLINE_MAX_GAP, seed=0):
+    """
+    A daily power profile with noise and 'n_gaps' gaps that each have a full context either side.
+
+    :return: np.ndarray of the values (NaN in the gaps), list of the gaps as single positions or [start, end] blocks
+    """
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(1, max_gap + 1, n_gaps)
+    spacing = lengths + 2 * context + rng.integers(1, 20, n_gaps)
+    starts = context + np.concatenate([[0], np.cumsum(spacing)[:-1]])
+
+    n = int(starts[-1] + lengths[-1] + context)
+    t = np.arange(n)
+    values = 10 + 5 * np.sin(2 * np.pi * t / 48) + rng.normal(0, 0.2, n)
+
+    blocks = []
+    for start, length in zip(starts, lengths):
+        values[start:start + length] = np.nan
+        blocks.append(int(start) if length == 1 else [int(start), int(start + length - 1)])
+
+    return values, blocks
+
+
+def pandas_fill(values, blocks, context=SPLINE_CONTEXT):
+    """
+    One pandas spline interpolation for each gap (the gap and its context).
+    """
+    series = pd.Series(values)
+    filled = series.copy()
+    for block in blocks:
+        start, end = (block[0], block[-1]) if type(block) == list else (block, block)
+        window = series.iloc[start - context:end + context + 1]
+        filled.iloc[start:end + 1] = window.interpolate(method='spline', order=3).iloc[context:-context].values
+
+    return filled.values
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--gaps', type=int, default=500, help='number of gaps of the first step')
+    parser.add_argument('--steps', type=int, default=4, help='number of times the gap count is doubled')
+    args = parser.parse_args()
+
+    print('{:>8}{:>14}{:>14}{:>10}'.format('gaps', 'pandas (s)', 'batched (s)', 'speedup'))
+    for step in range(args.steps):
+        values, blocks = synthetic_gaps(args.gaps * 2 ** step)
+
+        start = time.perf_counter()
+        pandas_fill(values, blocks)
+        pandas_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        spline_fill(values, blocks, kind='cubic')
+        batched_time = time.perf_counter() - start
+
+        print('{:>8,}{:>14.3f}{:>14.4f}{:>9.0f}x'.format(len(blocks), pandas_time, batched_time,
+                                                       pandas_time / batched_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Startup benchmark of the Project LEO Dash apps.
+
+Each app is imported in a fresh python process (as a gunicorn worker does
+when it boots) and the time to import 'app.py' and to build its layout for the
+first request are reported. The median of several runs is reported as the
+first import after a change includes the time to compile the bytecode.
+
+The current tree can be compared to another commit, which is exported to a
+temporary directory with 'git archive', e.g.
+
+    python benchmarks/startup.py --compare HEAD~1
+
+NB: The requirements of each app must be installed.
+"""
+
+import argparse
+import json
+import os
+import pathlib
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+
+REPO_PATH = pathlib.Path(__file__).resolve().parent.parent
+APPS = ['bid-calculator', 'data-cleaning', 'data-health-scan']
+
+# Run inside each process: time the import of the app and the first build of the layout
+TIMER = """
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+layout = app.app.layout
+if callable(layout):
+    layout()
+built = time.perf_counter()
+print(json.dumps({'import': imported - start, 'layout': built - imported}))
+"""
+
+
+def time_app(app_path, repeats):
+    """
+    Times the startup of an app in fresh processes.
+
+    :param app_path: Directory of the app
+    :param repeats: Number of processes to time
+
+    :return: median import time (s), median first layout time (s)
+    """
+    times = []
+    for _ in range(repeats):
+        result = subprocess.run([sys.executable, '-c', TIMER], cwd=app_path, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError("Could not import '{}':\n{}".format(app_path, result.stderr))
+        times.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    return (statistics.median(t['import'] for t in times),
+            statistics.median(t['layout'] for t in times))
+
+
+def export_ref(ref, target):
+    """
+    Exports the apps of a git commit to a directory.
+    """
+    archive = os.path.join(target, 'ref.tar')
+    subprocess.run(['git', 'archive', '--format=tar', '-o', archive, ref] + APPS, cwd=REPO_PATH, check=True)
+    with tarfile.open(archive) as tar:
+        tar.extractall(target)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--apps', nargs='+', default=APPS, choices=APPS, help='apps to benchmark')
+    parser.add_argument('--repeats', type=int, default=5, help='number of processes to time for each app')
+    parser.add_argument('--compare', metavar='REF', help='git commit to compare the current tree to')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as ref_path:
+        if args.compare:
+            export_ref(args.compare, ref_path)
+
+        print('{:<20}{:>12}{:>12}{:>12}'.format('app', 'import (s)', 'layout (s)', 'startup (s)'))
+        for app_name in args.apps:
+            rows = [(app_name, REPO_PATH / app_name)]
+            if args.compare:
+                rows.append(('  @ ' + args.compare, pathlib.Path(ref_path) / app_name))
+
+            for label, app_path in rows:
+                import_time, layout_time = time_app(app_path, args.repeats)
+                print('{:<20}{:>12.3f}{:>12.3f}{:>12.3f}'.format(label, import_time, layout_time,
+                                                                import_time + layout_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the lag search of the Project LEO Time Syncing Notebook.
+
+Two noisy copies of a random walk (1-second data over several days, with
+missing values) are offset by a known lag. The lag is found with the
+notebook's previous method (pandas 'corr' of the shifted series for each lag
+in +/- 500 samples) and with the FFT cross-correlation of
+'data-time-sync/scripts/dash_timeSync.py' over every lag, and with its
+coarse-to-fine search ('pyramid_lag', whose levels are timed), e.g.
+
+    python benchmarks/time_sync.py --days 2 --lag 137
+    python benchmarks/time_sync.py --days 28 --lag 10817 --lag-range 0
+"""
+
+import argparse
+import pathlib
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / 'data-time-sync'))
+from scripts.dash_timeSync import find_lag, pyramid_lag, PYRAMID_FACTOR
+
+
+def synthetic_pair(n, lag, missing=0.02, seed=0):
+    """
+    Two noisy copies of a random walk where the first at sample t matches the
+    second at sample t - lag, with a fraction of missing values in each.
+    """
+    rng = np.random.default_rng(seed)
+    walk = np.cumsum(rng.normal(size=n + 2 * abs(lag)))
+    x = walk[abs(lag):abs(lag) + n] + rng.normal(0, 0.5, n)
+    y = walk[abs(lag) + lag:abs(lag) + lag + n] + rng.normal(0, 0.5, n)
+    x[rng.random(n) < missing] = np.nan
+    y[rng.random(n) < missing] = np.nan
+
+    index = pd.Timestamp('2021-01-01') + pd.to_timedelta(np.arange(n), unit='s')
+    return pd.Series(x, index=index), pd.Series(y, index=index)
+
+
+def pandas_lag(d1, d2, lag_range):
+    """
+    The notebook's previous lag search (a pandas 'corr' for each lag).
+    """
+    corr_vals = [d1.corr(d2.shift(lag)) for lag in range(-lag_range, lag_range + 1)]
+    return int(np.nanargmax(corr_vals)) - lag_range
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--days', type=float, default=2, help='days of 1-second data')
+    parser.add_argument('--lag', type=int, default=137, help='lag between the signals (samples)')
+    parser.add_argument('--lag-range', type=int, default=500, help='lag range of the pandas search (0 to skip it)')
+    parser.add_argument('--factor', type=int, default=PYRAMID_FACTOR, help='decimation between the pyramid levels')
+    parser.add_argument('--levels', type=int, help='number of decimated levels of the pyramid')
+    args = parser.parse_args()
+
+    d1, d2 = synthetic_pair(int(args.days * 86400), args.lag)
+    print('{:,} samples, true lag {}'.format(len(d1), args.lag))
+
+    if args.lag_range:
+        start = time.perf_counter()
+        lag = pandas_lag(d1, d2, args.lag_range)
+        pandas_time = time.perf_counter() - start
+        print('pandas corr (+/- {} lags): lag {:>6}, {:8.3f} s'.format(args.lag_range, lag, pandas_time))
+
+    start = time.perf_counter()
+    lag = find_lag(d1.values, d2.values, max_lag=None)[0]
+    fft_time = time.perf_counter() - start
+    print('FFT (every lag):          lag {:>6}, {:8.3f} s'.format(lag, fft_time), end='')
+    print(' ({:.0f}x faster)'.format(pandas_time / fft_time) if args.lag_range else '')
+
+    start = time.perf_counter()
+    lag, _, timing_df = pyramid_lag(d1.values, d2.values, factor=args.factor, levels=args.levels)
+    pyramid_time = time.perf_counter() - start
+    print('Pyramid (coarse-to-fine): lag {:>6}, {:8.3f} s ({:.1f}x faster than FFT)'.format(lag, pyramid_time,
+                                                                                          fft_time / pyramid_time))
+    print(timing_df.to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
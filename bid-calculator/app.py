@@ -1,15 +1,16 @@
 # -*- coding: utf-8 -*-
 import dash
-import yagmail
 import numpy as np
 import pandas as pd
-import plotly.express as px
 import plotly.graph_objects as go
 from dash import html, dash_table, dcc
 import dash_bootstrap_components as dbc
 from plotly.subplots import make_subplots
 from dash.exceptions import PreventUpdate
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State, ClientsideFunction
+from scripts.dash_bidCalcs import marginal_costs, scenario, encode_profits
+from scripts.dash_bidRisk import draw_outcomes, bid_grid, bid_risk
+from scripts.dash_bidOptimise import bid_frontier, optimal_bids, profit_moments
 
 app = dash.Dash(__name__, meta_tags=[{"name": "viewport", "content": "width=device-width"}],
                 suppress_callback_exceptions=True)
@@ -75,144 +76,6 @@ def get_header(app):
     return header
 
 
-# TODO: Does not include 'Other Fixed' at the moment
-def tot_marg_cost(asset_effic, asset_cap, energy_cost, duos_green,
-                  duos_red, lcos, person_rate, util_person_hrs):
-    """
-    Simple function to determine the total marginal cost
-
-    :param asset_effic:
-    :param asset_cap:
-    :param energy_cost:
-    :param duos_green:
-    :param duos_red:
-    :param lcos:
-    :param person_rate:
-    :param util_person_hrs:
-
-    :return: tot_SRMC
-
-    """
-    # TODO: Does not include hrs_per_util variable as this is assumed to be 1.0
-    energy_SRMC = (1. / asset_effic) * energy_cost + (duos_green - duos_red) + lcos
-    hrly_util = person_rate * (util_person_hrs / 60)
-    person_SRMC = hrly_util / asset_cap
-    tot_SRMC = energy_SRMC + person_SRMC
-
-    return tot_SRMC
-
-
-def calc_avail_bid(tcv, exp_util_hrs, tot_avail_hrs, util_bid, avail_ceil, asset_cap):
-    """
-    Given a utilisation bid, calculate max availability bid and be equal to TCV
-    Returns
-    """
-    remaining_tcv = tcv - util_bid
-    weight = util_bid / tcv
-    avail_max = ((remaining_tcv * exp_util_hrs * asset_cap)
-                 / asset_cap
-                 / tot_avail_hrs)
-    avail = np.min([avail_ceil, avail_max])
-
-    return avail, weight
-
-
-def calc_util_bid(tcv, exp_util_hrs, tot_avail_hrs, avail_bid, util_ceil, asset_cap):
-    """
-    Given an availability bid, calculate max utilisation bid and be equal to TCV
-    Returns
-    """
-    util_max = (((tcv * exp_util_hrs * asset_cap) - (avail_bid * tot_avail_hrs * asset_cap))
-                / (exp_util_hrs * asset_cap))
-    util = np.min([util_ceil, util_max])
-    weight = util / tcv
-
-    return util, weight
-
-
-def maxout_tcv(tcv, exp_util_hrs, tot_avail_hrs, util_ceil, avail_ceil, asset_cap, bid_weight):
-    """
-    This calculates the availability and utilisation bids to max out the tcv
-    for a given expected number of hours of delivery. This can be used to
-    replicate Harry Orchards original analysis with bid_weight 0 for
-    all availability and 1 for all utilisaton.
-    """
-    util_max = bid_weight * tcv
-    avail_max = ((((1 - bid_weight) * tcv) * exp_util_hrs * asset_cap)
-                 / asset_cap
-                 / tot_avail_hrs)
-
-    util = np.min([util_max, util_ceil])
-    avail = np.min([avail_ceil, avail_max])
-
-    return avail, util
-
-
-def calc_costs(asset_cap, avail_bid, util_bid, person_rate, fixed_person_hrs, tot_SRMC, tot_avail_hrs):
-    """
-    Calculates the costs of participation, revenue and profit
-    """
-    # Create starting lists This is adapted from the original function to remove the isinstance and list checks and
-    # this can be constrained at point of user input. List input avoided for simplification of tool in v1.0
-    util_hours = np.arange(0, (tot_avail_hrs + 1), 1.0)
-    avail_bids = [avail_bid] * len(util_hours)
-    util_bids = [util_bid] * len(util_hours)
-
-    # Creating data for the data table columns
-    energy = util_hours * asset_cap
-    tot_SRMC = [tot_SRMC] * len(util_hours)
-    marginal_cost = tot_SRMC * energy
-    fixed_cost = (fixed_person_hrs / 60) * person_rate
-    fixed_cost = np.ones(util_hours.shape) * fixed_cost
-    tot_cost = marginal_cost + fixed_cost
-    revenue = (util_bids * energy) + (avail_bid * asset_cap * tot_avail_hrs)
-    profit = revenue - tot_cost
-    tcv = revenue / energy
-
-    # Full data matrix and dataframe creation
-    cost_matrix = np.array([util_hours, energy, avail_bids, util_bids, marginal_cost,
-                            fixed_cost, tot_cost, revenue, profit, tcv])
-
-    # TODO: Need to ensure column headers are consistently named throughout tables
-    cost_df = pd.DataFrame(cost_matrix.T,
-                           columns=["Utilisation Hours",
-                                    "Energy (kWh)",
-                                    "Availability Bid (£/kW/h)",
-                                    "Utilisation Bid (£/kWh)",
-                                    "Marginal Cost (£)",
-                                    "Auction Fixed Cost (£)",
-                                    "Total Service Cost (£)",
-                                    "Revenue (£)",
-                                    "Profit (£)",
-                                    "TCV (£/kWh)"])
-
-    return cost_matrix, cost_df
-
-
-def profit_vs_expected_util(tcv, exp_util_hrs, tot_avail_hrs, util_ceil, avail_ceil, asset_cap, fixed_person_hrs,
-                            person_rate, tot_SRMC):
-    """
-    Calculate 3D matrix of profit for expected utilisation vs actual
-    utilisation for a particular set of bids and strategy weight.
-    """
-
-    exp_util_range = np.arange(0.0, tot_avail_hrs + 1, 1.0)
-    weight_range = np.linspace(0.0, 1.0, 11)
-
-    profits = np.zeros((len(exp_util_range), len(weight_range), len(exp_util_range)))
-    revenues = np.zeros((len(exp_util_range), len(weight_range), len(exp_util_range)))
-    for i, exp_util in enumerate(exp_util_range):
-        for j, weight in enumerate(weight_range):
-            bids = maxout_tcv(tcv, exp_util_hrs, tot_avail_hrs, util_ceil, avail_ceil, asset_cap, weight)
-            costs = \
-                calc_costs(asset_cap, bids[0], bids[1], fixed_person_hrs / 60, person_rate, tot_SRMC, tot_avail_hrs)[
-                    0]
-            profits[i][j] = costs[8]
-            revenues[i][j] = costs[7]
-
-    return profits
-
-
 def plot_exp_vs_act_heatmap(tot_avail_hrs, exp_util_hrs, profits, weight):
     weight_range = np.round(np.linspace(0.0, 1.0, profits.shape[1]), decimals=4)
     weight_index = np.where(weight_range == weight)
@@ -287,28 +150,9 @@ def plot_weight_vs_act_heatmap_plotly(profits, exp_util_hrs, tot_avail_hrs, util
     return fig
 
 
-def profit_vs_actual_plotly(tcv, exp_util_hrs, tot_avail_hrs, asset_effic, asset_cap, energy_cost, duos_green,
-                            duos_red, lcos, util_bid, util_ceil, avail_bid, avail_ceil, person_rate,
-                            fixed_person_hrs, util_person_hrs):
-    tot_SRMC = tot_marg_cost(asset_effic, asset_cap, energy_cost, duos_green,
-                             duos_red, lcos, person_rate, util_person_hrs)
-
-    bids = maxout_tcv(tcv, exp_util_hrs, tot_avail_hrs, util_ceil, avail_ceil, asset_cap, 0.0)
-    max_avail_profit = calc_costs(asset_cap, bids[0], bids[1], person_rate,
-                                  fixed_person_hrs, tot_SRMC, tot_avail_hrs)[1]["Profit (£)"]
-
-    bids = maxout_tcv(tcv, exp_util_hrs, tot_avail_hrs, util_ceil, avail_ceil, asset_cap, 1.0)
-    max_util_profit = calc_costs(asset_cap, bids[0], bids[1], person_rate,
-                                 fixed_person_hrs, tot_SRMC, tot_avail_hrs)[1]["Profit (£)"]
-
-    user_def_prof = calc_costs(asset_cap, avail_bid, util_bid, person_rate,
-                               fixed_person_hrs, tot_SRMC, tot_avail_hrs)[1]["Profit (£)"]
-
-    data = pd.DataFrame({"max availability": max_avail_profit,
-                         "max utilisation": max_util_profit,
-                         "user defined": user_def_prof},
-                        index=np.arange(0.0, tot_avail_hrs + 1, 1.0))
-
+def profit_vs_actual_plotly(data, exp_util_hrs, tot_avail_hrs):
+    # plotly express is only imported when first needed as it is slow to import
+    import plotly.express as px
     fig = px.line(data, x=data.index, y=["max availability",
                                          "max utilisation",
                                          "user defined"],
@@ -1608,8 +1452,46 @@ bidAnalysis = dbc.Card(
                                     'padding-top': '30px'
                                 }
                             ),
-                            # Output of Maxout TCV bid calculations
-                            html.Div(id='maxout_tcv_bids'),
+                            # Output of Maxout TCV bid calculations. The bids and the heatmap below are updated in
+                            # the browser when the slider is moved (see 'assets/bid_clientside.js')
+                            dcc.Store(id='profit-cube'),
+                            html.Div(
+                                [
+                                    html.Div(
+                                        [
+                                            html.P(
+                                                [
+                                                    "Availability Bid: ",
+                                                    html.Span(id='maxout-avail-bid', style={"color": "#ea8f32"})
+                                                ],
+                                                className="paratext"
+                                            )
+                                        ],
+                                        className="six columns",
+                                        style={
+                                            'textAlign': 'right'
+                                        }
+                                    ),
+                                    html.Div(
+                                        [
+                                            html.P(
+                                                [
+                                                    "Utilisation Bid: ",
+                                                    html.Span(id='maxout-util-bid', style={"color": "#ea8f32"})
+                                                ],
+                                                className="paratext"
+                                            )
+                                        ],
+                                        className="six columns"
+                                    ),
+                                ],
+                                id='maxout_tcv_bids',
+                                className="row",
+                                style={
+                                    'padding-top': '30px',
+                                    'padding-bottom': '50px'
+                                }
+                            ),
 
                             # Heatmap of expected vs actual hours and profit
                             # TODO: Need a write-up (small) on how to read these plots
@@ -1617,7 +1499,7 @@ bidAnalysis = dbc.Card(
                                 [
                                     html.Summary('Explore: Heatmap of Expected vs Actual Utilisation Hours '
                                                  'with Profit (£)'),
-                                    html.Div(id='expt-vs-actual-heatmap'),
+                                    html.Div(dcc.Graph(id='expt-vs-actual-graph'), id='expt-vs-actual-heatmap'),
                                 ],
                                 className="paratext",
                                 style={
@@ -1633,6 +1515,194 @@ bidAnalysis = dbc.Card(
                                     html.Div(id='weight-vs-actual-heatmap'),
                                 ],
                                 className="paratext",
+                                style={
+                                    'color': '#ea8f32',
+                                    'text-align': 'center',
+                                    'padding-top': '30px'
+                                }
+                            ),
+                            # Monte Carlo risk of the bids
+                            html.Details(
+                                [
+                                    html.Summary('Explore: Profit Risk of Bids under Uncertain Utilisation and '
+                                                 'Energy Prices'),
+                                    html.P(
+                                        [
+                                            "The actual utilisation hours and the energy price are drawn at random "
+                                            "(the utilisation hours around your Expected Utilisation Hours and the "
+                                            "energy price around your Energy Cost) to estimate the expected profit, "
+                                            "the P10/P90 profit and the probability of making a loss of each bid."
+                                        ],
+                                        className="paratext",
+                                        style={
+                                            'color': 'black',
+                                            'text-align': 'left'
+                                        }
+                                    ),
+                                    html.Div(
+                                        [
+                                            html.Div(
+                                                [
+                                                    html.P(['Energy Price Variability (%)'], className='paratext'),
+                                                    dcc.Input(
+                                                        id="risk-energy-cv",
+                                                        type="number",
+                                                        value=20,
+                                                        min=0,
+                                                        step=1,
+                                                        style={
+                                                            'fontFamily': "avenir",
+                                                            'fontSize': '16px',
+                                                            'color': 'white',
+                                                            'background-color': '#ea8f32',
+                                                            'width': '100px',
+                                                            'text-align': 'center'
+                                                        }
+                                                    ),
+                                                ],
+                                                className="three columns"
+                                            ),
+                                            html.Div(
+                                                [
+                                                    html.P(['Number of Draws'], className='paratext'),
+                                                    dcc.Input(
+                                                        id="risk-draws",
+                                                        type="number",
+                                                        value=100000,
+                                                        min=0,
+                                                        step=10000,
+                                                        style={
+                                                            'fontFamily': "avenir",
+                                                            'fontSize': '16px',
+                                                            'color': 'white',
+                                                            'background-color': '#ea8f32',
+                                                            'width': '100px',
+                                                            'text-align': 'center'
+                                                        }
+                                                    ),
+                                                ],
+                                                className="three columns"
+                                            ),
+                                            html.Div(
+                                                [
+                                                    html.P(['Random Seed'], className='paratext'),
+                                                    dcc.Input(
+                                                        id="risk-seed",
+                                                        type="number",
+                                                        value=1,
+                                                        min=0,
+                                                        step=1,
+                                                        style={
+                                                            'fontFamily': "avenir",
+                                                            'fontSize': '16px',
+                                                            'color': 'white',
+                                                            'background-color': '#ea8f32',
+                                                            'width': '100px',
+                                                            'text-align': 'center'
+                                                        }
+                                                    ),
+                                                ],
+                                                className="three columns"
+                                            ),
+                                            html.Div(
+                                                [
+                                                    html.Button(
+                                                        'Run',
+                                                        id='run-risk',
+                                                        n_clicks=0,
+                                                        className="clean-data-button",
+                                                        style={
+                                                            'border-left': '5px solid #ea8f32',
+                                                            'font-family': 'avenir',
+                                                            'width': '100%'
+                                                        }
+                                                    ),
+                                                ],
+                                                className="three columns",
+                                                style={
+                                                    'padding-top': '30px'
+                                                }
+                                            ),
+                                        ],
+                                        className="row"
+                                    ),
+                                    html.Div(id='risk-summary'),
+                                    html.Div(id='risk-heatmap'),
+                                ],
+                                className="paratext",
+                                style={
+                                    'color': '#ea8f32',
+                                    'text-align': 'center',
+                                    'padding-top': '30px'
+                                }
+                            ),
+                            # Bid optimiser
+                            html.Details(
+                                [
+                                    html.Summary('Explore: Optimal Bids and the Efficient Frontier'),
+                                    html.P(
+                                        [
+                                            "The bids with the highest expected profit (less the Risk Aversion "
+                                            "multiplied by the standard deviation of the profit) that stay within "
+                                            "the TCV at your Expected Utilisation Hours and within the bid "
+                                            "ceilings. The standard deviation uses the Energy Price Variability "
+                                            "above."
+                                        ],
+                                        className="paratext",
+                                        style={
+                                            'color': 'black',
+                                            'text-align': 'left'
+                                        }
+                                    ),
+                                    html.Div(
+                                        [
+                                            html.Div(
+                                                [
+                                                    html.P(['Risk Aversion'], className='paratext'),
+                                                    dcc.Input(
+                                                        id="opt-risk-aversion",
+                                                        type="number",
+                                                        value=0,
+                                                        min=0,
+                                                        step=0.1,
+                                                        style={
+                                                            'fontFamily': "avenir",
+                                                            'fontSize': '16px',
+                                                            'color': 'white',
+                                                            'background-color': '#ea8f32',
+                                                            'width': '100px',
+                                                            'text-align': 'center'
+                                                        }
+                                                    ),
+                                                ],
+                                                className="three columns"
+                                            ),
+                                            html.Div(
+                                                [
+                                                    html.Button(
+                                                        'Optimise',
+                                                        id='run-optimise',
+                                                        n_clicks=0,
+                                                        className="clean-data-button",
+                                                        style={
+                                                            'border-left': '5px solid #ea8f32',
+                                                            'font-family': 'avenir',
+                                                            'width': '100%'
+                                                        }
+                                                    ),
+                                                ],
+                                                className="three columns",
+                                                style={
+                                                    'padding-top': '30px'
+                                                }
+                                            ),
+                                        ],
+                                        className="row"
+                                    ),
+                                    html.Div(id='optimise-summary'),
+                                    html.Div(id='optimise-frontier'),
+                                ],
+                                className="paratext",
                                 style={
                                     'color': '#ea8f32',
                                     'text-align': 'center',
@@ -2090,8 +2160,10 @@ def calc_marg_energy_util_cost(duos_red, duos_green, energy_cost, asset_effic, a
     :return: marginal costs
     """
 
-    # Calculate the marginal energy cost of utilisation (£/kWh)
-    energy_SRMC = (1. / asset_effic) * energy_cost + (duos_green - duos_red) + lcos
+    # Calculate the marginal energy cost of utilisation (£/kWh), the marginal hourly cost of utilisation (£/hr), the
+    # marginal personnel cost of utilisation (£/kWh) and the total
+    energy_SRMC, hrly_util, person_SRMC, tot_SRMC = marginal_costs(asset_effic, asset_cap, energy_cost, duos_green,
+                                                                   duos_red, lcos, person_rate, util_person_hrs)
     marg_energy_util_cost = html.P(
         [
             " {:10.3f}".format(energy_SRMC)
@@ -2099,8 +2171,6 @@ def calc_marg_energy_util_cost(duos_red, duos_green, energy_cost, asset_effic, a
         className='paratext'
     )
 
-    # Calculate the marginal hourly cost of utilisation (£/hr)
-    hrly_util = person_rate * (util_person_hrs / 60)
     marg_hrly_util_cost = html.P(
         [
             " {:10.3f}".format(hrly_util)
@@ -2108,8 +2178,6 @@ def calc_marg_energy_util_cost(duos_red, duos_green, energy_cost, asset_effic, a
         className='paratext'
     )
 
-    # Calculate the marginal personnel cost of utilisation (£/kWh)
-    person_SRMC = hrly_util / asset_cap
     marg_person_SRMC = html.P(
         [
             " {:10.3f}".format(person_SRMC)
@@ -2117,7 +2185,6 @@ def calc_marg_energy_util_cost(duos_red, duos_green, energy_cost, asset_effic, a
         className='paratext'
     )
 
-    tot_SRMC = energy_SRMC + person_SRMC
     tot_SRMC_cost = html.P(
         [
             " {:10.3f}".format(tot_SRMC)
@@ -2171,75 +2238,15 @@ def datatables(tot_avail_hrs, tcv, exp_util_hrs, avail_bid, avail_ceil, util_bid
     :return: costing table
     """
 
-    """
-    S1: Utilisation versus costs
-    """
-    util_costs_df = pd.DataFrame(np.arange(0, tot_avail_hrs + 1), columns=['Actual Utilisation Hours'])
-    util_costs_df['Energy (kWh)'] = util_costs_df['Actual Utilisation Hours'] * asset_cap
-
-    # Calculate the marginal energy cost of utilisation (£/kWh) and the marginal hourly cost of utilisation (£/hr)
-    energy_SRMC_calc_tmp = (1. / asset_effic) * energy_cost + (duos_green - duos_red) + lcos
-    hrly_util_calc_tmp = person_rate * (util_person_hrs / 60)
-
-    util_costs_df['Marginal Cost of Utilisation (£)'] = (util_costs_df['Energy (kWh)'] * energy_SRMC_calc_tmp) + \
-                                                        (util_costs_df['Actual Utilisation Hours'] * hrly_util_calc_tmp)
-
-    # TODO: Does not include an option for 'Other Fixed Costs' at the moment to reduce complexity as
-    #  there doesn't seem to be much of a case for it for an intial version
-    util_costs_df['Fixed Participation Cost (£)'] = person_rate * (fixed_person_hrs / 60)
-    util_costs_df['Operational Cost (£)'] = util_costs_df['Marginal Cost of Utilisation (£)'] + \
-                                            util_costs_df['Fixed Participation Cost (£)']
-
-    # Set index for datatable
-    util_costs_df.set_index('Actual Utilisation Hours')
-
-    """
-    S2: Maximising Availability
-    """
-    max_avail_costs_df = pd.DataFrame(np.arange(0, tot_avail_hrs + 1), columns=['Actual Utilisation Hours'])
-
-    # Enter the user submitted bid and calc. Revenue and Profit
-    max_avail_costs_df['Availability Bid (£)'] = avail_ceil
-    max_avail_costs_df['Revenue (£)'] = avail_ceil * tot_avail_hrs * asset_cap
-    max_avail_costs_df['Operational Profit (£)'] = max_avail_costs_df['Revenue (£)'] - util_costs_df[
-        'Operational Cost (£)']
-    max_avail_costs_df['TCV (£/kWh)'] = max_avail_costs_df['Revenue (£)'] / util_costs_df['Energy (kWh)']
-
-    """
-    S3: Maximising Utilisation
-    """
-    max_util_costs_df = pd.DataFrame(np.arange(0, tot_avail_hrs + 1), columns=['Actual Utilisation Hours'])
-
-    # Enter the user submitted bid and calc. Revenue and Profit
-    max_util_costs_df['Utilisation Bid (£)'] = util_ceil
-    max_util_costs_df['Revenue (£)'] = util_costs_df['Energy (kWh)'] * util_ceil
-    max_util_costs_df['Operational Profit (£)'] = max_util_costs_df['Revenue (£)'] - util_costs_df[
-        'Operational Cost (£)']
-    max_util_costs_df['TCV (£/kWh)'] = max_util_costs_df['Revenue (£)'] / util_costs_df['Energy (kWh)']
-
-    """
-    S4: Break Even
-    """
-    break_even_costs_df = pd.DataFrame(np.arange(0, tot_avail_hrs + 1), columns=['Actual Utilisation Hours'])
-
-    # Calculate the Break Even params. based on user input
-    break_even_costs_df['Availability Bid (£)'] = (person_rate * (fixed_person_hrs / 60)) / asset_cap / tot_avail_hrs
-    break_even_costs_df['Utilisatin Bid (£)'] = tot_marg_cost(asset_effic, asset_cap, energy_cost, duos_green, duos_red,
-                                                              lcos, person_rate, util_person_hrs)
-    break_even_costs_df['Revenue (£)'] = (break_even_costs_df['Availability Bid (£)'] * tot_avail_hrs * asset_cap) + \
-                                         (break_even_costs_df['Utilisatin Bid (£)'] * util_costs_df['Energy (kWh)'])
-    break_even_costs_df['Operational Profit (£)'] = break_even_costs_df['Revenue (£)'] - util_costs_df[
-        'Operational Cost (£)']
-    break_even_costs_df['TCV (£/kWh)'] = break_even_costs_df['Revenue (£)'] / util_costs_df['Energy (kWh)']
-
-    """
-    S5: User-Defined Bids and Costs
-    """
-    tot_SRMC = tot_marg_cost(asset_effic, asset_cap, energy_cost, duos_green,
-                             duos_red, lcos, person_rate, util_person_hrs)
-
-    user_bid_df = calc_costs(asset_cap, avail_bid, util_bid, person_rate,
-                             fixed_person_hrs, tot_SRMC, tot_avail_hrs)[1]
+    # The cost tables (S1 - S5) are taken from the cached scenario of the user inputs
+    tables = scenario(tot_avail_hrs, tcv, exp_util_hrs, avail_bid, avail_ceil, util_bid, util_ceil, duos_red,
+                      duos_green, energy_cost, asset_effic, asset_cap, lcos, person_rate, fixed_person_hrs,
+                      util_person_hrs).tables
+    util_costs_df = tables["S1: Utilisation vs Costs"]
+    max_avail_costs_df = tables["S2: Maximising Availability"]
+    max_util_costs_df = tables["S3: Maximising Utilisation"]
+    break_even_costs_df = tables["S4: Break Even Costs"]
+    user_bid_df = tables["S5: User-Defined Bids"]
 
     # Produce data tables for reporting in thr Bid Analysis tab
     # TODO: Need to fix the unexpected left margins in the columns
@@ -2436,70 +2443,6 @@ def datatables(tot_avail_hrs, tcv, exp_util_hrs, avail_bid, avail_ceil, util_bid
         return html.Div([])
 
 
-@app.callback(Output('maxout_tcv_bids', 'children'),
-              [Input('tot-avail-hrs', 'value'),
-               Input('tcv', 'value'),
-               Input('exp-util-hrs', 'value'),
-               Input('avail-ceil', 'value'),
-               Input('util-ceil', 'value'),
-               Input('asset-cap', 'value'),
-               Input('weight-slider', 'value')])
-def maxout_tcv_display(tot_avail_hrs, tcv, exp_util_hrs, avail_ceil, util_ceil, asset_cap, bid_weight):
-    """
-    Calculates and updates the Availability and Utilisation bids (to maxout the TCV)
-    depnding on the user weighting input from slider
-
-    :param tot_avail_hrs:
-    :param tcv:
-    :param exp_util_hrs:
-    :param avail_ceil:
-    :param util_ceil:
-    :param asset_cap:
-    :param bid_weight:
-    :return:
-    """
-    avail, util = maxout_tcv(tcv, exp_util_hrs, tot_avail_hrs, util_ceil, avail_ceil, asset_cap, bid_weight)
-
-    maxout_tcv_bids = html.Div(
-        [
-            html.Div(
-                [
-                    html.P(
-                        [
-                            "Availability Bid: ",
-                            html.Span("£{:.3f}".format(avail), style={"color": "#ea8f32"})
-                        ],
-                        className="paratext"
-                    )
-                ],
-                className="six columns",
-                style={
-                    'textAlign': 'right'
-                }
-            ),
-            html.Div(
-                [
-                    html.P(
-                        [
-                            "Utilisation Bid: ",
-                            html.Span("£{:.3f}".format(util), style={"color": "#ea8f32"})
-                        ],
-                        className="paratext"
-                    )
-                ],
-                className="six columns"
-            ),
-        ],
-        className="row",
-        style={
-            'padding-top': '30px',
-            'padding-bottom': '50px'
-        }
-    )
-
-    return maxout_tcv_bids
-
-
 @app.callback([Output('max-bids', 'children'),
                Output('exceed-warning', 'children')],
               [Input('tot-avail-hrs', 'value'),
@@ -2509,10 +2452,22 @@ def maxout_tcv_display(tot_avail_hrs, tcv, exp_util_hrs, avail_ceil, util_ceil,
                Input('avail-ceil', 'value'),
                Input('util-bid', 'value'),
                Input('util-ceil', 'value'),
-               Input('asset-cap', 'value')])
-def max_bid_calcs(tot_avail_hrs, tcv, exp_util_hrs, avail_bid, avail_ceil, util_bid, util_ceil, asset_cap):
-    avail_max = calc_avail_bid(tcv, exp_util_hrs, tot_avail_hrs, util_bid, avail_ceil, asset_cap)[0]
-    util_max = calc_util_bid(tcv, exp_util_hrs, tot_avail_hrs, avail_bid, util_ceil, asset_cap)[0]
+               Input('asset-cap', 'value')],
+              [State('duos-red', 'value'),
+               State('duos-green', 'value'),
+               State('energy-cost', 'value'),
+               State('asset-effic', 'value'),
+               State('lcos', 'value'),
+               State('person-rate', 'value'),
+               State('fixed-person-hrs', 'value'),
+               State('util-person-hrs', 'value')])
+def max_bid_calcs(tot_avail_hrs, tcv, exp_util_hrs, avail_bid, avail_ceil, util_bid, util_ceil, asset_cap, duos_red,
+                  duos_green, energy_cost, asset_effic, lcos, person_rate, fixed_person_hrs, util_person_hrs):
+    # The maximum bids are taken from the cached scenario of the user inputs
+    scn = scenario(tot_avail_hrs, tcv, exp_util_hrs, avail_bid, avail_ceil, util_bid, util_ceil, duos_red,
+                   duos_green, energy_cost, asset_effic, asset_cap, lcos, person_rate, fixed_person_hrs,
+                   util_person_hrs)
+    avail_max, util_max = scn.avail_max, scn.util_max
 
     max_bids = html.Div(
         [
@@ -2580,7 +2535,7 @@ def max_bid_calcs(tot_avail_hrs, tcv, exp_util_hrs, avail_bid, avail_ceil, util_
     return max_bids, exceed_warning
 
 
-@app.callback([Output('expt-vs-actual-heatmap', 'children'),
+@app.callback([Output('profit-cube', 'data'),
                Output('weight-vs-actual-heatmap', 'children'),
                Output('profit-vs-actual-plot', 'children')],
               [Input('tot-avail-hrs', 'value'),
@@ -2598,34 +2553,211 @@ def max_bid_calcs(tot_avail_hrs, tcv, exp_util_hrs, avail_bid, avail_ceil, util_
                Input('lcos', 'value'),
                Input('person-rate', 'value'),
                Input('fixed-person-hrs', 'value'),
-               Input('util-person-hrs', 'value'),
-               Input('weight-slider', 'value')])
+               Input('util-person-hrs', 'value')],
+              [State('weight-slider', 'value')])
 def heatmaps_plots(tot_avail_hrs, tcv, exp_util_hrs, avail_ceil, avail_bid, util_ceil, util_bid, duos_red,
              duos_green, energy_cost, asset_effic, asset_cap, lcos, person_rate,
              fixed_person_hrs, util_person_hrs, weight):
 
     # TODO: Plotting colours need to be more consistent in all plots.
-    tot_SRMC = tot_marg_cost(asset_effic, asset_cap, energy_cost, duos_green,
-                             duos_red, lcos, person_rate, util_person_hrs)
-
-    profits = profit_vs_expected_util(tcv, exp_util_hrs, tot_avail_hrs, util_ceil, avail_ceil, asset_cap, fixed_person_hrs,
-                                      person_rate, tot_SRMC)
+    # The profit matrix is taken from the cached scenario of the user inputs
+    scn = scenario(tot_avail_hrs, tcv, exp_util_hrs, avail_bid, avail_ceil, util_bid, util_ceil, duos_red,
+                   duos_green, energy_cost, asset_effic, asset_cap, lcos, person_rate, fixed_person_hrs,
+                   util_person_hrs)
 
     # Various figures for visualisation
-    expt_vs_actual_heatmap = plot_exp_vs_act_heatmap(tot_avail_hrs, exp_util_hrs, profits, weight)
-    weight_vs_actual_heatmap = plot_weight_vs_act_heatmap_plotly(profits, exp_util_hrs, tot_avail_hrs, util_ceil)
+    expt_vs_actual_heatmap = plot_exp_vs_act_heatmap(tot_avail_hrs, exp_util_hrs, scn.profits, weight)
+    weight_vs_actual_heatmap = plot_weight_vs_act_heatmap_plotly(scn.profits, exp_util_hrs, tot_avail_hrs, util_ceil)
+    profit_vs_actual_plot = profit_vs_actual_plotly(scn.profit_lines, exp_util_hrs, tot_avail_hrs)
 
-    # TODO: Yes, I know, this is messy and certainly not efficent! Well be corrected with module pairing
-    profit_vs_actual_plot = profit_vs_actual_plotly(tcv, exp_util_hrs, tot_avail_hrs, asset_effic, asset_cap,
-                                                    energy_cost, duos_green, duos_red, lcos, util_bid,
-                                                    util_ceil, avail_bid, avail_ceil, person_rate,
-                                                    fixed_person_hrs, util_person_hrs)
+    # The profit matrix is sent to the browser once per scenario together with the expected vs actual heatmap
+    # (without its values) and the max out bids, as the weight slider is handled clientside
+    expt_vs_actual_heatmap.update_traces(z=None, text=None)
+    profit_cube = encode_profits(scn.profits)
+    profit_cube.update({'figure': expt_vs_actual_heatmap.to_plotly_json(), 'bids': scn.maxout_bids.tolist()})
 
-    return dcc.Graph(figure=expt_vs_actual_heatmap), \
+    return profit_cube, \
            dcc.Graph(figure=weight_vs_actual_heatmap), \
            dcc.Graph(figure=profit_vs_actual_plot)
 
 
+app.clientside_callback(
+    ClientsideFunction(namespace='bid', function_name='expt_vs_actual'),
+    Output('expt-vs-actual-graph', 'figure'),
+    [Input('weight-slider', 'value'),
+     Input('profit-cube', 'data')]
+)
+
+
+app.clientside_callback(
+    ClientsideFunction(namespace='bid', function_name='maxout_bids'),
+    [Output('maxout-avail-bid', 'children'),
+     Output('maxout-util-bid', 'children')],
+    [Input('weight-slider', 'value'),
+     Input('profit-cube', 'data')]
+)
+
+
+@app.callback([Output('risk-summary', 'children'),
+               Output('risk-heatmap', 'children')],
+              [Input('run-risk', 'n_clicks')],
+              [State('tot-avail-hrs', 'value'),
+               State('exp-util-hrs', 'value'),
+               State('avail-bid', 'value'),
+               State('avail-ceil', 'value'),
+               State('util-bid', 'value'),
+               State('util-ceil', 'value'),
+               State('duos-red', 'value'),
+               State('duos-green', 'value'),
+               State('energy-cost', 'value'),
+               State('asset-effic', 'value'),
+               State('asset-cap', 'value'),
+               State('lcos', 'value'),
+               State('person-rate', 'value'),
+               State('fixed-person-hrs', 'value'),
+               State('util-person-hrs', 'value'),
+               State('risk-energy-cv', 'value'),
+               State('risk-draws', 'value'),
+               State('risk-seed', 'value')])
+def risk_panel(run, tot_avail_hrs, exp_util_hrs, avail_bid, avail_ceil, util_bid, util_ceil, duos_red, duos_green,
+               energy_cost, asset_effic, asset_cap, lcos, person_rate, fixed_person_hrs, util_person_hrs,
+               energy_cv, n_draws, seed):
+    """
+    Monte Carlo risk of the user bids and of a grid of bids up to the bid ceilings
+
+    :return: summary of the user bids, heatmap of the expected profit of the grid of bids
+    """
+    if not run or not n_draws:
+        raise PreventUpdate
+
+    # Draw the outcomes and evaluate the user bids followed by the grid of bids
+    util_hrs, energy_price = draw_outcomes(int(n_draws), tot_avail_hrs, exp_util_hrs, energy_cost,
+                                           (energy_cv or 0) / 100, seed)
+    grid_avail, grid_util = bid_grid(avail_ceil, util_ceil)
+    risk_df = bid_risk(np.r_[avail_bid, grid_avail], np.r_[util_bid, grid_util], util_hrs, energy_price,
+                       tot_avail_hrs, asset_effic, asset_cap, duos_green, duos_red, lcos, person_rate,
+                       fixed_person_hrs, util_person_hrs)
+    user_risk, grid_risk = risk_df.iloc[0], risk_df.iloc[1:]
+
+    risk_summary = html.P(
+        [
+            "For your bids, the expected profit is ",
+            html.Span("£{:.2f}".format(user_risk['Expected Profit (£)']), style={"color": "#ea8f32"}),
+            " (P10: £{:.2f}, P90: £{:.2f}) with a ".format(user_risk['P10 Profit (£)'],
+                                                             user_risk['P90 Profit (£)']),
+            html.Span("{:.1f}%".format(user_risk['Probability of Loss'] * 100), style={"color": "#ea8f32"}),
+            " probability of making a loss."
+        ],
+        className="paratext",
+        style={
+            'color': 'black',
+            'padding-top': '30px'
+        }
+    )
+
+    # Heatmap of the expected profit with the probability of loss shown on hover
+    n_avail, n_util = len(np.unique(grid_avail)), len(np.unique(grid_util))
+    fig = make_subplots()
+    fig.add_trace(go.Heatmap(x=np.unique(grid_util),
+                             y=np.unique(grid_avail),
+                             z=grid_risk['Expected Profit (£)'].values.reshape(n_avail, n_util),
+                             customdata=grid_risk['Probability of Loss'].values.reshape(n_avail, n_util) * 100,
+                             hovertemplate='Utilisation Bid: £%{x:.3f}<br>Availability Bid: £%{y:.3f}<br>'
+                                           'Expected Profit: £%{z:.2f}<br>Probability of Loss: %{customdata:.1f}%'
+                                           '<extra></extra>',
+                             colorscale='RdBu',
+                             zmid=0,
+                             colorbar={"title": 'Expected Profit (£)'}))
+    fig.add_trace(go.Scatter(x=[util_bid], y=[avail_bid], mode='markers', name='Your bids',
+                             marker={'color': 'black', 'symbol': 'x', 'size': 10}))
+    fig.update_xaxes(title_text="Utilisation Bid (£/kWh)")
+    fig.update_yaxes(title_text="Availability Bid (£/kW/h)")
+    fig.update_layout(showlegend=False)
+
+    return risk_summary, dcc.Graph(figure=fig)
+
+
+@app.callback([Output('optimise-summary', 'children'),
+               Output('optimise-frontier', 'children')],
+              [Input('run-optimise', 'n_clicks')],
+              [State('tot-avail-hrs', 'value'),
+               State('tcv', 'value'),
+               State('exp-util-hrs', 'value'),
+               State('avail-bid', 'value'),
+               State('avail-ceil', 'value'),
+               State('util-bid', 'value'),
+               State('util-ceil', 'value'),
+               State('duos-red', 'value'),
+               State('duos-green', 'value'),
+               State('energy-cost', 'value'),
+               State('asset-effic', 'value'),
+               State('asset-cap', 'value'),
+               State('lcos', 'value'),
+               State('person-rate', 'value'),
+               State('fixed-person-hrs', 'value'),
+               State('util-person-hrs', 'value'),
+               State('risk-energy-cv', 'value'),
+               State('opt-risk-aversion', 'value')])
+def optimise_panel(run, tot_avail_hrs, tcv, exp_util_hrs, avail_bid, avail_ceil, util_bid, util_ceil, duos_red,
+                   duos_green, energy_cost, asset_effic, asset_cap, lcos, person_rate, fixed_person_hrs,
+                   util_person_hrs, energy_cv, risk_aversion):
+    """
+    Optimal bids for the user inputs and the efficient frontier of the expected profit against its standard deviation
+
+    :return: summary of the optimal bids, plot of the frontier
+    """
+    if not run:
+        raise PreventUpdate
+
+    tot_SRMC = marginal_costs(asset_effic, asset_cap, energy_cost, duos_green, duos_red, lcos, person_rate,
+                              util_person_hrs)[3]
+    fixed_cost = (fixed_person_hrs / 60) * person_rate
+    energy_cv = (energy_cv or 0) / 100
+
+    frontier_df = bid_frontier(tcv, exp_util_hrs, tot_avail_hrs, avail_ceil, util_ceil, asset_cap, asset_effic,
+                               tot_SRMC, fixed_cost, energy_cost, energy_cv)
+    optimum = optimal_bids(frontier_df, risk_aversion or 0)
+    user_mean, user_std = profit_moments(np.array([avail_bid]), np.array([util_bid]), tot_avail_hrs, exp_util_hrs,
+                                         asset_cap, asset_effic, tot_SRMC, fixed_cost, energy_cost, energy_cv)
+
+    optimise_summary = html.P(
+        [
+            "The optimal bids are an Availability Bid of ",
+            html.Span("£{:.3f}".format(optimum['Availability Bid (£/kW/h)']), style={"color": "#ea8f32"}),
+            " and a Utilisation Bid of ",
+            html.Span("£{:.3f}".format(optimum['Utilisation Bid (£/kWh)']), style={"color": "#ea8f32"}),
+            ", with an expected profit of £{:.2f} (std. dev. £{:.2f}) against £{:.2f} (std. dev. £{:.2f}) for your "
+            "bids.".format(optimum['Expected Profit (£)'], optimum['Profit Std. Dev. (£)'], user_mean[0],
+                           user_std[0])
+        ],
+        className="paratext",
+        style={
+            'color': 'black',
+            'padding-top': '30px'
+        }
+    )
+
+    # The boundary of the feasible bids with the efficient frontier, the optimal bids and the user bids
+    hover = 'Availability Bid: £%{customdata[0]:.3f}<br>Utilisation Bid: £%{customdata[1]:.3f}<br>' \
+            'Expected Profit: £%{y:.2f}<br>Std. Dev.: £%{x:.2f}<extra></extra>'
+    efficient_df = frontier_df[frontier_df['Efficient']]
+    fig = make_subplots()
+    for name, df, colour in [('TCV boundary', frontier_df, 'lightgrey'), ('Efficient frontier', efficient_df,
+                                                                           '#ea8f32')]:
+        fig.add_trace(go.Scatter(x=df['Profit Std. Dev. (£)'], y=df['Expected Profit (£)'], mode='lines', name=name,
+                                 line={'color': colour, 'width': 3},
+                                 customdata=df[['Availability Bid (£/kW/h)', 'Utilisation Bid (£/kWh)']].values,
+                                 hovertemplate=hover))
+    fig.add_trace(go.Scatter(x=[optimum['Profit Std. Dev. (£)']], y=[optimum['Expected Profit (£)']],
+                             mode='markers', name='Optimal bids', marker={'color': 'black', 'size': 10}))
+    fig.add_trace(go.Scatter(x=user_std, y=user_mean, mode='markers', name='Your bids',
+                             marker={'color': 'black', 'symbol': 'x', 'size': 10}))
+    fig.update_xaxes(title_text="Profit Standard Deviation (£)")
+    fig.update_yaxes(title_text="Expected Profit (£)")
+
+    return optimise_summary, dcc.Graph(figure=fig)
+
+
 @app.callback(Output('debug-submission', 'children'),
               [Input('input-name', 'value'),
                Input('input-email', 'value'),
@@ -2654,6 +2786,7 @@ def debug_submission(name, email, issue_page, issue_descrip, rating, debug):
 
             # Needed for YAGMAIL service keychain credentials. NOT Secure but this email is simply for debugging
             # Need to determine how to access creds on the server to prevent hardcoding pwd
+            import yagmail
             yag_service = yagmail.SMTP("projectleodebug@gmail.com", "ProjecTLEODebuG2021")
 
             # Send emails to the app developers based on the user input
@@ -0,0 +1,60 @@
+/*
+Clientside callbacks of the Project LEO Bid Calculator. The profit matrix of the current scenario is sent once by the
+server (see 'encode_profits' in scripts/dash_bidCalcs.py) and the weight slider is then handled in the browser by
+slicing the matrix, without a round trip to the server.
+*/
+
+// The decoded matrix of the last scenario (decoding is only done when a new scenario is received)
+var profitCache = {encoded: null, values: null};
+
+function decodeProfits(cube) {
+    if (profitCache.encoded !== cube.planes) {
+        var bin = atob(cube.planes);
+        var bytes = new Uint8Array(bin.length);
+        for (var i = 0; i < bin.length; i++) {
+            bytes[i] = bin.charCodeAt(i);
+        }
+        profitCache = {encoded: cube.planes, values: new Float64Array(bytes.buffer)};
+    }
+    return profitCache.values;
+}
+
+// The weight index of the slider value (the weights of the matrix are evenly spaced from 0 to 1)
+function weightIndex(weight, nWeights) {
+    return Math.min(Math.max(Math.round(weight * (nWeights - 1)), 0), nWeights - 1);
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    bid: {
+        // Expected vs actual utilisation heatmap for the bid weighting of the slider
+        expt_vs_actual: function(weight, cube) {
+            if (!cube) {
+                return window.dash_clientside.no_update;
+            }
+            var values = decodeProfits(cube);
+            var nExp = cube.shape[0], nWeights = cube.shape[1], nAct = cube.shape[2];
+            var w = weightIndex(weight, nWeights);
+
+            var z = [];
+            for (var e = 0; e < nExp; e++) {
+                var start = (cube.rows[e] * nWeights + w) * nAct;
+                z.push(Array.from(values.subarray(start, start + nAct)));
+            }
+
+            // The figure of the scenario is copied so that the stored figure is not changed
+            var figure = JSON.parse(JSON.stringify(cube.figure));
+            figure.data[0].z = z;
+            figure.data[0].text = z;
+            return figure;
+        },
+
+        // Availability and utilisation bids that max out the TCV for the bid weighting of the slider
+        maxout_bids: function(weight, cube) {
+            if (!cube) {
+                return [window.dash_clientside.no_update, window.dash_clientside.no_update];
+            }
+            var bids = cube.bids[weightIndex(weight, cube.bids.length)];
+            return ['£' + bids[0].toFixed(3), '£' + bids[1].toFixed(3)];
+        }
+    }
+});
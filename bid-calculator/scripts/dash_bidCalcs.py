@@ -0,0 +1,365 @@
+"""
+This python module contains the calculations of the Project LEO Bid Calculator. The calculations are kept separate from
+the Dash layout and callbacks so that they can be shared across callbacks through the 'scenario' function.
+
+A scenario is every output of the calculator for one set of user inputs (the costs, the bids that max out the TCV for
+each bid weighting, the cost tables and the profit matrix). Scenarios are held in a bounded least-recently-used cache
+keyed on the inputs, so a callback that only changes the view of a scenario (e.g. the weight slider) slices the cached
+arrays instead of repeating the calculations.
+
+NB: The arrays and dataframes of a cached scenario are shared between callbacks and must not be modified in place.
+"""
+
+# Importing the relevant modules
+from functools import lru_cache
+import pandas as pd
+import base64
+import numpy as np
+
+# The number of scenarios held in the cache
+SCENARIO_CACHE_SIZE = 32
+
+# The bid weightings of the profit matrix (the steps of the weight slider)
+WEIGHT_RANGE = np.linspace(0.0, 1.0, 11)
+
+
+# TODO: Does not include 'Other Fixed' at the moment
+def tot_marg_cost(asset_effic, asset_cap, energy_cost, duos_green,
+                  duos_red, lcos, person_rate, util_person_hrs):
+    """
+    Simple function to determine the total marginal cost
+
+    :param asset_effic:
+    :param asset_cap:
+    :param energy_cost:
+    :param duos_green:
+    :param duos_red:
+    :param lcos:
+    :param person_rate:
+    :param util_person_hrs:
+
+    :return: tot_SRMC
+
+    """
+    # TODO: Does not include hrs_per_util variable as this is assumed to be 1.0
+    energy_SRMC = (1. / asset_effic) * energy_cost + (duos_green - duos_red) + lcos
+    hrly_util = person_rate * (util_person_hrs / 60)
+    person_SRMC = hrly_util / asset_cap
+    tot_SRMC = energy_SRMC + person_SRMC
+
+    return tot_SRMC
+
+
+def calc_avail_bid(tcv, exp_util_hrs, tot_avail_hrs, util_bid, avail_ceil, asset_cap):
+    """
+    Given a utilisation bid, calculate max availability bid and be equal to TCV
+    Returns
+    """
+    remaining_tcv = tcv - util_bid
+    weight = util_bid / tcv
+    avail_max = ((remaining_tcv * exp_util_hrs * asset_cap)
+                 / asset_cap
+                 / tot_avail_hrs)
+    avail = np.min([avail_ceil, avail_max])
+
+    return avail, weight
+
+
+def calc_util_bid(tcv, exp_util_hrs, tot_avail_hrs, avail_bid, util_ceil, asset_cap):
+    """
+    Given an availability bid, calculate max utilisation bid and be equal to TCV
+    Returns
+    """
+    util_max = (((tcv * exp_util_hrs * asset_cap) - (avail_bid * tot_avail_hrs * asset_cap))
+                / (exp_util_hrs * asset_cap))
+    util = np.min([util_ceil, util_max])
+    weight = util / tcv
+
+    return util, weight
+
+
+def maxout_tcv(tcv, exp_util_hrs, tot_avail_hrs, util_ceil, avail_ceil, asset_cap, bid_weight):
+    """
+    This calculates the availability and utilisation bids to max out the tcv
+    for a given expected number of hours of delivery. This can be used to
+    replicate Harry Orchards original analysis with bid_weight 0 for
+    all availability and 1 for all utilisaton.
+    """
+    util_max = bid_weight * tcv
+    avail_max = ((((1 - bid_weight) * tcv) * exp_util_hrs * asset_cap)
+                 / asset_cap
+                 / tot_avail_hrs)
+
+    util = np.min([util_max, util_ceil])
+    avail = np.min([avail_ceil, avail_max])
+
+    return avail, util
+
+
+def calc_costs(asset_cap, avail_bid, util_bid, person_rate, fixed_person_hrs, tot_SRMC, tot_avail_hrs):
+    """
+    Calculates the costs of participation, revenue and profit
+    """
+    # Create starting lists This is adapted from the original function to remove the isinstance and list checks and
+    # this can be constrained at point of user input. List input avoided for simplification of tool in v1.0
+    util_hours = np.arange(0, (tot_avail_hrs + 1), 1.0)
+    avail_bids = [avail_bid] * len(util_hours)
+    util_bids = [util_bid] * len(util_hours)
+
+    # Creating data for the data table columns
+    energy = util_hours * asset_cap
+    tot_SRMC = [tot_SRMC] * len(util_hours)
+    marginal_cost = tot_SRMC * energy
+    fixed_cost = (fixed_person_hrs / 60) * person_rate
+    fixed_cost = np.ones(util_hours.shape) * fixed_cost
+    tot_cost = marginal_cost + fixed_cost
+    revenue = (util_bids * energy) + (avail_bid * asset_cap * tot_avail_hrs)
+    profit = revenue - tot_cost
+    tcv = revenue / energy
+
+    # Full data matrix and dataframe creation
+    cost_matrix = np.array([util_hours, energy, avail_bids, util_bids, marginal_cost,
+                            fixed_cost, tot_cost, revenue, profit, tcv])
+
+    # TODO: Need to ensure column headers are consistently named throughout tables
+    cost_df = pd.DataFrame(cost_matrix.T,
+                           columns=["Utilisation Hours",
+                                    "Energy (kWh)",
+                                    "Availability Bid (£/kW/h)",
+                                    "Utilisation Bid (£/kWh)",
+                                    "Marginal Cost (£)",
+                                    "Auction Fixed Cost (£)",
+                                    "Total Service Cost (£)",
+                                    "Revenue (£)",
+                                    "Profit (£)",
+                                    "TCV (£/kWh)"])
+
+    return cost_matrix, cost_df
+
+
+def profit_vs_expected_util(tcv, exp_util_hrs, tot_avail_hrs, util_ceil, avail_ceil, asset_cap, fixed_person_hrs,
+                            person_rate, tot_SRMC):
+    """
+    Calculate 3D matrix of profit for expected utilisation vs actual
+    utilisation for a particular set of bids and strategy weight.
+
+    The matrix (expected utilisation, weight, actual utilisation) is calculated through numpy broadcasting and gives
+    the same values as looping over 'maxout_tcv' and 'calc_costs' for each expected utilisation and weight pair.
+    """
+
+    exp_util_range = np.arange(0.0, tot_avail_hrs + 1, 1.0)
+    weight_range = np.linspace(0.0, 1.0, 11)
+
+    # Axes of the (weight, actual utilisation) plane
+    weight = weight_range[:, None]
+    util_hours = exp_util_range[None, :]
+
+    # Bids that max out the TCV for each weight (see 'maxout_tcv')
+    util_bid = np.minimum(weight * tcv, util_ceil)
+    avail_bid = np.minimum(avail_ceil, ((((1 - weight) * tcv) * exp_util_hrs * asset_cap)
+                                        / asset_cap
+                                        / tot_avail_hrs))
+
+    # Costs, revenue and profit for each actual utilisation (see 'calc_costs'). The fixed cost follows the argument
+    # order used by the original loop: calc_costs(..., fixed_person_hrs / 60, person_rate, ...)
+    energy = util_hours * asset_cap
+    fixed_cost = (person_rate / 60) * (fixed_person_hrs / 60)
+    tot_cost = tot_SRMC * energy + fixed_cost
+    revenue = (util_bid * energy) + (avail_bid * asset_cap * tot_avail_hrs)
+    profit = revenue - tot_cost
+
+    # The bids of every expected utilisation row are based on the user's 'exp_util_hrs', so the rows are the same
+    # plane broadcast along the expected utilisation axis
+    profits = np.broadcast_to(profit, (len(exp_util_range),) + profit.shape).copy()
+
+    return profits
+
+
+def cost_tables(tot_avail_hrs, avail_bid, avail_ceil, util_bid, util_ceil, duos_red, duos_green, energy_cost,
+                asset_effic, asset_cap, lcos, person_rate, fixed_person_hrs, util_person_hrs):
+    """
+    Produces the cost tables of the Bid Analysis tab (S1 - S5)
+
+    :return: dict of the cost tables
+    """
+
+    """
+    S1: Utilisation versus costs
+    """
+    util_costs_df = pd.DataFrame(np.arange(0, tot_avail_hrs + 1), columns=['Actual Utilisation Hours'])
+    util_costs_df['Energy (kWh)'] = util_costs_df['Actual Utilisation Hours'] * asset_cap
+
+    # Calculate the marginal energy cost of utilisation (£/kWh) and the marginal hourly cost of utilisation (£/hr)
+    energy_SRMC_calc_tmp = (1. / asset_effic) * energy_cost + (duos_green - duos_red) + lcos
+    hrly_util_calc_tmp = person_rate * (util_person_hrs / 60)
+
+    util_costs_df['Marginal Cost of Utilisation (£)'] = (util_costs_df['Energy (kWh)'] * energy_SRMC_calc_tmp) + \
+                                                        (util_costs_df['Actual Utilisation Hours'] * hrly_util_calc_tmp)
+
+    # TODO: Does not include an option for 'Other Fixed Costs' at the moment to reduce complexity as
+    #  there doesn't seem to be much of a case for it for an intial version
+    util_costs_df['Fixed Participation Cost (£)'] = person_rate * (fixed_person_hrs / 60)
+    util_costs_df['Operational Cost (£)'] = util_costs_df['Marginal Cost of Utilisation (£)'] + \
+                                            util_costs_df['Fixed Participation Cost (£)']
+
+    # Set index for datatable
+    util_costs_df.set_index('Actual Utilisation Hours')
+
+    """
+    S2: Maximising Availability
+    """
+    max_avail_costs_df = pd.DataFrame(np.arange(0, tot_avail_hrs + 1), columns=['Actual Utilisation Hours'])
+
+    # Enter the user submitted bid and calc. Revenue and Profit
+    max_avail_costs_df['Availability Bid (£)'] = avail_ceil
+    max_avail_costs_df['Revenue (£)'] = avail_ceil * tot_avail_hrs * asset_cap
+    max_avail_costs_df['Operational Profit (£)'] = max_avail_costs_df['Revenue (£)'] - util_costs_df[
+        'Operational Cost (£)']
+    max_avail_costs_df['TCV (£/kWh)'] = max_avail_costs_df['Revenue (£)'] / util_costs_df['Energy (kWh)']
+
+    """
+    S3: Maximising Utilisation
+    """
+    max_util_costs_df = pd.DataFrame(np.arange(0, tot_avail_hrs + 1), columns=['Actual Utilisation Hours'])
+
+    # Enter the user submitted bid and calc. Revenue and Profit
+    max_util_costs_df['Utilisation Bid (£)'] = util_ceil
+    max_util_costs_df['Revenue (£)'] = util_costs_df['Energy (kWh)'] * util_ceil
+    max_util_costs_df['Operational Profit (£)'] = max_util_costs_df['Revenue (£)'] - util_costs_df[
+        'Operational Cost (£)']
+    max_util_costs_df['TCV (£/kWh)'] = max_util_costs_df['Revenue (£)'] / util_costs_df['Energy (kWh)']
+
+    """
+    S4: Break Even
+    """
+    break_even_costs_df = pd.DataFrame(np.arange(0, tot_avail_hrs + 1), columns=['Actual Utilisation Hours'])
+
+    # Calculate the Break Even params. based on user input
+    break_even_costs_df['Availability Bid (£)'] = (person_rate * (fixed_person_hrs / 60)) / asset_cap / tot_avail_hrs
+    break_even_costs_df['Utilisatin Bid (£)'] = tot_marg_cost(asset_effic, asset_cap, energy_cost, duos_green, duos_red,
+                                                              lcos, person_rate, util_person_hrs)
+    break_even_costs_df['Revenue (£)'] = (break_even_costs_df['Availability Bid (£)'] * tot_avail_hrs * asset_cap) + \
+                                         (break_even_costs_df['Utilisatin Bid (£)'] * util_costs_df['Energy (kWh)'])
+    break_even_costs_df['Operational Profit (£)'] = break_even_costs_df['Revenue (£)'] - util_costs_df[
+        'Operational Cost (£)']
+    break_even_costs_df['TCV (£/kWh)'] = break_even_costs_df['Revenue (£)'] / util_costs_df['Energy (kWh)']
+
+    """
+    S5: User-Defined Bids and Costs
+    """
+    tot_SRMC = tot_marg_cost(asset_effic, asset_cap, energy_cost, duos_green,
+                             duos_red, lcos, person_rate, util_person_hrs)
+
+    user_bid_df = calc_costs(asset_cap, avail_bid, util_bid, person_rate,
+                             fixed_person_hrs, tot_SRMC, tot_avail_hrs)[1]
+
+    return {"S1: Utilisation vs Costs": util_costs_df,
+            "S2: Maximising Availability": max_avail_costs_df,
+            "S3: Maximising Utilisation": max_util_costs_df,
+            "S4: Break Even Costs": break_even_costs_df,
+            "S5: User-Defined Bids": user_bid_df}
+
+
+def marginal_costs(asset_effic, asset_cap, energy_cost, duos_green, duos_red, lcos, person_rate, util_person_hrs):
+    """
+    Breakdown of the total marginal cost (see 'tot_marg_cost') for reporting
+
+    :return: energy_SRMC (£/kWh), hrly_util (£/hr), person_SRMC (£/kWh), tot_SRMC (£/kWh)
+    """
+    energy_SRMC = (1. / asset_effic) * energy_cost + (duos_green - duos_red) + lcos
+    hrly_util = person_rate * (util_person_hrs / 60)
+    person_SRMC = hrly_util / asset_cap
+    tot_SRMC = energy_SRMC + person_SRMC
+
+    return energy_SRMC, hrly_util, person_SRMC, tot_SRMC
+
+
+class Scenario:
+    """
+    Holds every output of the calculator for one set of user inputs. Scenarios should be created through the
+    'scenario' function so that they are cached.
+
+    :param tot_avail_hrs: Total availability hours
+    :param tcv: Target contract value (£/kWh)
+    :param exp_util_hrs: Expected utilisation hours
+    :param avail_bid: User availability bid (£/kW/h)
+    :param avail_ceil: Availability bid ceiling (£/kW/h)
+    :param util_bid: User utilisation bid (£/kWh)
+    :param util_ceil: Utilisation bid ceiling (£/kWh)
+    :param duos_red: DUoS red band charge (£/kWh)
+    :param duos_green: DUoS green band charge (£/kWh)
+    :param energy_cost: Energy cost (£/kWh)
+    :param asset_effic: Asset efficiency
+    :param asset_cap: Asset capacity (kW)
+    :param lcos: Levelised cost of storage (£/kWh)
+    :param person_rate: Personnel rate (£/hr)
+    :param fixed_person_hrs: Fixed personnel minutes for participation
+    :param util_person_hrs: Personnel minutes per utilisation hour
+    """
+
+    def __init__(self, tot_avail_hrs, tcv, exp_util_hrs, avail_bid, avail_ceil, util_bid, util_ceil, duos_red,
+                 duos_green, energy_cost, asset_effic, asset_cap, lcos, person_rate, fixed_person_hrs,
+                 util_person_hrs):
+
+        self.tot_avail_hrs = tot_avail_hrs
+        self.exp_util_hrs = exp_util_hrs
+        self.util_ceil = util_ceil
+
+        # Marginal costs
+        self.energy_SRMC, self.hrly_util, self.person_SRMC, self.tot_SRMC = \
+            marginal_costs(asset_effic, asset_cap, energy_cost, duos_green, duos_red, lcos, person_rate,
+                           util_person_hrs)
+
+        # Bids that max out the TCV for each weighting of the weight slider
+        self.maxout_bids = np.array([maxout_tcv(tcv, exp_util_hrs, tot_avail_hrs, util_ceil, avail_ceil, asset_cap,
+                                                weight) for weight in WEIGHT_RANGE])
+
+        # Maximum bids to stay under the TCV given the user bids
+        self.avail_max = calc_avail_bid(tcv, exp_util_hrs, tot_avail_hrs, util_bid, avail_ceil, asset_cap)[0]
+        self.util_max = calc_util_bid(tcv, exp_util_hrs, tot_avail_hrs, avail_bid, util_ceil, asset_cap)[0]
+
+        # Cost tables
+        self.tables = cost_tables(tot_avail_hrs, avail_bid, avail_ceil, util_bid, util_ceil, duos_red, duos_green,
+                                  energy_cost, asset_effic, asset_cap, lcos, person_rate, fixed_person_hrs,
+                                  util_person_hrs)
+
+        # Profit matrix of expected utilisation vs bid weighting vs actual utilisation
+        self.profits = profit_vs_expected_util(tcv, exp_util_hrs, tot_avail_hrs, util_ceil, avail_ceil, asset_cap,
+                                               fixed_person_hrs, person_rate, self.tot_SRMC)
+
+        # Profit against actual utilisation for the bid weighting scenarios
+        lines = {}
+        for name, (avail, util) in zip(["max availability", "max utilisation", "user defined"],
+                                       [self.maxout_bids[0], self.maxout_bids[-1], (avail_bid, util_bid)]):
+            lines[name] = calc_costs(asset_cap, avail, util, person_rate, fixed_person_hrs, self.tot_SRMC,
+                                     tot_avail_hrs)[0][8]
+        self.profit_lines = pd.DataFrame(lines, index=np.arange(0.0, tot_avail_hrs + 1, 1.0))
+
+
+@lru_cache(maxsize=SCENARIO_CACHE_SIZE)
+def scenario(tot_avail_hrs, tcv, exp_util_hrs, avail_bid, avail_ceil, util_bid, util_ceil, duos_red, duos_green,
+             energy_cost, asset_effic, asset_cap, lcos, person_rate, fixed_person_hrs, util_person_hrs):
+    """
+    Returns the (cached) scenario of a set of user inputs. See 'Scenario' for the parameters.
+
+    :return: Scenario
+    """
+    return Scenario(tot_avail_hrs, tcv, exp_util_hrs, avail_bid, avail_ceil, util_bid, util_ceil, duos_red,
+                    duos_green, energy_cost, asset_effic, asset_cap, lcos, person_rate, fixed_person_hrs,
+                    util_person_hrs)
+
+
+def encode_profits(profits):
+    """
+    Encodes the profit matrix for the browser (see 'assets/bid_clientside.js') as base64 float64 values. Expected
+    utilisation rows that are the same are only sent once, where 'rows' gives the plane used by each row.
+
+    :param profits: Profit matrix (expected utilisation, weight, actual utilisation)
+
+    :return: dict of the encoded matrix
+    """
+    planes, rows = np.unique(profits.reshape(profits.shape[0], -1), axis=0, return_inverse=True)
+
+    return {'planes': base64.b64encode(planes.astype('<f8').tobytes()).decode('ascii'),
+            'rows': rows.ravel().tolist(),
+            'shape': list(profits.shape)}
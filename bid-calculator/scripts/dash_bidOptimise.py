@@ -0,0 +1,113 @@
+"""
+This python module contains the bid optimiser of the Project LEO Bid Calculator. Instead of finding bids by hand with
+the weight slider, the optimiser searches the (availability, utilisation) bids for the best expected or risk-adjusted
+profit subject to the TCV and the bid ceilings.
+
+At the expected utilisation hours (E) the bids must not exceed the TCV and the profit of 'calc_costs' is linear in the
+bids:
+
+    avail_bid * tot_avail_hrs + util_bid * E <= tcv * E
+    profit = asset_cap * (avail_bid * tot_avail_hrs + util_bid * actual_hrs) - (tot_SRMC * energy + fixed_cost)
+
+For a given utilisation bid the profit always increases with the availability bid, so the optimal bids lie on the
+boundary of the feasible region (the TCV line clipped by the ceilings, see 'calc_avail_bid'). The boundary is
+parameterised by the utilisation bid and the mean and standard deviation of the profit are calculated in closed form
+along it, assuming the same binomial utilisation hours and lognormal energy price as 'dash_bidRisk.draw_outcomes'.
+The boundary points that are not beaten on both mean and standard deviation are the efficient frontier.
+"""
+
+# Importing the relevant modules
+import pandas as pd
+import numpy as np
+
+# The number of utilisation bids along the boundary of the feasible region
+N_FRONTIER = 1001
+
+
+def profit_moments(avail_bids, util_bids, tot_avail_hrs, exp_util_hrs, asset_cap, asset_effic, tot_SRMC, fixed_cost,
+                   energy_cost, energy_cv=0.0):
+    """
+    Calculates the mean and standard deviation of the profit of bids in closed form. The actual utilisation hours are
+    binomial with a mean of 'exp_util_hrs' and the energy price has a coefficient of variation of 'energy_cv' (see
+    'dash_bidRisk.draw_outcomes'), the two are independent.
+
+    :param avail_bids: Availability bids (£/kW/h)
+    :param util_bids: Utilisation bids (£/kWh), paired with 'avail_bids'
+    :param tot_SRMC: Total marginal cost at the mean energy cost (£/kWh)
+    :param fixed_cost: Fixed participation cost (£)
+    :param energy_cost: Mean energy cost (£/kWh)
+    :param energy_cv: Coefficient of variation of the energy cost
+
+    :return: mean profit, standard deviation of the profit (np.ndarrays)
+    """
+    # Moments of the actual utilisation hours
+    n_hrs = int(round(tot_avail_hrs))
+    util_prob = min(max(exp_util_hrs / tot_avail_hrs, 0.0), 1.0) if tot_avail_hrs else 0.0
+    hrs_mean = n_hrs * util_prob
+    hrs_var = n_hrs * util_prob * (1 - util_prob)
+
+    # Moments of the margin of the utilisation bid over the marginal cost (only the energy term of the marginal cost
+    # varies with the energy price)
+    margin_mean = util_bids - tot_SRMC
+    margin_var = (energy_cv * energy_cost / asset_effic) ** 2
+
+    # profit = asset_cap * (avail_bid * tot_avail_hrs + margin * hrs) - fixed_cost, with independent margin and hrs
+    mean = asset_cap * (avail_bids * tot_avail_hrs + margin_mean * hrs_mean) - fixed_cost
+    var = asset_cap ** 2 * ((margin_mean ** 2 + margin_var) * (hrs_var + hrs_mean ** 2) -
+                            (margin_mean * hrs_mean) ** 2)
+
+    return mean, np.sqrt(np.maximum(var, 0.0))
+
+
+def bid_frontier(tcv, exp_util_hrs, tot_avail_hrs, avail_ceil, util_ceil, asset_cap, asset_effic, tot_SRMC,
+                 fixed_cost, energy_cost, energy_cv=0.0, n_points=N_FRONTIER):
+    """
+    Calculates the profit of the bids along the boundary of the feasible region
+
+    :return: pd.DataFrame of the boundary bids with the mean and standard deviation of the profit and whether each bid
+    is on the efficient frontier
+    """
+    # The utilisation bid can not exceed the TCV (the availability bid would be negative)
+    util_max = max(min(util_ceil, tcv), 0.0)
+    util_bids = np.linspace(0.0, util_max, n_points)
+
+    # The largest availability bid for each utilisation bid (see 'calc_avail_bid')
+    avail_bids = np.clip((tcv - util_bids) * exp_util_hrs / tot_avail_hrs, 0.0, avail_ceil)
+
+    mean, std = profit_moments(avail_bids, util_bids, tot_avail_hrs, exp_util_hrs, asset_cap, asset_effic, tot_SRMC,
+                               fixed_cost, energy_cost, energy_cv)
+
+    # A bid is efficient if no other bid has a higher mean profit for the same or a lower standard deviation
+    order = np.lexsort((-mean, std))
+    best_mean = np.maximum.accumulate(mean[order])
+    efficient = np.empty(n_points, dtype=bool)
+    efficient[order] = mean[order] >= best_mean
+
+    return pd.DataFrame({'Availability Bid (£/kW/h)': avail_bids,
+                         'Utilisation Bid (£/kWh)': util_bids,
+                         'Expected Profit (£)': mean,
+                         'Profit Std. Dev. (£)': std,
+                         'Efficient': efficient})
+
+
+def optimal_bids(frontier_df, risk_aversion=0.0):
+    """
+    Selects the bids of the frontier that maximise the risk-adjusted profit (mean - risk_aversion * std). Bids with the
+    same objective (e.g. along the TCV line when risk_aversion is 0) are separated by the lowest standard deviation.
+
+    :param frontier_df: pd.DataFrame from 'bid_frontier'
+    :param risk_aversion: Standard deviations of profit given up per £ of expected profit [default: 0]
+
+    :return: pd.Series of the optimal bids
+    """
+    mean = frontier_df['Expected Profit (£)'].values
+    std = frontier_df['Profit Std. Dev. (£)'].values
+    objective = mean - risk_aversion * std
+
+    best = np.flatnonzero(np.isclose(objective, objective.max(), rtol=1e-9, atol=1e-9))
+    best = best[np.argmin(std[best])]
+
+    optimum = frontier_df.iloc[best].copy()
+    optimum['Objective (£)'] = objective[best]
+
+    return optimum
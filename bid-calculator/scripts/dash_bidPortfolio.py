@@ -0,0 +1,202 @@
+"""
+This python module contains the portfolio analysis of the Project LEO Bid Calculator. The calculator evaluates one
+asset in one auction, whereas an aggregator bids many assets into many auctions. The functions below take a table of
+assets and a table of auctions and calculate the profit of every asset-auction pair for each bid weighting and number
+of actual utilisation hours in one batch.
+
+The profits of a chunk of pairs are calculated through numpy broadcasting over (pair, weight, actual utilisation) with
+the actual utilisation hours padded to the longest auction. The chunks are calculated in one process: the broadcasting
+is cheap compared with sending the long format results of a chunk back from another process. The results are returned
+in long format (one row per pair, weight and actual utilisation hours) together with the aggregates of the portfolio
+at the expected utilisation hours.
+
+The parameters follow the units of the calculator inputs, e.g. the personnel times are in minutes.
+"""
+
+# Importing the relevant modules
+import pandas as pd
+import numpy as np
+
+from scripts.dash_bidCalcs import marginal_costs, WEIGHT_RANGE
+
+# Parameters of the assets and the auctions
+ASSET_PARAMS = ['asset_cap', 'asset_effic', 'lcos', 'energy_cost', 'duos_red', 'duos_green', 'person_rate',
+                'fixed_person_hrs', 'util_person_hrs']
+AUCTION_PARAMS = ['tot_avail_hrs', 'tcv', 'avail_ceil', 'util_ceil', 'exp_util_hrs']
+
+# Default parameters (the default inputs of the calculator) used when a column is missing from a table
+DEFAULT_PARAMS = {'asset_cap': 16.0, 'asset_effic': 0.9, 'lcos': 0.03, 'energy_cost': 0.12, 'duos_red': 0.055,
+                  'duos_green': 0.0064, 'person_rate': 15.0, 'fixed_person_hrs': 10.0, 'util_person_hrs': 5.0,
+                  'tot_avail_hrs': 20.0, 'tcv': 0.30, 'avail_ceil': 0.045, 'util_ceil': 0.30, 'exp_util_hrs': 3.0}
+
+# Labels of the parameter block of 'data/Utilisation hours profit.xlsx' and the scale to the calculator units
+SHEET_LABELS = {'Total contract value (TCV)': ('tcv', 1.0),
+                'Weekly availability hours': ('tot_avail_hrs', 1.0),
+                'DUOS (red)': ('duos_red', 1.0),
+                'DUOS (green)': ('duos_green', 1.0),
+                'Energy cost (£/kWh)': ('energy_cost', 1.0),
+                'LCOS battery': ('lcos', 1.0),
+                'Battery roundtrip efficiency': ('asset_effic', 1.0),
+                'Battery power (kW)': ('asset_cap', 1.0),
+                'hourly rate': ('person_rate', 1.0),
+                'fixed personnel hours': ('fixed_person_hrs', 60.0),
+                'personnel marginal hours': ('util_person_hrs', 60.0)}
+
+# The number of asset-auction pairs calculated at once (bounds the memory of the intermediate arrays)
+CHUNK_PAIRS = 256
+
+
+def read_parameter_sheet(path, sheet_name=0):
+    """
+    Reads the parameter block of a spreadsheet in the layout of 'data/Utilisation hours profit.xlsx', where each
+    parameter has a label (see SHEET_LABELS) followed by a value column for each scenario. The header of a value column
+    is the first text above its values.
+
+    :param path: Path of the spreadsheet
+    :param sheet_name: Sheet of the parameter block
+
+    :return: pd.DataFrame with a row of parameters for each value column, indexed by the column headers
+    """
+    sheet = pd.read_excel(path, sheet_name=sheet_name, header=None)
+
+    # The label of a row is its last text cell that is a known label
+    params = {}
+    for row, values in sheet.iterrows():
+        labels = [(col, SHEET_LABELS[value]) for col, value in values.items()
+                  if isinstance(value, str) and value.strip() in SHEET_LABELS]
+        if labels:
+            label_col, param = labels[-1]
+            row_values = pd.to_numeric(values.loc[label_col + 1:], errors='coerce').dropna()
+            params[param] = (row, row_values)
+
+    if not params:
+        raise ValueError("No parameters found in '{}'".format(path))
+
+    # Value columns and their headers
+    first_row = min(row for row, _ in params.values())
+    value_cols = sorted(set().union(*[set(row_values.index) for _, row_values in params.values()]))
+    headers = []
+    for col in value_cols:
+        above = sheet.loc[:first_row - 1, col]
+        above = above[above.apply(lambda value: isinstance(value, str))]
+        headers.append(above.iloc[-1] if len(above) else 'Column {}'.format(col))
+
+    param_df = pd.DataFrame(index=headers, columns=[name for name, _ in params], dtype=float)
+    for (name, scale), (_, row_values) in params.items():
+        param_df[name] = row_values.reindex(value_cols).values * scale
+
+    return param_df
+
+
+def _pair_table(assets, auctions):
+    """
+    Simple function to create the table of every asset-auction pair with any missing parameters set to the defaults.
+    Only the asset parameters of 'assets' and the auction parameters of 'auctions' are used, so a table of both (e.g.
+    from 'read_parameter_sheet') can be given as either.
+    """
+    assets = assets[[param for param in ASSET_PARAMS if param in assets.columns]].rename_axis('Asset').reset_index()
+    auctions = auctions[[param for param in AUCTION_PARAMS if param in auctions.columns]].rename_axis(
+        'Auction').reset_index()
+    pairs = assets.merge(auctions, how='cross')
+
+    for param in ASSET_PARAMS + AUCTION_PARAMS:
+        if param not in pairs.columns:
+            pairs[param] = DEFAULT_PARAMS[param]
+
+    return pairs[['Asset', 'Auction'] + ASSET_PARAMS + AUCTION_PARAMS]
+
+
+def pair_profits(pairs, weights=WEIGHT_RANGE):
+    """
+    Calculates the profit surfaces of a chunk of asset-auction pairs for the bids that max out the TCV at each bid
+    weighting (see 'maxout_tcv' and 'calc_costs').
+
+    :param pairs: pd.DataFrame of the pairs (see '_pair_table')
+    :param weights: Bid weightings
+
+    :return: pd.DataFrame of the profits in long format
+    """
+    p = {param: pairs[param].values.astype(float)[:, None, None] for param in ASSET_PARAMS + AUCTION_PARAMS}
+    weight = np.asarray(weights, dtype=float)[None, :, None]
+
+    # The actual utilisation hours are padded to the longest auction and the padding is dropped at the end
+    util_hours = np.arange(0.0, pairs['tot_avail_hrs'].max() + 1, 1.0)[None, None, :]
+    valid = np.broadcast_to(util_hours <= p['tot_avail_hrs'], (len(pairs), len(weights), util_hours.shape[2]))
+
+    tot_SRMC = marginal_costs(p['asset_effic'], p['asset_cap'], p['energy_cost'], p['duos_green'], p['duos_red'],
+                              p['lcos'], p['person_rate'], p['util_person_hrs'])[3]
+    fixed_cost = (p['fixed_person_hrs'] / 60) * p['person_rate']
+
+    # Bids that max out the TCV for each weighting
+    util_bid = np.minimum(weight * p['tcv'], p['util_ceil'])
+    avail_bid = np.minimum(p['avail_ceil'], (1 - weight) * p['tcv'] * p['exp_util_hrs'] / p['tot_avail_hrs'])
+
+    energy = util_hours * p['asset_cap']
+    revenue = util_bid * energy + avail_bid * p['asset_cap'] * p['tot_avail_hrs']
+    tot_cost = tot_SRMC * energy + fixed_cost
+    profit = revenue - tot_cost
+
+    # Long format, only keeping the valid actual utilisation hours
+    shape = valid.shape
+    pair_idx, weight_idx, hour_idx = [idx[valid] for idx in np.indices(shape)]
+
+    return pd.DataFrame({'Asset': pairs['Asset'].values[pair_idx],
+                         'Auction': pairs['Auction'].values[pair_idx],
+                         'Bid Weighting': weight[0, weight_idx, 0],
+                         'Actual Utilisation Hours': util_hours[0, 0, hour_idx],
+                         'Expected Utilisation Hours': p['exp_util_hrs'][pair_idx, 0, 0],
+                         'Availability Bid (£/kW/h)': np.broadcast_to(avail_bid, shape)[valid],
+                         'Utilisation Bid (£/kWh)': np.broadcast_to(util_bid, shape)[valid],
+                         'Revenue (£)': np.broadcast_to(revenue, shape)[valid],
+                         'Total Service Cost (£)': np.broadcast_to(tot_cost, shape)[valid],
+                         'Profit (£)': profit[valid]})
+
+
+def portfolio_profits(assets, auctions, weights=WEIGHT_RANGE, chunk_pairs=CHUNK_PAIRS):
+    """
+    Calculates the profit surfaces of every asset-auction pair of a portfolio.
+
+    :param assets: pd.DataFrame of the asset parameters (see ASSET_PARAMS), indexed by the asset names
+    :param auctions: pd.DataFrame of the auction parameters (see AUCTION_PARAMS), indexed by the auction names
+    :param weights: Bid weightings
+    :param chunk_pairs: Number of pairs in each chunk
+
+    :return: profits_df (long format, see 'pair_profits'), dict of the portfolio aggregates (see 'portfolio_summary')
+    """
+    pairs = _pair_table(assets, auctions)
+    chunks = [pairs.iloc[start:start + chunk_pairs] for start in range(0, len(pairs), chunk_pairs)]
+
+    profits_df = pd.concat([pair_profits(chunk, weights) for chunk in chunks], ignore_index=True)
+
+    return profits_df, portfolio_summary(profits_df)
+
+
+def portfolio_summary(profits_df):
+    """
+    Aggregates the profits of a portfolio at the expected utilisation hours of each auction
+
+    :param profits_df: pd.DataFrame from 'portfolio_profits'
+
+    :return: dict of pd.DataFrames: 'pairs' (each pair and weighting), 'auctions' (total of the assets in each auction
+    for each weighting), 'assets' (total of the auctions for each asset and weighting), 'weights' (portfolio total for
+    each weighting, with the worst and best cases over the actual utilisation hours)
+    """
+    expected = profits_df['Actual Utilisation Hours'] == profits_df['Expected Utilisation Hours'].round()
+    pairs_df = profits_df.loc[expected].drop(columns=['Actual Utilisation Hours']).reset_index(drop=True)
+
+    auctions_df = pairs_df.groupby(['Auction', 'Bid Weighting'], sort=False)[['Revenue (£)', 'Total Service Cost (£)',
+                                                                              'Profit (£)']].sum().reset_index()
+    assets_df = pairs_df.groupby(['Asset', 'Bid Weighting'], sort=False)[['Revenue (£)', 'Total Service Cost (£)',
+                                                                          'Profit (£)']].sum().reset_index()
+
+    # The range of profit of each pair over the actual utilisation hours, summed across the portfolio
+    pair_range = profits_df.groupby(['Asset', 'Auction', 'Bid Weighting'], sort=False)['Profit (£)'].agg(['min',
+                                                                                                           'max'])
+    weights_df = pairs_df.groupby('Bid Weighting')['Profit (£)'].sum().to_frame('Expected Profit (£)')
+    weights_df['Worst Case Profit (£)'] = pair_range.groupby(level='Bid Weighting')['min'].sum()
+    weights_df['Best Case Profit (£)'] = pair_range.groupby(level='Bid Weighting')['max'].sum()
+
+    return {'pairs': pairs_df,
+            'auctions': auctions_df,
+            'assets': assets_df,
+            'weights': weights_df.reset_index()}
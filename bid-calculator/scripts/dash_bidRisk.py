@@ -0,0 +1,136 @@
+"""
+This python module contains the Monte Carlo risk calculations of the Project LEO Bid Calculator. Instead of reporting the
+profit for each number of actual utilisation hours, the profit of a bid is evaluated over random draws of the actual
+utilisation hours and the energy price, giving the expected profit, the P10/P90 profits and the probability of a loss.
+
+For a single draw, the profit of 'calc_costs' is linear in the bids:
+
+    profit = avail_bid * asset_cap * tot_avail_hrs + util_bid * energy - (tot_SRMC * energy + fixed_cost)
+
+where the energy (kWh) and tot_SRMC (see 'tot_marg_cost') depend on the draw. The per-draw terms are therefore
+calculated once and the profits of a grid of bids are evaluated in batches through numpy broadcasting. The
+availability bid only shifts the profit of every draw, so the draws are sorted once per utilisation bid.
+"""
+
+# Importing the relevant modules
+import pandas as pd
+import numpy as np
+
+from scripts.dash_bidCalcs import tot_marg_cost
+
+# The maximum number of profit values held in memory at once (bids x draws)
+BATCH_VALUES = 2 ** 23
+
+
+def draw_outcomes(n_draws, tot_avail_hrs, exp_util_hrs, energy_cost, energy_cv=0.2, seed=None):
+    """
+    Draws the actual utilisation hours and energy prices of the Monte Carlo simulation. Each available hour is
+    assumed to be utilised with the same probability (binomial, with a mean of 'exp_util_hrs') and the energy price is
+    lognormal with a mean of 'energy_cost'.
+
+    :param n_draws: Number of draws
+    :param tot_avail_hrs: Total availability hours
+    :param exp_util_hrs: Expected utilisation hours
+    :param energy_cost: Mean energy cost (£/kWh)
+    :param energy_cv: Coefficient of variation of the energy cost (0 for a fixed energy cost)
+    :param seed: Seed of the random number generator for reproducible results
+
+    :return: util_hrs, energy_price (np.ndarrays of length n_draws)
+    """
+    rng = np.random.default_rng(seed)
+
+    # Utilisation hours
+    n_hrs = int(round(tot_avail_hrs))
+    util_prob = min(max(exp_util_hrs / tot_avail_hrs, 0.0), 1.0) if tot_avail_hrs else 0.0
+    util_hrs = rng.binomial(n_hrs, util_prob, size=n_draws).astype(float)
+
+    # Energy price, the lognormal parameters are set to give the mean and coefficient of variation
+    if energy_cv > 0 and energy_cost > 0:
+        sigma2 = np.log(1 + energy_cv ** 2)
+        energy_price = rng.lognormal(np.log(energy_cost) - sigma2 / 2, np.sqrt(sigma2), size=n_draws)
+    else:
+        energy_price = np.full(n_draws, float(energy_cost))
+
+    return util_hrs, energy_price
+
+
+def bid_grid(avail_ceil, util_ceil, n_avail=21, n_util=21):
+    """
+    Simple function to create a grid of bids between 0 and the bid ceilings
+
+    :return: avail_bids, util_bids (flattened np.ndarrays of length n_avail * n_util)
+    """
+    avail_bids, util_bids = np.meshgrid(np.linspace(0.0, avail_ceil, n_avail), np.linspace(0.0, util_ceil, n_util),
+                                        indexing='ij')
+
+    return avail_bids.ravel(), util_bids.ravel()
+
+
+def bid_risk(avail_bids, util_bids, util_hrs, energy_price, tot_avail_hrs, asset_effic, asset_cap, duos_green,
+             duos_red, lcos, person_rate, fixed_person_hrs, util_person_hrs, quantiles=(0.1, 0.9),
+             batch_values=BATCH_VALUES):
+    """
+    Calculates the risk metrics of a set of bids over the draws of 'draw_outcomes'.
+
+    :param avail_bids: Availability bids (£/kW/h)
+    :param util_bids: Utilisation bids (£/kWh), paired with 'avail_bids'
+    :param util_hrs: Drawn actual utilisation hours
+    :param energy_price: Drawn energy prices (£/kWh)
+    :param quantiles: The profit quantiles to report [default: P10 and P90]
+    :param batch_values: The maximum number of profit values held at once
+
+    :return: pd.DataFrame with a row of metrics for each bid
+    """
+    avail_bids, util_bids = np.broadcast_arrays(np.asarray(avail_bids, dtype=float).ravel(),
+                                                np.asarray(util_bids, dtype=float).ravel())
+
+    # Terms of the profit that only depend on the draw (see the module docstring)
+    energy = util_hrs * asset_cap
+    tot_SRMC = tot_marg_cost(asset_effic, asset_cap, energy_price, duos_green, duos_red, lcos, person_rate,
+                             util_person_hrs)
+    fixed_cost = (fixed_person_hrs / 60) * person_rate
+    draw_cost = tot_SRMC * energy + fixed_cost
+    avail_revenue = avail_bids * asset_cap * tot_avail_hrs
+
+    # The expected profit follows directly from the means of the draws as the profit is linear in the bids
+    exp_profit = avail_revenue + util_bids * energy.mean() - draw_cost.mean()
+
+    # The quantiles and probability of loss need the full distribution of each bid. As the availability bid only
+    # shifts the profit of every draw by the same amount, the distribution is sorted once for each utilisation bid
+    # (in batches) and shared by all the availability bids paired with it
+    uniq_util, util_idx = np.unique(util_bids, return_inverse=True)
+    util_idx = util_idx.ravel()
+    n_draws = len(util_hrs)
+    prob_loss = np.empty(len(avail_bids))
+    profit_qs = np.empty((len(quantiles), len(avail_bids)))
+
+    # Positions of the quantiles in the sorted draws (linear interpolation as in np.quantile)
+    q_pos = np.asarray(quantiles, dtype=float) * (n_draws - 1)
+    q_lo = np.floor(q_pos).astype(int)
+    q_hi = np.minimum(q_lo + 1, n_draws - 1)
+    q_frac = q_pos - q_lo
+    batch = max(1, batch_values // max(n_draws, 1))
+
+    for start in range(0, len(uniq_util), batch):
+        util_batch = uniq_util[start:start + batch]
+        util_profits = util_batch[:, None] * energy[None, :]
+        util_profits -= draw_cost[None, :]
+        util_profits.sort(axis=1)
+
+        for row, u in enumerate(range(start, start + len(util_batch))):
+            bids = np.flatnonzero(util_idx == u)
+            sorted_profits = util_profits[row]
+
+            # A bid makes a loss on the draws where the profit before availability revenue is below -revenue
+            prob_loss[bids] = np.searchsorted(sorted_profits, -avail_revenue[bids], side='left') / n_draws
+            q_vals = sorted_profits[q_lo] + q_frac * (sorted_profits[q_hi] - sorted_profits[q_lo])
+            profit_qs[:, bids] = q_vals[:, None] + avail_revenue[bids][None, :]
+
+    risk_df = pd.DataFrame({'Availability Bid (£/kW/h)': avail_bids,
+                            'Utilisation Bid (£/kWh)': util_bids,
+                            'Expected Profit (£)': exp_profit})
+    for q, profit_q in zip(quantiles, profit_qs):
+        risk_df['P{:g} Profit (£)'.format(q * 100)] = profit_q
+    risk_df['Probability of Loss'] = prob_loss
+
+    return risk_df
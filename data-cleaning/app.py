@@ -1,20 +1,32 @@
 # -*- coding: utf-8 -*-
-import io
 import dash
-import base64
-import yagmail
 import pandas as pd
 import plotly.graph_objs as go
 from dash import html, dash_table, dcc
 import dash_bootstrap_components as dbc
 from dash.exceptions import PreventUpdate
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State
 from scripts.dash_timeseriesClean import load_df, Formatting, Errors, Solutions
+from scripts.dash_timeseriesView import Pyramid, relayout_range, block_table, MAX_PTS
+from scripts.dash_sessionCache import SessionCache, dataset_key
+from scripts.dash_tablePaging import page_frame, page_rows, page_tooltips, PAGE_SIZE
+from scripts.dash_uploadStore import UploadStore
+from scripts.dash_ingest import read_contents, iter_contents, merge_sources
 
 app = dash.Dash(__name__, meta_tags=[{"name": "viewport", "content": "width=device-width"}],
                 suppress_callback_exceptions=True)
 server = app.server
 
+# Server-side store of the cleaned data and plotting pyramids. Only the dataset key is passed through the callbacks
+session_cache = SessionCache()
+
+# Column-addressable copy of each upload on the local disk, so that the cleaning only loads the selected columns. The
+# columns are memory mapped, so every gunicorn worker shares the one copy in the page cache
+upload_store = UploadStore()
+
+# The number of data points shown either side of a gap in the gap viewer (larger gaps are shown with their own width)
+GAP_PAD = 50
+
 
 def Header(app):
     return html.Div([get_header(app), html.Br([])])
@@ -71,16 +83,12 @@ def get_header(app):
     return header
 
 
-def parse_contents(contents):
+def parse_contents(contents, usecols=None):
     # This function will only run once the right file type has been uploaded
-    # Split the binary string by decoding type and the encoded string
-    content_type, content_string = contents.split(',')
-
-    # Decode the data
-    decoded = base64.b64decode(content_string)
-
-    # Assumes that the user uploaded a CSV or TXT file
-    df = pd.read_csv(io.StringIO(decoded.decode('utf-8')))
+    # The contents are decoded once and the delimiter, header row, decimal and encoding of the CSV or TXT file are
+    # detected from the same buffer that is parsed (see 'dash_ingest.py'). Only the 'usecols' columns are parsed when
+    # they are given
+    df = read_contents(contents, usecols=usecols)
 
     return df
 
@@ -97,13 +105,86 @@ def parse_contents(contents):
     #     )
 
 
-def error_solutions_processing(data_cols, date_cols, contents):
+def table_page(data_key, name, page_current, page_size, sort_by, filter_query):
+    """
+    This function returns a single page of a table held in the server-side cache for the DataTables that are paged,
+    sorted and filtered on the server (page_action='custom'). The last filtered/sorted table is held in the cache
+    so that changing pages does not repeat the filtering and sorting.
+
+    :param data_key: key of the dataset in the server-side cache
+    :param name: name of the table in the cache
+    :param page_current: the current page of the DataTable
+    :param page_size: the number of rows per page
+    :param sort_by: the sort_by property of the DataTable
+    :param filter_query: the filter_query property of the DataTable
+
+    :return: page rows, page tooltips, total number of pages
+    """
+    cached = session_cache.get(data_key) if data_key else None
+    if cached is None or name not in cached:
+        raise PreventUpdate
+
+    views = cached.setdefault(name + '_view', {})
+    page_df, page_count = page_frame(cached[name], page_current, page_size, sort_by, filter_query, views)
+
+    return page_df.to_dict('records'), page_tooltips(page_df), page_count
+
+
+def file_keys(names, contents):
+    """
+    Simple function that returns the key of each uploaded file in the upload store. The upload allows many files, in
+    which case the names and contents are lists.
+
+    :param names: Name(s) of the uploaded file(s)
+    :param contents: Binary data of the uploaded file(s)
+
+    :return: list of the keys, list of the contents
+    """
+    names = names if type(names) == list else [names]
+    contents = contents if type(contents) == list else [contents]
+
+    return [dataset_key(name, content) for name, content in zip(names, contents)], contents
+
+
+def merge_files(keys, contents, date_cols, sel_cols):
+    """
+    This function merges many uploaded files of the same meter (e.g. daily or monthly files) by their timestamps into
+    one continuous dataset, so that the gaps at the boundaries of the files are found in the error detection. Each file
+    is streamed in chunks from the upload store (or parsed in chunks from its contents on a miss) and only a chunk of
+    each file is held at a time. The timestamps where the files overlap are only kept once (from the first file).
+
+    :param keys: list of the keys of the files in the upload store
+    :param contents: list of the binary data of the files
+    :param date_cols: User selected date columns
+    :param sel_cols: The columns to load (date/time and data columns)
+
+    :return: pd.DataFrame of the merged files (as from 'load_df'), int: number of duplicate timestamps dropped
+    """
+    time_col = '{}_{}'.format(date_cols[0], date_cols[1]) if len(date_cols) == 2 else date_cols[0]
+
+    sources = []
+    for key, content in zip(keys, contents):
+        chunks = upload_store.chunks(key, sel_cols)
+        if chunks is None:
+            chunks = iter_contents(content, usecols=sel_cols)
+        sources.append(load_df(chunk[sel_cols], date_cols) for chunk in chunks)
+
+    return merge_sources(sources, time_col, duplicates='drop')
+
+
+def error_solutions_processing(data_cols, date_cols, contents, upload_keys=None, interp='linear', regression=False,
+                               profile=False):
     """
     This function contains the sequence used to detect errors and clean the data based on various 'solutions'.
 
     :param data_cols: User selected data columns for data to clean
     :param date_cols: User selected date columns
-    :param contents: Binary data uploaded by user
+    :param contents: Binary data uploaded by user (a list where many files were uploaded)
+    :param upload_keys: list of the keys of the uploaded files in the upload store
+    :param interp: The interpolation method used to fill single missing values and short gaps, 'linear' or a spline
+                   ('akima' or 'cubic')
+    :param regression: Whether to fill the gaps that remain unfilled from the correlated columns that were selected
+    :param profile: Whether to fill the gaps that remain unfilled (after any regression) from the typical weekday and time of day profile
 
     :return:
     """
@@ -111,18 +192,29 @@ def error_solutions_processing(data_cols, date_cols, contents):
     fmt = Formatting()
     data_errors = Errors()
 
-    # Reupload the data. This needs to be done because the serialisation of data into JSON affects how pandas
-    # reads in the datetime columns. This is not efficient and should be improved
-    full_df = parse_contents(contents)
-
     # Establish the cols to clean and the date/time cols
     cols_toclean = data_cols['props']['children']['props']['value']
     date_cols = date_cols['props']['children']['props']['value']
 
-    # This section will add the "Errors" and "Solutions" columns
-    # into the df as well as columns where the cleaned data will be entered. The label ord is important for
-    # later cleaning stages.
-    df = load_df(full_df, date_cols)
+    # Only the selected date/time and data columns are loaded from the upload store (the JSON serialisation of the
+    # data would affect how pandas reads in the datetime columns). If the upload is not in the store, only these
+    # columns are parsed from the uploaded contents. Many uploaded files are merged into one dataset by their timestamps
+    sel_cols = list(dict.fromkeys(date_cols + cols_toclean))
+    contents = contents if type(contents) == list else [contents]
+    upload_keys = upload_keys or [None] * len(contents)
+    n_dup = 0
+
+    if len(contents) > 1:
+        df, n_dup = merge_files(upload_keys, contents, date_cols, sel_cols)
+    else:
+        full_df = upload_store.load(upload_keys[0], sel_cols) if upload_keys[0] else None
+        if full_df is None:
+            full_df = parse_contents(contents[0], usecols=sel_cols)[sel_cols]
+
+        # This section will add the "Errors" and "Solutions" columns
+        # into the df as well as columns where the cleaned data will be entered. The label ord is important for
+        # later cleaning stages.
+        df = load_df(full_df, date_cols)
     label_ord, binlabel_df = fmt.bin_labels(df, cols_toclean)
 
     # Now that the df has been formatted, the following section will use the `error_detect` function to scan
@@ -190,6 +282,12 @@ def error_solutions_processing(data_cols, date_cols, contents):
                 "Total blocks of Outlier Values: {}".format(totals[1]),
                 className='stats_card_nobar',
                 style={'color': 'white'}
+            ),
+            html.P(
+                "{} files were merged by their timestamps ({} duplicate timestamps where the files overlap were "
+                "dropped)".format(len(contents), n_dup) if len(contents) > 1 else "",
+                className='stats_card_nobar',
+                style={'color': 'white'}
             )
         ],
         style={
@@ -200,8 +298,9 @@ def error_solutions_processing(data_cols, date_cols, contents):
 
     # Setup the data for plotting
     plot_df = pd.DataFrame(columns=cols_toclean, index=['Single', 'Multiple', 'Large Gap', 'Outlier'])
+    # Columns without any missing data have no totals (e.g. a complete dataset)
     for col in cols_toclean:
-        plot_df[col] = error_totals[col]
+        plot_df[col] = error_totals.get(col, [0, 0, 0, 0])
 
     # Define the colour palette, 5 maximum
     colours = ['#fab81e', '#f7e1bc', '#f7c143', '#f7c877', '#fcd695']
@@ -277,7 +376,8 @@ def error_solutions_processing(data_cols, date_cols, contents):
     if len(out_blocks.keys()) > 0:
         updated_binlabel_df, out_nan_blocks = data_sols.rvm_outliers(updated_binlabel_df)
     else:
-        out_nan_blocks = {}
+        # Without outliers only the missing values are filled
+        out_nan_blocks = nan_blocks
 
     # The dataframe is now ready for the filling of missing data. Please see the 'power_fill' function in the
     # 'dash_timeseriesClean.py' library for more information. The output variables, 'fill_blocks' and
@@ -285,11 +385,21 @@ def error_solutions_processing(data_cols, date_cols, contents):
     # methods were applied
     if out_nan_blocks:
         updated_binlabel_df, fill_blocks, interp_blocks = data_sols.power_fill(updated_binlabel_df, out_nan_blocks,
-                                                                               freq, offset=1, interp='linear')
+                                                                               freq, offset=1, interp=interp,
+                                                                               regression=regression, profile=profile)
     else:
         fill_blocks, interp_blocks = {}, {}
 
-    return updated_binlabel_df, out_blocks, out_nan_blocks, fill_blocks, interp_blocks, error_report, error_plot
+    # Any formatting errors are corrected in the cleaned columns (see the 'fmt_correct' function)
+    if fmt_blocks:
+        updated_binlabel_df, _ = data_sols.fmt_correct(updated_binlabel_df)
+
+    # The cleaned data are aggregated to the half-hourly settlement periods, with the number of raw, filled and
+    # unfilled samples of each period (see the 'settlement_agg' function)
+    settle_df = data_sols.settlement_agg(updated_binlabel_df, freq)
+
+    return updated_binlabel_df, out_blocks, out_nan_blocks, fill_blocks, interp_blocks, error_report, error_plot, \
+        settle_df
 
 
 overview = dbc.Card(
@@ -600,8 +710,8 @@ errorsReport = dbc.Card(
                                                     html.Button(
                                                         dcc.Upload(
                                                             id="uploaded-data",
-                                                            children=html.Div(['Upload File']),
-                                                            multiple=False
+                                                            children=html.Div(['Upload File(s)']),
+                                                            multiple=True
                                                         ),
                                                         id='upload-btn',
                                                         n_clicks=0,
@@ -679,6 +789,16 @@ errorsReport = dbc.Card(
                                                 column, select that one.",
                                                 className="paratext"
                                             ),
+                                            html.P(
+                                                "Single missing values and short gaps are filled by linear \
+                                                interpolation by default. A spline can be selected below for data \
+                                                that do not change linearly over a gap (e.g. solar generation). \
+                                                Larger gaps that cannot be filled from the surrounding hours, days \
+                                                or weeks can also be filled from the other selected columns that \
+                                                they are strongly correlated with (e.g. the phases of a supply) \
+                                                and from the typical weekday and time of day profile of the data.",
+                                                className="paratext"
+                                            ),
                                         ],
                                         className=" twelve columns",
                                     )
@@ -723,6 +843,42 @@ errorsReport = dbc.Card(
                                         ],
                                         className="four columns",
                                     ),
+                                    html.Div(
+                                        [
+                                            dcc.Dropdown(
+                                                id='fill-interp',
+                                                options=[
+                                                    {'label': 'Linear interpolation', 'value': 'linear'},
+                                                    {'label': 'Akima spline', 'value': 'akima'},
+                                                    {'label': 'Cubic spline', 'value': 'cubic'}
+                                                ],
+                                                value='linear',
+                                                clearable=False,
+                                                style={
+                                                    'fontFamily': "avenir",
+                                                    'fontSize': '16px'
+                                                }
+                                            ),
+                                        ],
+                                        className="four columns",
+                                    ),
+                                    html.Div(
+                                        [
+                                            dcc.Checklist(
+                                                id='fill-methods',
+                                                options=[
+                                                    {'label': ' Correlated columns', 'value': 'regression'},
+                                                    {'label': ' Typical profile', 'value': 'profile'}
+                                                ],
+                                                value=[],
+                                                style={
+                                                    'fontFamily': "avenir",
+                                                    'fontSize': '16px'
+                                                }
+                                            ),
+                                        ],
+                                        className="four columns",
+                                    ),
                                 ],
                                 className="row ",
                                 style={
@@ -944,6 +1100,73 @@ solutionsReport = dbc.Card(
                                 },
                                 className="row ",
                             ),
+                            # Row 5
+                            html.Div(
+                                [
+                                    html.H6(
+                                        "Gap Viewer",
+                                        className="subtitle padded",
+                                    ),
+                                    html.P(
+                                        [
+                                            "Step through the gaps in your data to compare the raw and cleaned data "
+                                            "around each gap. Only the data surrounding the selected gap is loaded."
+                                        ],
+                                        className="paratext"
+                                    ),
+                                    html.Div(
+                                        [
+                                            dcc.Dropdown(
+                                                id="gap-col",
+                                                placeholder="All columns",
+                                                style={
+                                                    'width': '250px',
+                                                    'font-family': 'avenir',
+                                                    'vertical-align': 'top'
+                                                },
+                                                className="four columns"
+                                            ),
+                                            html.Button(
+                                                'Previous',
+                                                id='gap-prev',
+                                                n_clicks=0,
+                                                className="clean-data-button two columns",
+                                                style={
+                                                    'border-left': '5px solid #ea8f32',
+                                                    'font-family': 'avenir'
+                                                }
+                                            ),
+                                            dcc.Input(
+                                                id='gap-num',
+                                                type='number',
+                                                min=1,
+                                                step=1,
+                                                value=1,
+                                                debounce=True,
+                                                className="two columns",
+                                                style={'font-family': 'avenir'}
+                                            ),
+                                            html.Button(
+                                                'Next',
+                                                id='gap-next',
+                                                n_clicks=0,
+                                                className="clean-data-button two columns",
+                                                style={
+                                                    'border-left': '5px solid #ea8f32',
+                                                    'font-family': 'avenir'
+                                                }
+                                            ),
+                                        ],
+                                        className="row"
+                                    ),
+                                    html.P(id='gap-info', className="paratext"),
+                                    dcc.Graph(id='gap-plot', config={"displaylogo": False}),
+                                ],
+                                style={
+                                    'margin-bottom': '50px'
+                                },
+                                className="row ",
+                            ),
                             # Final Row
                             html.Div(
                                 [
@@ -1012,6 +1235,33 @@ cleanedData = dbc.Card(
                                             ),
                                             html.Div(id='clean-report'),
                                             html.Div(id='clean-stats', style={'display': 'none'}),
+                                            dcc.Store(id='clean-data-key'),
+                                            html.H6(
+                                                ["Raw Versus Cleaned Data"],
+                                                style={
+                                                    'margin-bottom': '10px',
+                                                    'margin-top': '50px'
+                                                },
+                                                className="subtitle padded"
+                                            ),
+                                            html.P(
+                                                [
+                                                    "Select a cleaned column to compare the raw and cleaned data. "
+                                                    "Large datasets are summarised for plotting, zoom into the plot "
+                                                    "to see the data at a higher resolution."
+                                                ],
+                                                className="paratext"
+                                            ),
+                                            dcc.Dropdown(
+                                                id="view-col",
+                                                placeholder="Select a column",
+                                                style={
+                                                    'width': '350px',
+                                                    'font-family': 'avenir',
+                                                    'vertical-align': 'top'
+                                                }
+                                            ),
+                                            dcc.Graph(id='clean-raw-plot', config={"displaylogo": False}),
                                             html.H6(
                                                 ["Download Your Cleaned Data"],
                                                 style={
@@ -1063,6 +1313,23 @@ cleanedData = dbc.Card(
                                                 ],
                                                 className="four columns"
                                             ),
+                                            html.Div(
+                                                [
+                                                    html.Button(
+                                                        "Download Settlement Periods",
+                                                        id="btn_settle",
+                                                        n_clicks=0,
+                                                        className="clean-data-button",
+                                                        style={
+                                                            'border-left': '5px solid #ea8f32',
+                                                            'font-family': 'avenir',
+                                                            'width': '100%'
+                                                        }
+                                                    ),
+                                                    dcc.Download(id="download-settlement")
+                                                ],
+                                                className="four columns"
+                                            ),
 
                                         ],
                                         className="row"
@@ -1505,14 +1772,18 @@ app.layout = html.Div([
 def update_output(contents, name):
     # First determine if something was uploaded
     if contents is not None:
-        # Determine if the right file type was uploaded
-        ext = name.split('.')[-1]
+        # Determine if the right file type was uploaded. Many files of the same meter (e.g. daily files) can be
+        # uploaded together and are merged by their timestamps when the data are cleaned
+        keys, contents = file_keys(name, contents)
+        names = name if type(name) == list else [name]
+        ext = {n.split('.')[-1] for n in names}
 
-        if ext == 'csv' or ext == 'txt':
+        if ext <= {'csv', 'txt'}:
             # Update the status message
             up_status = html.Div(
                 [
-                    "{} Upload Successful".format(name),
+                    "{} Upload Successful".format(names[0]) if len(names) == 1 else
+                    "{} files Upload Successful (the preview shows {})".format(len(names), names[0]),
                 ],
                 className="status_msg",
                 style={
@@ -1522,16 +1793,20 @@ def update_output(contents, name):
                 }
             )
 
-            # Parse the df and cols from the uploaded data
-            df = parse_contents(contents)
+            # Parse the df and cols from the uploaded data. Each file is written to the upload store and the columns
+            # are those of the first file
+            for key, content in zip(keys[::-1], contents[::-1]):
+                df = parse_contents(content)
+                upload_store.write(key, df)
             cols = []
             for col in df.columns:
                 cols.append({'label': '{}'.format(col), 'value': col})
 
-            # Need to use 'orient='records'' when exporting to JSON format for dash callbacks
-            full_data = df.to_json(orient='records')
+            # The uploaded data (of the first file) are only held in the upload store and the key is passed to the
+            # preview, which loads the rows of each page from the memory-mapped columns
+            upload_key = keys[0]
 
-            return full_data, up_status, cols
+            return upload_key, up_status, cols
     else:
         raise PreventUpdate
 
@@ -1613,19 +1888,23 @@ def upload_preview(full_data, clicks):
     Callback function to load the uploaded dataset from local storage
 
     :param
-    full_data: Binary dataset
+    full_data: key of the uploaded dataset in the server-side cache
     clicks: number of button clicks
 
     :return: Dash Data table
     """
 
     if full_data is not None:
-        df = pd.read_json(full_data, orient='records')
+        # Only the column labels are needed here (from the manifest of the upload store)
+        upload_cols = upload_store.columns(full_data)
+        if upload_cols is None:
+            raise PreventUpdate
+
         data_preview = html.Div([
             html.P(
                 [
-                    "Below are the first 5 rows of your dataset. Please ensure that the \
-                    data are properly formatted whereby the column names are \
+                    "Below is a preview of your dataset, use the arrows below the table to see more rows. Please \
+                    ensure that the data are properly formatted whereby the column names are \
                     appropriately formatted. You may need to format your dataset \
                     before cleaning.",
                     html.Br(),
@@ -1633,20 +1912,23 @@ def upload_preview(full_data, clicks):
                 ],
                 className="paratext"
             ),
-            dash_table.DataTable(data=df[:5].to_dict("rows"),
-                                 columns=[{"id": x, "name": x} for x in df.columns],
+            # The rows of the table are paged from the server (see 'preview_page')
+            dash_table.DataTable(id='upload-preview-table',
+                                 columns=[{"id": x, "name": x} for x in upload_cols],
+                                 page_current=0,
+                                 page_size=5,
+                                 page_action='custom',
+                                 sort_action='custom',
+                                 sort_mode='multi',
+                                 sort_by=[],
+                                 filter_action='custom',
+                                 filter_query='',
                                  style_cell={'textAlign': 'left',
                                              'minWidth': '180px', 'width': '180px', 'maxWidth': '180px',
                                              'overflow': 'hidden',
                                              'textOverflow': 'ellipsis',
                                              'fontFamily': 'Avenir'
                                              },
-                                 tooltip_data=[
-                                     {
-                                         column: {'value': str(value), 'type': 'markdown'}
-                                         for column, value in row.items()
-                                     } for row in df.to_dict('records')
-                                 ],
                                  tooltip_duration=None,
                                  style_header={
                                      'backgroundColor': 'white',
@@ -1699,6 +1981,42 @@ def upload_preview(full_data, clicks):
         return data_preview
 
 
+@app.callback([Output('upload-preview-table', 'data'),
+               Output('upload-preview-table', 'tooltip_data'),
+               Output('upload-preview-table', 'page_count')],
+              [Input('upload-preview-table', 'page_current'),
+               Input('upload-preview-table', 'page_size'),
+               Input('upload-preview-table', 'sort_by'),
+               Input('upload-preview-table', 'filter_query'),
+               Input('load-dataset', 'data')])
+def preview_page(page_current, page_size, sort_by, filter_query, upload_key):
+    """
+    Callback function to page, sort and filter the preview of the uploaded dataset on the server. The rows of the page
+    are loaded from the memory-mapped columns of the upload store (shared by the workers), where only the columns that
+    are filtered or sorted on are loaded to find the rows of the page. Only the row positions of the last filtered and
+    sorted view are held in the server-side cache.
+
+    :return: page rows, page tooltips, total number of pages
+    """
+    upload_cols = upload_store.columns(upload_key) if upload_key else None
+    n_rows = upload_store.n_rows(upload_key) if upload_cols else None
+    if n_rows is None:
+        raise PreventUpdate
+
+    views = session_cache.get(upload_key, 'preview_view')
+    if views is None:
+        views = {}
+        session_cache.put(upload_key, preview_view=views)
+
+    rows, page_count = page_rows(lambda cols: upload_store.load(upload_key, [c for c in cols if c in upload_cols]),
+                                 n_rows, page_current, page_size, sort_by, filter_query, views)
+    page_df = upload_store.load(upload_key, rows=rows)
+    if page_df is None:
+        raise PreventUpdate
+
+    return page_df.to_dict('records'), page_tooltips(page_df), page_count
+
+
 @app.callback(Output('data-cols-dropdown', 'children'),
               [Input('data-cols', 'data'),
                Input('uploaded-data', 'filename')])
@@ -1796,13 +2114,18 @@ def update_date_cols_dropdown(date_cols, name):
                Output('missing-lrg', 'children'),
                Output('clean-stats', 'children'),
                Output('error-report', 'children'),
-               Output('error-plot', 'children')],
+               Output('error-plot', 'children'),
+               Output('clean-data-key', 'data'),
+               Output('view-col', 'options'),
+               Output('gap-col', 'options')],
               [Input('data-cols-dropdown', 'children'),
                Input('date-cols-dropdown', 'children'),
                Input('start-clean', 'n_clicks'),
                Input('uploaded-data', 'contents'),
-               Input('uploaded-data', 'filename')])
-def errors_solutions(data_cols, date_cols, start, contents, name):
+               Input('uploaded-data', 'filename')],
+              [State('fill-interp', 'value'),
+               State('fill-methods', 'value')])
+def errors_solutions(data_cols, date_cols, start, contents, name, interp, fill_methods):
     """
     Callback function to perform the error detection and visualizations, and data filling (solutions). As commenting
     has been summarized, please see the documentation in the "dash_dataCleaning.py" script for further information
@@ -1815,6 +2138,8 @@ def errors_solutions(data_cols, date_cols, start, contents, name):
     filename: filename of data to load
     iscompleted: flag for if data has been uploaded successfully to the dashboard
     usr_id: folder name where the data is stored
+    interp: interpolation method used to fill single missing values and short gaps
+    fill_methods: further methods used to fill the gaps that remain unfilled
 
     :return
     updated_binlabel_df: JSON dataframe with the 'Errors' and 'Solutions column completed
@@ -1823,175 +2148,166 @@ def errors_solutions(data_cols, date_cols, start, contents, name):
     interp_blocks: dict of filled data points with interpolation methods used
     error-report: hmtl Div of the errors
     error-plot: bar plot for the errors
+    clean-data-key: key of the cleaned data held in the server-side cache
+    view-col: options for the raw versus cleaned data plot
+    gap-col: options for the gap viewer
     """
     # Begin processing once user has clicked clean data and it has been uploaded
     if start > 0 and name:
 
         # Perform error detection and solution application (if errors exist) on the dataset
-        updated_binlabel_df, out_blocks, out_nan_blocks, fill_blocks, interp_blocks, error_report, error_plot = \
-            error_solutions_processing(data_cols, date_cols, contents)
-
-        # Create the data tables for reporting the various solutions that have been applied to the data
-        df_cols = ['Parameter', 'Start Time', 'End Time', 'Gap Size', 'Solutions Method']
-        missing_sml_df = pd.DataFrame(columns=df_cols)
-        missing_lrg_df = pd.DataFrame(columns=df_cols)
+        updated_binlabel_df, out_blocks, out_nan_blocks, fill_blocks, interp_blocks, error_report, error_plot, \
+            settle_df = error_solutions_processing(data_cols, date_cols, contents, file_keys(name, contents)[0],
+                                                   interp=interp, regression='regression' in fill_methods,
+                                                   profile='profile' in fill_methods)
 
-        # Only produce the tables if missing data existed
+        # The tables, the cached data (including the settlement periods) and the data key are produced whenever the
+        # data are cleaned, where a dataset without any missing data simply has empty tables of the gaps
         # NB: This currently does not include functionality for formatting errors
-        if out_nan_blocks:
-
-            # For each for the fill/interp errors, determine the size of the data gap and then add the corresponding
-            # data into the relevant dataframe
-            for col in fill_blocks.keys():
-                data_gaps = fill_blocks[col][0]
-                data_fill = fill_blocks[col][1]
-
-                for gap, fill in zip(data_gaps, data_fill):
-                    # Deal with larger gaps. Gaps below 3 values will be appended separately
-                    if isinstance(gap, list):
-                        gap_sze = gap[1] - gap[0] + 1
-                        sols_data = pd.Series([col, updated_binlabel_df.index[gap[0]],
-                                               updated_binlabel_df.index[gap[1]], gap_sze, fill], index=df_cols)
-                        if gap_sze < 3:
-                            missing_sml_df = missing_sml_df.append(sols_data, ignore_index=True)
-                        else:
-                            missing_lrg_df = missing_lrg_df.append(sols_data, ignore_index=True)
-                    else:
-                        # Deal with 'single' data points
-                        sols_data = pd.Series([col, updated_binlabel_df.index[gap], updated_binlabel_df.index[gap],
-                                               1, fill], index=df_cols)
-                        missing_sml_df = missing_sml_df.append(sols_data, ignore_index=True)
-
-            # Do the same for the interpolation blocks of data, appending to the same dataframes.
-            for col in interp_blocks.keys():
-                data_gaps = interp_blocks[col][0]
-                data_fill = interp_blocks[col][1]
-
-                for gap, fill in zip(data_gaps, data_fill):
-                    # Deal with larger gaps. Gaps below 3 values will be appended separately
-                    if isinstance(gap, list):
-                        gap_sze = gap[1] - gap[0] + 1
-                        sols_data = pd.Series([col, updated_binlabel_df.index[gap[0]],
-                                               updated_binlabel_df.index[gap[1]], gap_sze, fill], index=df_cols)
-                        if gap_sze < 3:
-                            missing_sml_df = missing_sml_df.append(sols_data, ignore_index=True)
-                        else:
-                            missing_lrg_df = missing_lrg_df.append(sols_data, ignore_index=True)
-
-                    else:
-                        # Deal with 'single' data points
-                        sols_data = pd.Series([col, updated_binlabel_df.index[gap], updated_binlabel_df.index[gap],
-                                               1, fill], index=df_cols)
-                        missing_sml_df = missing_sml_df.append(sols_data, ignore_index=True)
-
-            # Calculate the stats of missing values for the summary table in the clean-report callback
-            # The percentage of missing data points is based on the user selected columns only and not other parameters
-            tot_cols = len(data_cols)
-            tot_data_pts = len(updated_binlabel_df) * tot_cols
-            tot_missing_sml = len(missing_sml_df)
-            tot_missing_lrg = len(missing_lrg_df)
-            tot_missing = missing_sml_df['Gap Size'].sum() + missing_lrg_df['Gap Size'].sum()
-            per_data_pts = round((tot_missing / tot_data_pts) * 100, 1)
-
-            # Count the cleaned data pts and find the total percent cleaned
-            tot_clean = missing_sml_df['Gap Size'][missing_sml_df['Solutions Method'] != 'unfilled'].sum() \
-                        + missing_lrg_df['Gap Size'][missing_lrg_df['Solutions Method'] != 'unfilled'].sum()
-            per_clean = round((tot_clean / tot_missing) * 100, 1)
-            clean_stats = pd.DataFrame([[tot_cols, tot_data_pts, tot_missing_sml, tot_missing_lrg, tot_missing,
-                                         per_data_pts, per_clean]],
-                                       columns=['tot_cols', 'tot_data_pts', 'tot_missing_sml', 'tot_missing_lrg',
-                                                'tot_missing', 'per_data_pts', 'per_clean'])
-            clean_stats = clean_stats.to_json(orient='records')
-
-            # Produce the summary table for the small missing gaps in data
-            missing_sml = html.Div([
-                dash_table.DataTable(data=missing_sml_df.to_dict("rows"),
-                                     columns=[{"id": x, "name": x} for x in missing_sml_df.columns],
-                                     style_cell={'textAlign': 'left',
-                                                 'minWidth': '180px', 'width': '180px', 'maxWidth': '180px',
-                                                 'overflow': 'hidden',
-                                                 'textOverflow': 'ellipsis',
-                                                 'fontFamily': 'Avenir',
-                                                 'fontSize': '16px'
-                                                 },
-                                     tooltip_data=[
-                                         {
-                                             column: {'value': str(value), 'type': 'markdown'}
-                                             for column, value in row.items()
-                                         } for row in missing_sml_df.to_dict('records')
-                                     ],
-                                     tooltip_duration=None,
-                                     style_header={
-                                         'backgroundColor': 'white',
-                                         'fontWeight': 'bold',
-                                         'fontFamily': 'Avenir',
-                                         'fontSize': '16px',
-                                         'border': 'none'
-                                     },
-                                     style_data_conditional=[
-                                         {
-                                             'if': {'row_index': 'odd'},
-                                             'backgroundColor': '#FBF2E6'
-                                         }
-                                     ],
-                                     style_as_list_view=True,
-                                     style_table={'overflowX': 'auto'},
-                                     persistence=True
-                                     ),
-            ])
-
-            # Produce the summary table for the large missing gaps in data
-            missing_lrg = html.Div([
-                dash_table.DataTable(data=missing_lrg_df.to_dict("rows"),
-                                     columns=[{"id": x, "name": x} for x in missing_lrg_df.columns],
-                                     style_cell={'textAlign': 'left',
-                                                 'minWidth': '180px', 'width': '180px', 'maxWidth': '180px',
-                                                 'overflow': 'hidden',
-                                                 'textOverflow': 'ellipsis',
-                                                 'fontFamily': 'Avenir',
-                                                 'fontSize': '16px'
-                                                 },
-                                     tooltip_data=[
-                                         {
-                                             column: {'value': str(value), 'type': 'markdown'}
-                                             for column, value in row.items()
-                                         } for row in missing_lrg_df.to_dict('records')
-                                     ],
-                                     tooltip_duration=None,
-                                     style_header={
-                                         'backgroundColor': 'white',
-                                         'fontWeight': 'bold',
-                                         'fontFamily': 'Avenir',
-                                         'fontSize': '16px',
-                                         'border': 'none'
-                                     },
-                                     style_data_conditional=[
-                                         {
-                                             'if': {'row_index': 'odd'},
-                                             'backgroundColor': '#FBF2E6'
-                                         }
-                                     ],
-                                     style_as_list_view=True,
-                                     style_table={'overflowX': 'auto'},
-                                     persistence=True
-                                     ),
-            ])
-
-            # TODO: Possibly add functionality for an outlier table. Need to factor in for most
-            #  errors not having outliers
-
-            # Need to reset the index to be a column because the JSON conversion does not
-            # preserve the index through orient
-            updated_binlabel_df.reset_index(inplace=True)
-
-            # Need to convert the Date/Time column into a string before converting into JSON as JSON does not
-            # preserve the datetime format
-            updated_binlabel_df = updated_binlabel_df.to_json(orient='records', date_format='iso')
-
-            return updated_binlabel_df, missing_sml, missing_lrg, clean_stats, error_report, error_plot
+        # The fill/interp blocks are held as a table of row positions (used by the gap viewer). The tables of the
+        # various solutions that have been applied to the data are taken from it, where gaps below 3 values are
+        # reported as small gaps
+        gap_table = block_table(fill_blocks, interp_blocks)
+        time_idx = updated_binlabel_df.index
+        sols_df = pd.DataFrame({'Parameter': gap_table['Parameter'],
+                                'Start Time': time_idx[gap_table['Start'].values],
+                                'End Time': time_idx[gap_table['End'].values],
+                                'Gap Size': gap_table['Gap Size'],
+                                'Solutions Method': gap_table['Solutions Method']})
+        missing_sml_df = sols_df[sols_df['Gap Size'] < 3].reset_index(drop=True)
+        missing_lrg_df = sols_df[sols_df['Gap Size'] >= 3].reset_index(drop=True)
+
+        # Calculate the stats of missing values for the summary table in the clean-report callback
+        # The percentage of missing data points is based on the user selected columns only and not other parameters
+        tot_cols = len(data_cols)
+        tot_data_pts = len(updated_binlabel_df) * tot_cols
+        tot_missing_sml = len(missing_sml_df)
+        tot_missing_lrg = len(missing_lrg_df)
+        tot_missing = missing_sml_df['Gap Size'].sum() + missing_lrg_df['Gap Size'].sum()
+        per_data_pts = round((tot_missing / tot_data_pts) * 100, 1)
+
+        # Count the cleaned data pts and find the total percent cleaned
+        tot_clean = missing_sml_df['Gap Size'][missing_sml_df['Solutions Method'] != 'unfilled'].sum() \
+                    + missing_lrg_df['Gap Size'][missing_lrg_df['Solutions Method'] != 'unfilled'].sum()
+        per_clean = round((tot_clean / tot_missing) * 100, 1) if tot_missing else 100.0
+        clean_stats = pd.DataFrame([[tot_cols, tot_data_pts, tot_missing_sml, tot_missing_lrg, tot_missing,
+                                     per_data_pts, per_clean]],
+                                   columns=['tot_cols', 'tot_data_pts', 'tot_missing_sml', 'tot_missing_lrg',
+                                            'tot_missing', 'per_data_pts', 'per_clean'])
+        clean_stats = clean_stats.to_json(orient='records')
+
+        # Produce the summary table for the small missing gaps in data. The rows of the tables are paged from the
+        # server (see 'missing_sml_page' and 'missing_lrg_page')
+        missing_sml = html.Div([
+            dash_table.DataTable(id='missing-sml-table',
+                                 columns=[{"id": x, "name": x} for x in missing_sml_df.columns],
+                                 page_current=0,
+                                 page_size=PAGE_SIZE,
+                                 page_action='custom',
+                                 sort_action='custom',
+                                 sort_mode='multi',
+                                 sort_by=[],
+                                 filter_action='custom',
+                                 filter_query='',
+                                 style_cell={'textAlign': 'left',
+                                             'minWidth': '180px', 'width': '180px', 'maxWidth': '180px',
+                                             'overflow': 'hidden',
+                                             'textOverflow': 'ellipsis',
+                                             'fontFamily': 'Avenir',
+                                             'fontSize': '16px'
+                                             },
+                                 tooltip_duration=None,
+                                 style_header={
+                                     'backgroundColor': 'white',
+                                     'fontWeight': 'bold',
+                                     'fontFamily': 'Avenir',
+                                     'fontSize': '16px',
+                                     'border': 'none'
+                                 },
+                                 style_data_conditional=[
+                                     {
+                                         'if': {'row_index': 'odd'},
+                                         'backgroundColor': '#FBF2E6'
+                                     }
+                                 ],
+                                 style_as_list_view=True,
+                                 style_table={'overflowX': 'auto'},
+                                 persistence=True
+                                 ),
+        ])
 
-        else:
-            raise PreventUpdate
+        # Produce the summary table for the large missing gaps in data
+        missing_lrg = html.Div([
+            dash_table.DataTable(id='missing-lrg-table',
+                                 columns=[{"id": x, "name": x} for x in missing_lrg_df.columns],
+                                 page_current=0,
+                                 page_size=PAGE_SIZE,
+                                 page_action='custom',
+                                 sort_action='custom',
+                                 sort_mode='multi',
+                                 sort_by=[],
+                                 filter_action='custom',
+                                 filter_query='',
+                                 style_cell={'textAlign': 'left',
+                                             'minWidth': '180px', 'width': '180px', 'maxWidth': '180px',
+                                             'overflow': 'hidden',
+                                             'textOverflow': 'ellipsis',
+                                             'fontFamily': 'Avenir',
+                                             'fontSize': '16px'
+                                             },
+                                 tooltip_duration=None,
+                                 style_header={
+                                     'backgroundColor': 'white',
+                                     'fontWeight': 'bold',
+                                     'fontFamily': 'Avenir',
+                                     'fontSize': '16px',
+                                     'border': 'none'
+                                 },
+                                 style_data_conditional=[
+                                     {
+                                         'if': {'row_index': 'odd'},
+                                         'backgroundColor': '#FBF2E6'
+                                     }
+                                 ],
+                                 style_as_list_view=True,
+                                 style_table={'overflowX': 'auto'},
+                                 persistence=True
+                                 ),
+        ])
+
+        # TODO: Possibly add functionality for an outlier table. Need to factor in for most
+        #  errors not having outliers
+
+        # Keep the time indexed data on the server for plotting. The pyramids are built once here so that any
+        # zooming of the plots only aggregates the visible range of the data
+        cols_toclean = data_cols['props']['children']['props']['value']
+        data_key = dataset_key(*file_keys(name, contents)[0], cols_toclean,
+                               date_cols['props']['children']['props']['value'], interp, sorted(fill_methods))
+        time_vals = updated_binlabel_df.index.values
+        pyramids = {}
+        for col in cols_toclean:
+            pyramids[col] = Pyramid(time_vals, pd.to_numeric(updated_binlabel_df[col], errors='coerce'))
+            pyramids[col + '_cl'] = Pyramid(time_vals,
+                                            pd.to_numeric(updated_binlabel_df[col + '_cl'], errors='coerce'))
+        # The gaps are held as a table of row positions for the gap viewer. Each column also has its own table so
+        # that stepping through the gaps of a column is a direct lookup
+        gaps = {None: gap_table}
+        for col, col_table in gap_table.groupby('Parameter'):
+            gaps[col] = col_table.reset_index(drop=True)
+        session_cache.put(data_key, df=updated_binlabel_df, pyramids=pyramids, gaps=gaps,
+                          missing_sml=missing_sml_df, missing_lrg=missing_lrg_df, settlement=settle_df)
+        view_cols = [{'label': col, 'value': col} for col in cols_toclean]
+
+        # Need to reset the index to be a column because the JSON conversion does not
+        # preserve the index through orient
+        json_df = updated_binlabel_df.reset_index()
+
+        # Need to convert the Date/Time column into a string before converting into JSON as JSON does not
+        # preserve the datetime format
+        json_df = json_df.to_json(orient='records', date_format='iso')
+
+        return json_df, missing_sml, missing_lrg, clean_stats, error_report, error_plot, data_key, view_cols, \
+            view_cols
 
     else:
         raise PreventUpdate
@@ -2220,6 +2536,177 @@ def clean_report(clean_stats, start):
         raise PreventUpdate
 
 
+@app.callback(Output('clean-raw-plot', 'figure'),
+              [Input('clean-data-key', 'data'),
+               Input('view-col', 'value'),
+               Input('clean-raw-plot', 'relayoutData')])
+def clean_raw_plot(data_key, col, relayout_data):
+    """
+    Callback function to plot the raw and cleaned data of a column. The data are taken from the server-side pyramids
+    so that only the visible range is aggregated when the user zooms and no trace exceeds MAX_PTS points.
+
+    :param data_key: key of the cleaned data in the server-side cache
+    :param col: user selected column
+    :param relayout_data: zoom/pan events from the plot
+
+    :return: plotly figure
+    """
+    if not data_key or not col:
+        raise PreventUpdate
+
+    pyramids = session_cache.get(data_key, 'pyramids')
+    if pyramids is None:
+        raise PreventUpdate
+
+    # Only re-aggregate the range that is visible. A reset of the axes returns the full range
+    x_range = relayout_range(relayout_data)
+    x0, x1 = x_range if x_range else (None, None)
+
+    # Colours follow the error bar plots
+    traces = []
+    for name, colour in zip([col, col + '_cl'], ['#3D4E68', '#ea8f32']):
+        x, y = pyramids[name].view(x0, x1, max_pts=MAX_PTS)
+        traces.append(go.Scattergl(x=x, y=y, mode='lines', name=name, line={'color': colour, 'width': 1}))
+
+    # 'uirevision' keeps the zoom of the user while the traces are replaced
+    layout = go.Layout(
+        margin=dict(t=20, b=40, l=40, r=10),
+        font={'family': 'avenir'},
+        legend=dict(orientation='h'),
+        hovermode="closest",
+        uirevision='{}_{}'.format(data_key, col),
+    )
+
+    return {"data": traces, "layout": layout}
+
+
+@app.callback([Output('missing-sml-table', 'data'),
+               Output('missing-sml-table', 'tooltip_data'),
+               Output('missing-sml-table', 'page_count')],
+              [Input('missing-sml-table', 'page_current'),
+               Input('missing-sml-table', 'page_size'),
+               Input('missing-sml-table', 'sort_by'),
+               Input('missing-sml-table', 'filter_query'),
+               Input('clean-data-key', 'data')])
+def missing_sml_page(page_current, page_size, sort_by, filter_query, data_key):
+    """
+    Callback function to page, sort and filter the table of small gaps on the server
+
+    :return: page rows, page tooltips, total number of pages
+    """
+    return table_page(data_key, 'missing_sml', page_current, page_size, sort_by, filter_query)
+
+
+@app.callback([Output('missing-lrg-table', 'data'),
+               Output('missing-lrg-table', 'tooltip_data'),
+               Output('missing-lrg-table', 'page_count')],
+              [Input('missing-lrg-table', 'page_current'),
+               Input('missing-lrg-table', 'page_size'),
+               Input('missing-lrg-table', 'sort_by'),
+               Input('missing-lrg-table', 'filter_query'),
+               Input('clean-data-key', 'data')])
+def missing_lrg_page(page_current, page_size, sort_by, filter_query, data_key):
+    """
+    Callback function to page, sort and filter the table of large gaps on the server
+
+    :return: page rows, page tooltips, total number of pages
+    """
+    return table_page(data_key, 'missing_lrg', page_current, page_size, sort_by, filter_query)
+
+
+@app.callback(Output('gap-num', 'value'),
+              [Input('gap-prev', 'n_clicks'),
+               Input('gap-next', 'n_clicks'),
+               Input('gap-col', 'value'),
+               Input('clean-data-key', 'data')],
+              [State('gap-num', 'value')])
+def gap_navigation(prev, nxt, col, data_key, gap_num):
+    """
+    Callback function to step to the previous/next gap of the gap viewer. A new dataset or column starts from the first
+    gap.
+
+    :param prev: clicks of the 'Previous' button
+    :param nxt: clicks of the 'Next' button
+    :param col: user selected column (None for all columns)
+    :param data_key: key of the cleaned data in the server-side cache
+    :param gap_num: the current gap number
+
+    :return: the new gap number
+    """
+    triggered = dash.callback_context.triggered
+    trigger = triggered[0]['prop_id'] if triggered else ''
+
+    if not trigger.startswith('gap-prev') and not trigger.startswith('gap-next'):
+        return 1
+
+    gaps = session_cache.get(data_key, 'gaps')
+    if gaps is None or col not in gaps:
+        raise PreventUpdate
+
+    # Keep the gap number within the number of gaps available
+    step = -1 if trigger.startswith('gap-prev') else 1
+    return int(min(max((gap_num or 1) + step, 1), max(len(gaps[col]), 1)))
+
+
+@app.callback([Output('gap-plot', 'figure'),
+               Output('gap-info', 'children')],
+              [Input('gap-num', 'value'),
+               Input('gap-col', 'value'),
+               Input('clean-data-key', 'data')])
+def gap_plot(gap_num, col, data_key):
+    """
+    Callback function to plot the raw and cleaned data around a single gap. Only a window of the server-side data is
+    taken around the gap so that each step costs the same regardless of the size of the dataset.
+
+    :param gap_num: the gap to display (starting at 1)
+    :param col: user selected column (None for all columns)
+    :param data_key: key of the cleaned data in the server-side cache
+
+    :return: plotly figure, description of the gap
+    """
+    if not data_key or not gap_num:
+        raise PreventUpdate
+
+    cached = session_cache.get(data_key)
+    if cached is None or col not in cached['gaps']:
+        raise PreventUpdate
+
+    gaps = cached['gaps'][col]
+    if len(gaps) == 0:
+        return {"data": [], "layout": go.Layout(font={'family': 'avenir'})}, "No gaps were found."
+
+    # Find the gap and the window of data around it
+    num = min(int(gap_num), len(gaps))
+    gap = gaps.iloc[num - 1]
+    time_idx = cached['df'].index
+    pad = max(GAP_PAD, int(gap['Gap Size']))
+    x0 = time_idx[max(gap['Start'] - pad, 0)]
+    x1 = time_idx[min(gap['End'] + pad, len(time_idx) - 1)]
+
+    # Colours follow the raw versus cleaned data plot
+    traces = []
+    for name, colour in zip([gap['Parameter'], gap['Parameter'] + '_cl'], ['#3D4E68', '#ea8f32']):
+        x, y = cached['pyramids'][name].view(x0, x1, max_pts=MAX_PTS)
+        traces.append(go.Scattergl(x=x, y=y, mode='lines+markers', name=name, line={'color': colour, 'width': 1},
+                                   marker={'size': 3}))
+
+    # Shade the gap
+    layout = go.Layout(
+        margin=dict(t=20, b=40, l=40, r=10),
+        font={'family': 'avenir'},
+        legend=dict(orientation='h'),
+        hovermode="closest",
+        shapes=[dict(type='rect', xref='x', yref='paper', x0=time_idx[gap['Start']], x1=time_idx[gap['End']],
+                     y0=0, y1=1, fillcolor='#FBF2E6', opacity=0.6, layer='below', line={'width': 0})],
+    )
+
+    gap_info = "Gap {} of {}: '{}' from {} to {} ({} data point(s)), solution applied: {}".format(
+        num, len(gaps), gap['Parameter'], time_idx[gap['Start']], time_idx[gap['End']], gap['Gap Size'],
+        gap['Solutions Method'])
+
+    return {"data": traces, "layout": layout}, gap_info
+
+
 @app.callback(Output('download-clean-data', 'data'),
               [Input('final-binlabel-df', 'children'),
                Input('btn_csv', 'n_clicks'),
@@ -2228,7 +2715,8 @@ def clean_report(clean_stats, start):
                Input('uploaded-data', 'filename')])
 def clean_data_dwn(final_df, n_clicks, raw_clean_opt, data_cols, fname):
     if n_clicks > 0:
-        # Format filename
+        # Format filename (after the first file where many files were uploaded and merged)
+        fname = fname[0] if type(fname) == list else fname
         dwn_fname = fname.split('.')[0] + "_cleaned." + fname.split('.')[-1]
 
         # Need to convert the binary labels in string to avoid errors in formatting in JSON and export.
@@ -2247,6 +2735,28 @@ def clean_data_dwn(final_df, n_clicks, raw_clean_opt, data_cols, fname):
         raise PreventUpdate
 
 
+@app.callback(Output('download-settlement', 'data'),
+              Input('btn_settle', 'n_clicks'),
+              [State('clean-data-key', 'data'),
+               State('uploaded-data', 'filename')])
+def settlement_dwn(n_clicks, data_key, fname):
+    """
+    Callback function to download the cleaned data aggregated to the half-hourly settlement periods, with the number
+    of raw, filled and unfilled samples of each period (see the 'settlement_agg' function)
+
+    :return: csv download of the settlement periods
+    """
+    settle_df = session_cache.get(data_key, 'settlement') if n_clicks and data_key else None
+    if settle_df is None:
+        raise PreventUpdate
+
+    # Format filename (after the first file where many files were uploaded and merged)
+    fname = fname[0] if type(fname) == list else fname
+    dwn_fname = fname.split('.')[0] + "_settlement.csv"
+
+    return dcc.send_data_frame(settle_df.to_csv, dwn_fname)
+
+
 @app.callback(Output('download-msg', 'children'),
               Input('start-clean', 'n_clicks'))
 def dwn_msg(stat_clean):
@@ -2258,7 +2768,9 @@ def dwn_msg(stat_clean):
                         "You are now able to download your cleaned data using the options below. "
                         "You can either choose between downloading the cleaned data only (raw data for the "
                         "columns you selected will be removed), or to have a file containing both "
-                        "the raw and cleaned data."
+                        "the raw and cleaned data. The cleaned data can also be downloaded as the energy of "
+                        "each half-hourly settlement period, with the number of raw, filled and unfilled samples "
+                        "of each period."
                     ],
                     className="paratext"
                 )
@@ -2315,6 +2827,7 @@ def debug_submission(name, email, issue_page, issue_descrip, rating, debug):
 
             # Needed for YAGMAIL service keychain credentials. NOT Secure but this email is simply for debugging
             # Need to determine how to access creds on the server to prevent hardcoding pwd
+            import yagmail
             yag_service = yagmail.SMTP("projectleodebug@gmail.com", "ProjecTLEODebuG2021")
 
             # Send emails to the app developers based on the user input
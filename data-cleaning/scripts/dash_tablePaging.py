@@ -0,0 +1,191 @@
+"""
+This python module contains the functions used for the server-side paging, sorting and filtering of the Dash
+DataTables within the Project LEO tools. The tables are rendered with page_action='custom' (as well as
+sort_action='custom' and filter_action='custom') so that only the visible page of a table and its tooltips are sent
+to the browser while the full table is held on the server (see 'dash_sessionCache.py'). Tables that are not held in
+memory (e.g. the memory-mapped columns of an upload, see 'dash_uploadStore.py') are paged by their row positions, where
+only the columns that are filtered or sorted on are loaded (see 'page_rows').
+
+The filter syntax follows the DataTable filter row, e.g. '{Gap Size} ge 3 && {Parameter} contains volt'.
+"""
+
+# Importing the relevant modules
+import math
+import numpy as np
+
+# The default number of rows per page
+PAGE_SIZE = 10
+
+# The operators of the DataTable filter row and the pandas equivalent
+FILTER_OPERATORS = [['ge ', '>='],
+                    ['le ', '<='],
+                    ['lt ', '<'],
+                    ['gt ', '>'],
+                    ['ne ', '!='],
+                    ['eq ', '='],
+                    ['contains '],
+                    ['datestartswith ']]
+
+
+def split_filter_part(filter_part):
+    """
+    Splits a single part of a DataTable filter query into its column, operator and value.
+
+    :param filter_part: str e.g. '{Gap Size} ge 3'
+
+    :return: column name, operator, value (all None if the part can not be read)
+    """
+    for operator_type in FILTER_OPERATORS:
+        for operator in operator_type:
+            if operator in filter_part:
+                name_part, value_part = filter_part.split(operator, 1)
+                name = name_part[name_part.find('{') + 1: name_part.rfind('}')]
+
+                # Quoted values are strings, everything else is converted to a number if possible
+                value_part = value_part.strip()
+                v0 = value_part[0] if value_part else ''
+                if v0 and v0 == value_part[-1] and v0 in ("'", '"', '`'):
+                    value = value_part[1: -1].replace('\\' + v0, v0)
+                else:
+                    try:
+                        value = float(value_part)
+                    except ValueError:
+                        value = value_part
+
+                # The word operators are returned as is, the symbols are returned in their pandas form
+                return name, operator_type[-1].strip(), value
+
+    return [None] * 3
+
+
+def filter_frame(df, filter_query):
+    """
+    Applies a DataTable filter query to a dataframe. Parts of the query that can not be read are ignored.
+
+    :param df: Full dataframe
+    :param filter_query: DataTable filter query
+
+    :return: Filtered dataframe
+    """
+    if not filter_query:
+        return df
+
+    for filter_part in filter_query.split(' && '):
+        col_name, operator, filter_value = split_filter_part(filter_part)
+        if col_name not in df.columns:
+            continue
+
+        # Comparisons of the wrong type (e.g. text against a numeric column) are ignored
+        try:
+            if operator in ('<', '<=', '>', '>=', '!='):
+                df = df.loc[getattr(df[col_name], {'<': 'lt', '<=': 'le', '>': 'gt', '>=': 'ge',
+                                                   '!=': 'ne'}[operator])(filter_value)]
+            elif operator == '=':
+                df = df.loc[df[col_name] == filter_value]
+            elif operator == 'contains':
+                df = df.loc[df[col_name].astype(str).str.contains(str(filter_value), regex=False)]
+            elif operator == 'datestartswith':
+                df = df.loc[df[col_name].astype(str).str.startswith(str(filter_value))]
+        except (TypeError, ValueError):
+            continue
+
+    return df
+
+
+def page_frame(df, page_current, page_size, sort_by=None, filter_query='', views=None):
+    """
+    Returns a single page of a dataframe after it has been filtered and sorted. As users will mostly change pages
+    without changing the filter or sort, the filtered and sorted frame can be held in 'views' (a dict) and reused.
+
+    :param df: Full dataframe
+    :param page_current: The current page of the table (starting at 0)
+    :param page_size: The number of rows per page
+    :param sort_by: DataTable 'sort_by' list
+    :param filter_query: DataTable filter query
+    :param views: Optional dict used to hold the last filtered and sorted frame
+
+    :return: page dataframe, total number of pages
+    """
+    sort_by = sort_by or []
+    query = (filter_query or '', tuple((s['column_id'], s['direction']) for s in sort_by))
+
+    # The query and its frame are held (and swapped) as one tuple, so that a concurrent request never pairs the query
+    # of one request with the frame of another
+    last = views.get('last') if views is not None else None
+    if last is not None and last[0] == query:
+        view = last[1]
+    else:
+        view = filter_frame(df, filter_query)
+        if sort_by:
+            view = view.sort_values([s['column_id'] for s in sort_by],
+                                    ascending=[s['direction'] == 'asc' for s in sort_by], kind='mergesort')
+        if views is not None:
+            views['last'] = (query, view)
+
+    page_current = page_current or 0
+    page_count = max(int(math.ceil(len(view) / page_size)), 1)
+    page_df = view.iloc[page_current * page_size: (page_current + 1) * page_size]
+
+    return page_df, page_count
+
+
+def page_rows(load, n_rows, page_current, page_size, sort_by=None, filter_query='', views=None):
+    """
+    Returns the row positions of a single page of a table that is not held in memory after it has been filtered and
+    sorted. Only the columns of the filter and sort are loaded (through 'load') to find the order of the rows. As in
+    'page_frame', the row positions of the filtered and sorted table can be held in 'views' (a dict) and reused.
+
+    :param load: Function that returns the given list of columns of every row of the table as a dataframe, indexed by
+                 the row positions
+    :param n_rows: The number of rows of the table
+    :param page_current: The current page of the table (starting at 0)
+    :param page_size: The number of rows per page
+    :param sort_by: DataTable 'sort_by' list
+    :param filter_query: DataTable filter query
+    :param views: Optional dict used to hold the last filtered and sorted row positions
+
+    :return: array of the row positions of the page, total number of pages
+    """
+    sort_by = sort_by or []
+    query = (filter_query or '', tuple((s['column_id'], s['direction']) for s in sort_by))
+
+    # Without a filter or sort the rows are in their original order and nothing needs to be loaded
+    last = views.get('last') if views is not None else None
+    if last is not None and last[0] == query:
+        positions = last[1]
+    elif not query[0] and not sort_by:
+        positions = None
+    else:
+        filter_cols = [split_filter_part(part)[0] for part in filter_query.split(' && ')] if filter_query else []
+        view = filter_frame(load(list(dict.fromkeys(c for c in filter_cols + [s['column_id'] for s in sort_by]
+                                                    if c is not None))), filter_query)
+        if sort_by:
+            view = view.sort_values([s['column_id'] for s in sort_by],
+                                    ascending=[s['direction'] == 'asc' for s in sort_by], kind='mergesort')
+        positions = view.index.values
+        if views is not None:
+            views['last'] = (query, positions)
+
+    page_current = page_current or 0
+    n_view = n_rows if positions is None else len(positions)
+    page_count = max(int(math.ceil(n_view / page_size)), 1)
+    start, stop = page_current * page_size, min((page_current + 1) * page_size, n_view)
+    page = np.arange(start, max(stop, start)) if positions is None else positions[start: stop]
+
+    return page, page_count
+
+
+def page_tooltips(page_df):
+    """
+    Creates the DataTable tooltips of the rows in a page only.
+
+    :param page_df: page dataframe
+
+    :return: list of tooltip dicts
+    """
+    return [
+        {
+            column: {'value': str(value), 'type': 'markdown'}
+            for column, value in row.items()
+        } for row in page_df.to_dict('records')
+    ]
@@ -0,0 +1,294 @@
+"""
+This python module contains a column-addressable store of the uploads of the Dash tools. An upload is parsed once when
+it arrives and each of its columns is written to its own NumPy (.npy) file together with a small manifest of the
+column names. The later stages of the tools (e.g. the error detection and cleaning) then only load the columns that
+the user selected (the data columns and the date/time columns) instead of re-parsing the whole file, so the parse time
+and memory scale with the selection rather than with the width of the file (e.g. the 140 columns of an MVSA export).
+
+The columns are opened as read-only memory maps. When the app is served by several gunicorn workers, every worker
+attaches to the same files on the local disk and they share one copy of the data in the page cache of the OS instead
+of each worker parsing and holding the upload in its own memory. Text columns (e.g. the date and time) are written as
+integer codes into their unique values so that they can be memory mapped as well. The unique values are written as a
+fixed-width unicode array, so that no file of the store is ever unpickled (the store is in a shared temporary folder).
+
+NB: The store is kept on the local disk (under UPLOAD_STORE_ROOT), which must be shared by the workers. An upload is
+    written into a temporary folder and renamed into place, so a worker never reads a partly written upload and two
+    workers writing the same upload do not clash. A load returns None on a miss and the caller should then fall back
+    to parsing the upload.
+"""
+
+# Importing the relevant modules
+import json
+import numbers
+import os
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+# The folder where the uploads are stored (one sub-folder per upload key)
+UPLOAD_STORE_ROOT = os.path.join(tempfile.gettempdir(), 'leo-upload-store')
+
+# The name of the manifest file that lists the columns of an upload and the file of each column
+MANIFEST = 'columns.json'
+
+# The types of column label that are kept in the manifest (e.g. the integer labels of a file without a header row).
+# Other labels are held as text
+LABEL_TYPES = {'int': int, 'float': float, 'str': str}
+
+# The number of rows of each chunk when an upload is loaded in chunks
+CHUNK_ROWS = 65536
+
+# The maximum number of uploads kept in the store before the least recently written ones are removed
+MAX_UPLOADS = 16
+
+
+def _label_type(col):
+    """
+    Simple function that returns the type of a column label as held in the manifest (see 'LABEL_TYPES').
+    """
+    if isinstance(col, numbers.Integral) and not isinstance(col, bool):
+        return 'int'
+    if isinstance(col, numbers.Real) and not isinstance(col, bool):
+        return 'float'
+
+    return 'str'
+
+
+def _frame(arrays, rows):
+    """
+    Simple function that reads the rows of the arrays of the store into a dataframe, where the text columns are decoded
+    from their codes (missing values as NaN). The rows are either a slice or an array of row positions, which are
+    used as the index.
+    """
+    data = {}
+    for col, values in arrays.items():
+        if type(values) == tuple:
+            codes, uniques = values
+            values = np.append(uniques.astype(object), np.nan).take(codes[rows])
+        else:
+            values = values[rows]
+        data[col] = values
+
+    if isinstance(rows, slice):
+        index = pd.RangeIndex(rows.start or 0, (rows.start or 0) + len(next(iter(data.values()), [])))
+    else:
+        index = pd.Index(rows)
+
+    return pd.DataFrame(data, index=index)
+
+
+class UploadStore:
+    """
+    Store of uploaded dataframes where each column can be loaded on its own from a memory-mapped file.
+
+    :param root: The folder of the store
+    :param max_uploads: The maximum number of uploads kept before the oldest ones are removed
+    """
+
+    def __init__(self, root=UPLOAD_STORE_ROOT, max_uploads=MAX_UPLOADS):
+        self.root = root
+        self.max_uploads = max_uploads
+
+        # Manifests that have already been read by this process (a later callback then attaches without any parsing)
+        self._manifests = {}
+        self._lock = threading.Lock()
+
+    def path(self, key):
+        """
+        Simple function that returns the folder of an upload.
+
+        :param key: The dataset key of the upload (see 'dataset_key' in 'dash_sessionCache.py')
+
+        :return: str: folder of the upload
+        """
+        return os.path.join(self.root, key)
+
+    def write(self, key, df):
+        """
+        This function writes each column of an uploaded dataframe to its own .npy file. Numeric, boolean and datetime
+        columns are written as plain arrays. The remaining (object) columns are written as integer codes (-1 for a
+        missing value) with a second file of their unique values (as text). The manifest holds the column labels and
+        their type in their original order, so that the labels of a file without a header row (integers) are loaded
+        as they were written.
+
+        The files are written into a temporary folder which is then renamed to the folder of the upload. If another
+        process has written the same upload in the meantime, its copy is kept.
+
+        :param key: The dataset key of the upload
+        :param df: The parsed upload
+
+        :return: None
+        """
+        folder = self.path(key)
+        if os.path.exists(os.path.join(folder, MANIFEST)):
+            return
+
+        os.makedirs(self.root, exist_ok=True)
+        tmp_folder = tempfile.mkdtemp(prefix='.{}-'.format(key), dir=self.root)
+        try:
+            manifest = []
+            for c, col in enumerate(df.columns):
+                entry = {'name': str(col), 'type': _label_type(col), 'file': '{}.npy'.format(c)}
+                values = df[col].to_numpy()
+
+                if values.dtype == object:
+                    codes, uniques = pd.factorize(values)
+                    values = codes.astype(np.int32)
+                    entry['uniques'] = '{}_uniques.npy'.format(c)
+                    np.save(os.path.join(tmp_folder, entry['uniques']), np.asarray(uniques, dtype=str),
+                            allow_pickle=False)
+
+                np.save(os.path.join(tmp_folder, entry['file']), values, allow_pickle=False)
+                manifest.append(entry)
+
+            with open(os.path.join(tmp_folder, MANIFEST), 'w') as f:
+                json.dump(manifest, f)
+
+            os.rename(tmp_folder, folder)
+        except OSError:
+            # Another process renamed its copy of the same upload into place first (or the write failed)
+            shutil.rmtree(tmp_folder, ignore_errors=True)
+            if not os.path.exists(os.path.join(folder, MANIFEST)):
+                raise
+
+        self.prune()
+
+    def columns(self, key):
+        """
+        Simple function that returns the manifest of an upload. The manifest is only read from disk the first time
+        that this process asks for the upload.
+
+        :param key: The dataset key of the upload
+
+        :return: dict of the manifest entry of each column label, or None if the upload is not in the store
+        """
+        with self._lock:
+            if key in self._manifests:
+                return self._manifests[key]
+
+        try:
+            with open(os.path.join(self.path(key), MANIFEST)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        try:
+            entries = {LABEL_TYPES[entry.get('type', 'str')](entry['name']): entry for entry in manifest}
+        except (KeyError, TypeError, ValueError):
+            return None
+        with self._lock:
+            self._manifests[key] = entries
+
+        return entries
+
+    def arrays(self, key, columns=None):
+        """
+        This function attaches to the given columns of an upload without reading them into memory. The numeric
+        columns are returned as read-only memory maps and the text columns as (memory-mapped codes, unique values).
+
+        :param key: The dataset key of the upload
+        :param columns: list of the column names to attach to [default: all of the columns]
+
+        :return: dict of the arrays of each column, or None if the upload (or one of the columns) is not in the store
+        """
+        entries = self.columns(key)
+        if entries is None:
+            return None
+
+        columns = list(entries) if columns is None else columns
+        if any(col not in entries for col in columns):
+            return None
+
+        folder = self.path(key)
+        arrays = {}
+        try:
+            for col in dict.fromkeys(columns):
+                values = np.load(os.path.join(folder, entries[col]['file']), mmap_mode='r')
+                if 'uniques' in entries[col]:
+                    values = (values, np.load(os.path.join(folder, entries[col]['uniques']), allow_pickle=False))
+                arrays[col] = values
+        except (OSError, ValueError):
+            # The upload was pruned (e.g. by another worker) after its manifest was read, or a file holds pickled
+            # objects
+            with self._lock:
+                self._manifests.pop(key, None)
+            return None
+
+        return arrays
+
+    def load(self, key, columns=None, rows=None):
+        """
+        This function loads only the given columns of an upload (projection pushdown), and only the given rows where
+        these are given (e.g. a page of a table). The columns are returned in the order given and the text columns are
+        decoded from their codes (missing values as NaN).
+
+        :param key: The dataset key of the upload
+        :param columns: list of the column names to load [default: all of the columns]
+        :param rows: slice or array of the row positions to load [default: all of the rows]
+
+        :return: pd.DataFrame of the columns (with the row positions as the index), or None if the upload (or one of
+                 the columns) is not in the store
+        """
+        arrays = self.arrays(key, columns)
+        if arrays is None:
+            return None
+
+        return _frame(arrays, slice(None) if rows is None else rows)
+
+    def n_rows(self, key):
+        """
+        Simple function that returns the number of rows of an upload, from the memory map of its first column.
+
+        :param key: The dataset key of the upload
+
+        :return: int, or None if the upload is not in the store
+        """
+        entries = self.columns(key)
+        arrays = self.arrays(key, list(entries)[:1]) if entries else None
+        if not arrays:
+            return None
+
+        first = next(iter(arrays.values()))
+        return len(first[0] if type(first) == tuple else first)
+
+    def chunks(self, key, columns=None, chunksize=CHUNK_ROWS):
+        """
+        This function loads the given columns of an upload in chunks of rows, where only the rows of the chunk are read
+        from the memory-mapped files (e.g. to merge many uploads without holding all of them in memory).
+
+        :param key: The dataset key of the upload
+        :param columns: list of the column names to load [default: all of the columns]
+        :param chunksize: The number of rows of each chunk
+
+        :return: generator of pd.DataFrame chunks (with a range index of the rows of the upload), or None if the upload
+                 (or one of the columns) is not in the store
+        """
+        arrays = self.arrays(key, columns)
+        if arrays is None:
+            return None
+
+        first = next(iter(arrays.values()), None)
+        n_rows = 0 if first is None else len(first[0] if type(first) == tuple else first)
+
+        return (_frame(arrays, slice(start, start + chunksize)) for start in range(0, n_rows, chunksize))
+
+    def prune(self):
+        """
+        Simple function that removes the oldest uploads once more than 'max_uploads' are held in the store.
+
+        :return: None
+        """
+        try:
+            folders = [(entry.stat().st_mtime, entry.path) for entry in os.scandir(self.root)
+                       if entry.is_dir() and not entry.name.startswith('.')]
+        except OSError:
+            return
+
+        folders = [folder for _, folder in sorted(folders)]
+        for folder in folders[:max(len(folders) - self.max_uploads, 0)]:
+            shutil.rmtree(folder, ignore_errors=True)
+            with self._lock:
+                self._manifests.pop(os.path.basename(folder), None)
@@ -1,7 +1,4 @@
 # -*- coding: utf-8 -*-
-import base64
-import csv
-import io
 import os
 
 import dash
@@ -10,13 +7,16 @@ import dash_daq as daq
 import dash_uploader as du
 import pandas as pd
 import plotly.graph_objs as go
-import yagmail
 from dash import dcc
 from dash import html
 from dash.dependencies import Input, Output, State
 from dash.exceptions import PreventUpdate
 
 from scripts.dash_timeseriesClean import load_df, Formatting, Errors, Solutions
+from scripts.dash_timeseriesView import AggregatePyramid
+from scripts.dash_sessionCache import dataset_key
+from scripts.dash_uploadStore import UploadStore
+from scripts.dash_ingest import read_contents, read_file
 
 app = dash.Dash(__name__, meta_tags=[{"name": "viewport", "content": "width=device-width"}],
                 suppress_callback_exceptions=True)
@@ -26,6 +26,10 @@ UPLOAD_FOLDER_ROOT = r"/Users/mashtine/PycharmProjects/ProjectLEO_Data/" \
                      r"LEODashTools/Cleaning/data-cleaning/data/tmp"
 du.configure_upload(app, UPLOAD_FOLDER_ROOT, use_upload_id=True)
 
+# Column-addressable copy of each upload on the local disk, so that the scan only loads the selected columns. The
+# columns are memory mapped, so every gunicorn worker shares the one copy in the page cache
+upload_store = UploadStore()
+
 
 def Header(app):
     return html.Div([get_header(app), html.Br([])])
@@ -82,16 +86,12 @@ def get_header(app):
     return header
 
 
-def parse_contents(contents):
+def parse_contents(contents, usecols=None):
     # This function will only run once the right file type has been uploaded
-    # Split the binary string by decoding type and the encoded string
-    content_type, content_string = contents.split(',')
-
-    # Decode the data
-    decoded = base64.b64decode(content_string)
-
-    # Assumes that the user uploaded a CSV or TXT file
-    df = pd.read_csv(io.StringIO(decoded.decode('utf-8')))
+    # The contents are decoded once and the delimiter, header row, decimal and encoding of the CSV or TXT file are
+    # detected from the same buffer that is parsed (see 'dash_ingest.py'). Only the 'usecols' columns are parsed when
+    # they are given
+    df = read_contents(contents, usecols=usecols)
 
     return df
 
@@ -136,21 +136,25 @@ def error_solutions_processing(data_cols, date_cols, filename, usr_id):
     fmt = Formatting()
     data_errors = Errors()
 
-    # Reupload the data. This needs to be done because the serialisation of data into JSON affects how pandas
-    # reads in the datetime columns. This is not efficient and should be improved
-    os.chdir(os.path.join(UPLOAD_FOLDER_ROOT, usr_id))
-
-    if filename[0].split('.')[-1] == 'txt':
-        with open(filename[0], 'r') as csvfile:
-            dialect = csv.Sniffer().sniff(csvfile.read(1024))
-        full_df = pd.read_csv(filename[0], index_col=False, delimiter=dialect.delimiter)
-    else:
-        full_df = pd.read_csv(filename[0], index_col=False)
-
     # Establish the cols to clean and the date/time cols
     cols_toclean = data_cols['props']['children']['props']['value']
     date_cols = date_cols['props']['children']['props']['value']
 
+    # The uploaded file is only parsed by the first worker that needs it and is then converted into the (memory-mapped)
+    # upload store. Every later callback, in any worker, attaches to the selected columns of the store. The key
+    # includes the modification time and size of the file so that a re-uploaded file is parsed again
+    file_path = os.path.join(UPLOAD_FOLDER_ROOT, usr_id, filename[0])
+    file_stat = os.stat(file_path)
+    upload_key = dataset_key(file_path, file_stat.st_mtime_ns, file_stat.st_size)
+    sel_cols = list(dict.fromkeys(date_cols + cols_toclean))
+
+    full_df = upload_store.load(upload_key, sel_cols)
+    if full_df is None:
+        # The file is memory mapped once and its format is detected from the same buffer that is parsed
+        upload_df = read_file(file_path)
+        upload_store.write(upload_key, upload_df)
+        full_df = upload_df[sel_cols].copy()
+
     # Import the data from JSON and put into pd df. This section will add the "Errors" and "Solutions" columns
     # into the df as well as columns where the cleaned data will be entered. The label ord is important for
     # later cleaning stages.
@@ -309,7 +313,8 @@ def error_solutions_processing(data_cols, date_cols, filename, usr_id):
     if len(out_blocks.keys()) > 0:
         updated_binlabel_df, out_nan_blocks = data_sols.rvm_outliers(updated_binlabel_df)
     else:
-        out_nan_blocks = {}
+        # Without outliers only the missing values are filled
+        out_nan_blocks = nan_blocks
 
     # The dataframe is now ready for the filling of missing data. Please see the 'power_fill' function in the
     # 'dash_timeseriesClean.py' library for more information. The output variables, 'fill_blocks' and
@@ -321,6 +326,10 @@ def error_solutions_processing(data_cols, date_cols, filename, usr_id):
     else:
         fill_blocks, interp_blocks = {}, {}
 
+    # Any formatting errors are corrected in the cleaned columns (see the 'fmt_correct' function)
+    if fmt_blocks:
+        updated_binlabel_df, _ = data_sols.fmt_correct(updated_binlabel_df)
+
     return updated_binlabel_df, out_blocks, out_nan_blocks, fill_blocks, interp_blocks, error_report, error_plot
 
 
@@ -1273,6 +1282,9 @@ def update_output(contents, name):
             for col in df.columns:
                 cols.append({'label': '{}'.format(col), 'value': col})
 
+            # The columns are stored on the server so that the scan only loads the selected ones
+            upload_store.write(dataset_key(name, contents), df)
+
             # Need to use 'orient='records'' when exporting to JSON format for dash callbacks
             full_data = df.to_json(orient='records')
 
@@ -1413,14 +1425,18 @@ def error_detection(data_cols, date_cols, scan, contents, name):
         fmt = Formatting()
         data_errors = Errors()
 
-        # Reload the data. This needs to be done because the serialisation of data into JSON affects how pandas
-        # reads in the datetime columns. This is not efficient and should be improved
-        full_df = parse_contents(contents)
-
         # Establish the cols to clean and the date/time cols
         cols_toclean = data_cols['props']['children']['props']['value']
         date_cols = date_cols['props']['children']['props']['value']
 
+        # Only the selected date/time and data columns are loaded from the upload store (the JSON serialisation of the
+        # data would affect how pandas reads in the datetime columns). If the upload is not in the store, only these
+        # columns are parsed from the uploaded contents
+        sel_cols = list(dict.fromkeys(date_cols + cols_toclean))
+        full_df = upload_store.load(dataset_key(name, contents), sel_cols)
+        if full_df is None:
+            full_df = parse_contents(contents, usecols=sel_cols)[sel_cols]
+
         # Import the data from JSON and put into pd df. This section will add the "Errors" and "Solutions" columns
         # into the df as well as columns where the cleaned data will be entered. The label ord is important for
         # later cleaning stages.
@@ -1442,9 +1458,19 @@ def error_detection(data_cols, date_cols, scan, contents, name):
         # number of data gaps of various categories (single, large etc.)
         full_miss_tot, full_out_tot = 0, 0
 
+        # Missing timestamps (time gaps) are counted from the row counts of the daily level of the aggregate pyramid,
+        # using the same estimate of the data frequency as the cleaning tool. Each missing timestamp is a missing data
+        # point for every scanned column
+        time_df = df.set_index(df.columns[0])[cols_toclean]
+        freq = time_df.index.to_series().diff().min()
+        if len(time_df) > 1 and freq > pd.Timedelta(0):
+            pyramid = AggregatePyramid(time_df, rules=('D',))
+            full_gap_tot = int(pyramid.missing_times(freq, 'D').sum())*len(cols_toclean)
+        else:
+            full_gap_tot = 0
+
         for i, key in enumerate(nan_blocks.keys()):
             # miss_tot does not include outlier values.
-            #TODO: Include a count for missing time gaps
             miss_tot, out_tot = 0, 0
             size_idx = nan_blocks[key][1]
 
@@ -1459,9 +1485,11 @@ def error_detection(data_cols, date_cols, scan, contents, name):
                 miss_tot += sze
                 full_miss_tot += sze
 
-        error_totals['miss_stats'] = [full_miss_tot, full_out_tot,
-                                      round((full_miss_tot/(full_miss_tot + full_out_tot))*100, 2),
-                                      round((full_out_tot/(full_miss_tot + full_out_tot))*100, 2)]
+        full_err_tot = max(full_miss_tot + full_out_tot + full_gap_tot, 1)
+        error_totals['miss_stats'] = [full_miss_tot, full_out_tot, full_gap_tot,
+                                      round((full_miss_tot/full_err_tot)*100, 2),
+                                      round((full_out_tot/full_err_tot)*100, 2),
+                                      round((full_gap_tot/full_err_tot)*100, 2)]
 
         # Produce the updated gauges for reporting the stats
         miss_gauges = html.Div(
@@ -1474,7 +1502,7 @@ def error_detection(data_cols, date_cols, scan, contents, name):
                             id="missing-gauge",
                             max=100,
                             min=0,
-                            value=error_totals['miss_stats'][2],
+                            value=error_totals['miss_stats'][3],
                             units='%',
                             showCurrentValue=True,  # default size 200 pixel
                             color='#EA8F32',
@@ -1490,7 +1518,7 @@ def error_detection(data_cols, date_cols, scan, contents, name):
                             id="outlier-gauge",
                             max=100,
                             min=0,
-                            value=error_totals['miss_stats'][3],
+                            value=error_totals['miss_stats'][4],
                             units='%',
                             showCurrentValue=True,  # default size 200 pixel
                             color='#EA8F32',
@@ -1506,7 +1534,7 @@ def error_detection(data_cols, date_cols, scan, contents, name):
                             id="timegaps-gauge",
                             max=100,
                             min=0,
-                            value=0,
+                            value=error_totals['miss_stats'][5],
                             units='%',
                             showCurrentValue=True,  # default size 200 pixel
                             color='#EA8F32',
@@ -1518,7 +1546,7 @@ def error_detection(data_cols, date_cols, scan, contents, name):
         )
 
         # Produce a stats report depending on if errors were found
-        if nan_blocks:
+        if nan_blocks or full_gap_tot:
             stats_report = html.Div(
                 [
                     html.P(
@@ -1530,7 +1558,8 @@ def error_detection(data_cols, date_cols, scan, contents, name):
                                                               error_totals['miss_stats'][1])),
                             ", of which, ",
                             html.B("{} of them were outliers ".format(error_totals['miss_stats'][1])),
-                            "and there were 0 data points ",
+                            "and there were ",
+                            html.B("{} data points ".format(error_totals['miss_stats'][2])),
                             "where times were not accounted for. Please note that these values are only for the ",
                             html.B("{} column(s) ".format(len(cols_toclean))),
                             "that you have chosen to scan. You should consider using the ",
@@ -1566,14 +1595,15 @@ def error_detection(data_cols, date_cols, scan, contents, name):
             )
 
         # Place information into JSON
-        error_totals = pd.DataFrame(error_totals, index=['miss_tot', 'out_tot', 'per_miss', 'per_out'])
+        error_totals = pd.DataFrame(error_totals, index=['miss_tot', 'out_tot', 'gap_tot',
+                                                         'per_miss', 'per_out', 'per_gap'])
         error_totals = error_totals.to_json(orient='records')
 
         return error_totals, miss_gauges, stats_report
     else:
 
         # Return gauges with 0 values
-        error_totals = {'miss_stats': [0, 0, 0, 0]}
+        error_totals = {'miss_stats': [0, 0, 0, 0, 0, 0]}
         miss_gauges = html.Div(
             [
                 html.Div(
@@ -1628,7 +1658,8 @@ def error_detection(data_cols, date_cols, scan, contents, name):
         )
 
         # Place information into JSON
-        error_totals = pd.DataFrame(error_totals, index=['miss_tot', 'out_tot', 'per_miss', 'per_out'])
+        error_totals = pd.DataFrame(error_totals, index=['miss_tot', 'out_tot', 'gap_tot',
+                                                         'per_miss', 'per_out', 'per_gap'])
         error_totals = error_totals.to_json(orient='records')
 
         # Produce a message to guide the user
@@ -1675,6 +1706,7 @@ def debug_submission(name, email, issue_page, issue_descrip, rating, debug):
             # TODO: Make more secure by going through the oauth2 process
             # Needed for YAGMAIL service keychain credentials. NOT Secure but this email is simply for debugging
             # Need to determine how to access creds on the server to prevent hardcoding pwd
+            import yagmail
             yag_service = yagmail.SMTP("projectleodebug@gmail.com", "ProjecTLEODebuG2021")
 
             # Send emails to the app developers based on the user input
@@ -19,6 +19,8 @@ Spline Interpolation (spln_intpol)
 Hour-Day-Filling (hr_day_fill)
 Week-Filling (week_fill)
 Format correction (fmt_correct)
+Profile-Filling (prof_fill)
+Regression-Filling (reg_fill)
 
 """
 
@@ -32,7 +34,8 @@ import os
 #TODO: Add ignore fmt option
 #TODO: Properly document time_idx
 
-def energydata_clean(dataset, only_cleandata=True, save_data='', save_log=False, time_idx=False):
+def energydata_clean(dataset, only_cleandata=True, save_data='', save_log=False, time_idx=False, save_settlement=False,
+                     interp='linear', regression=False, profile=False):
     """
     This script will call upon various functions to perform automated error detection and data cleaning on a given
     dataset. The clean data file is set to not include the raw data by default. This script can take both a dataframe
@@ -47,6 +50,14 @@ def energydata_clean(dataset, only_cleandata=True, save_data='', save_log=False,
     :param save_data: Directory path to save the cleaned dataset [default: empty string with no saved output]
     :param save_log: Used to update the LEO Data Cleaning Log on Bitbucket
     :param time_idx: If True, this was filling any missing time periods in the data
+    :param save_settlement: If used (with 'save_data'), the cleaned data aggregated to the half-hourly settlement
+                            periods are also saved
+    :param interp: The interpolation method used to fill single missing values and short gaps, 'linear' (default) or
+                   a spline ('spline'/'akima' or 'cubic'). Please see the 'power_fill' function
+    :param regression: If used, the gaps that remain unfilled are filled from the strongly correlated columns of the
+                       dataset (e.g. the other phases of a supply)
+    :param profile: If used, the gaps that remain unfilled (after any regression) are filled from the typical weekday and time of day profile
+                    of the data
 
     :return: Cleaned Pandas Dataframe
     """
@@ -152,7 +163,8 @@ def energydata_clean(dataset, only_cleandata=True, save_data='', save_log=False,
     else:
         print("\nAs no outliers were detected in the data (based on the Z-score threshold set), the step of their"
               "\nremoval will be ignored and the dataset will now be cleaned for any missing data.")
-        out_nan_blocks = {}
+        # Without outliers only the missing values are filled
+        out_nan_blocks = nan_blocks
 
     # The dataframe is now ready for the filling of missing data. Please see the 'power_fill' function in the
     # 'dash_timeseriesClean.py' library for more information. Once this function has run, the dataset will have updated
@@ -164,13 +176,22 @@ def energydata_clean(dataset, only_cleandata=True, save_data='', save_log=False,
         print("\nThe dataset will now have any missing values filled. Please see the function documentation for further"
               " details \non how data filling is performed, including the criteria used.")
         updated_binlabel_df, fill_blocks, interp_blocks = data_sols.power_fill(updated_binlabel_df, out_nan_blocks,
-                                                                               freq, offset=1, interp='linear')
+                                                                               freq, offset=1, interp=interp,
+                                                                               regression=regression, profile=profile)
     else:
         print("\nAs no missing values were detected in the data, the step of data filling will be ignored."
               "\nIf this is the final step of the dataset cleaning, please see the output Error Log for "
               "further information")
         fill_blocks, interp_blocks = {}, {}
 
+    # Any formatting errors are corrected in the cleaned columns. Please see the 'fmt_correct' function in the
+    # 'dash_timeseriesClean.py' library for more information
+    if fmt_blocks:
+        banner("Format Correction", size='small')
+        updated_binlabel_df, corr_blocks = data_sols.fmt_correct(updated_binlabel_df)
+    else:
+        corr_blocks = {}
+
     # Updating of the Error Log now that the data have been cleaned. The Error Log will be saved as
     # 'Project LEO Data Cleaning Log.csv'" in the 'Cleaning' directory
 
@@ -186,12 +207,20 @@ def energydata_clean(dataset, only_cleandata=True, save_data='', save_log=False,
     
         # Updating the Error Log with respect to the hr/day/week data filling performed
         if fill_blocks:
-            hrday_count, week_count = 0, 0
+            hrday_count, week_count, prof_count, reg_count = 0, 0, 0, 0
             for v in fill_blocks.values():
                 hrday_count += v[1].count('hr_day_fill')
                 week_count += v[1].count('week_fill')
+                prof_count += v[1].count('prof_fill')
+                reg_count += v[1].count('reg_fill')
             cleanlog_df['Hr_Day Filling'] = hrday_count
             cleanlog_df['Week Filling'] = week_count
+            cleanlog_df['Profile Filling'] = prof_count
+            cleanlog_df['Regression Filling'] = reg_count
+
+        # Updating the Error Log with respect to the format corrections performed
+        if corr_blocks:
+            cleanlog_df['Format corrections'] = sum(len(v[0]) for v in corr_blocks.values())
     
         # Ask the user is any further cleaning was performed on the dataset for data provenance purposes
         sols_other = input("\nWere any other cleaning methods (external to this script) performed on this dataset? "
@@ -199,6 +228,15 @@ def energydata_clean(dataset, only_cleandata=True, save_data='', save_log=False,
                            "nothing to record:")
         cleanlog_df['Other (Solutions)'] = sols_other
 
+    # The cleaned data are aggregated to the half-hourly settlement periods (before the labels are dropped below) with
+    # the number of raw, filled and unfilled samples of each period. Please see the 'settlement_agg' function
+    if save_settlement and save_data:
+        settle_df = data_sols.settlement_agg(updated_binlabel_df, freq)
+        # The settlement periods are always written as a csv (as in the Data Cleaning app)
+        settle_path = save_data + os.path.splitext(f_name)[0] + "_settlement.csv"
+        print("The settlement periods will be saved to {}".format(settle_path))
+        settle_df.to_csv(settle_path)
+
     # If the 'only_cleandata' flag is set to 'True', only the cleaned columns, and any uncleaned columns, will be saved
     # Thus, if 'Column A', and 'Column B' were cleaned by the user, the original columns will be dropped from the df
     # but their cleaned version (and all remaining columns) will be kept.
@@ -0,0 +1,82 @@
+"""
+This python module contains a small server-side cache for the Dash tools. Large objects such as the cleaned dataframe
+or the plotting pyramids should not be serialised into the layout (JSON) every time a callback fires. Instead, they are
+kept on the server under a key and only the key is passed between callbacks through a dcc.Store.
+
+NB: The cache lives in the memory of a single process. If the app is served by multiple gunicorn workers, a callback
+    may land on a worker that does not hold the key and must handle a miss (e.g. by raising PreventUpdate).
+"""
+
+# Importing the relevant modules
+from collections import OrderedDict
+import hashlib
+import threading
+
+
+def dataset_key(*parts):
+    """
+    Simple function to create the key of a dataset from the uploaded contents and the user selections so that the same
+    upload with the same selections always maps onto the same cached objects.
+
+    :param parts: Any number of strings (or objects that can be converted to strings)
+
+    :return: str: md5 hex digest
+    """
+    md5 = hashlib.md5()
+    for part in parts:
+        md5.update(str(part).encode('utf-8'))
+        md5.update(b'\x00')
+
+    return md5.hexdigest()
+
+
+class SessionCache:
+    """
+    Bounded least-recently-used cache of dicts of server-side objects. Each key holds a dict so that the objects of a
+    dataset (dataframe, pyramids, block tables etc.) are added and dropped together.
+
+    :param max_items: The maximum number of datasets held before the least recently used one is dropped
+    """
+
+    def __init__(self, max_items=8):
+
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, key, **objs):
+        """
+        Adds (or updates) the objects held for a key.
+
+        :param key: The dataset key
+        :param objs: Named objects to store
+
+        :return: None
+        """
+        with self._lock:
+            item = self._items.pop(key, {})
+            item.update(objs)
+            self._items[key] = item
+
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def get(self, key, name=None):
+        """
+        Returns the objects held for a key (or the single named object) and marks the key as recently used.
+
+        :param key: The dataset key
+        :param name: Optional name of a single object to return
+
+        :return: dict of objects, the named object, or None on a cache miss
+        """
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            item = self._items[key]
+
+        if name is None:
+            return item
+
+        return item.get(name)
@@ -10,11 +10,34 @@ TODO: Add ignore fmt option
 
 # Importing the relevant modules
 from datetime import datetime, timedelta
+from scipy.interpolate import Akima1DInterpolator, CubicSpline
 from scipy import stats
 import pandas as pd
-import os, csv, sys
+import os, csv
 import numpy as np
 
+# The number of values either side of a gap that the local spline of the gap is fitted to and the longest gap
+# (number of missing values) that is filled with a spline
+SPLINE_CONTEXT = 4
+SPLINE_MAX_GAP = 6
+
+# The number of values either side of a gap used to shift a typical profile to the local level of the data
+PROFILE_EDGE = 4
+
+# The largest number of companion columns a column is regressed against, the minimum (absolute) correlation of a
+# companion and the number of rows of the data used at once when fitting the regressions
+REG_COMPANIONS = 3
+REG_MIN_CORR = 0.9
+REG_CHUNK_ROWS = 8192
+
+# The default formatting categories that are checked in string columns (see 'format_check')
+FMT_CATS = ['caps_fmt', 'space_fmt', 'char_fmt']
+
+# The settlement period of the market that the cleaned data are aggregated to and the Solution Labels that mark
+# a filled value (see 'settlement_agg')
+SETTLEMENT_PERIOD = '30min'
+FILL_LABELS = ['lin_intpol', 'spln_intpol', 'hr_day_fill', 'week_fill', 'prof_fill', 'reg_fill']
+
 
 def banner(header, size='large'):
     """
@@ -91,7 +114,7 @@ def error_log(f_name, cols, nan_blocks, out_blocks, fmt_blocks):
     clean_cols = ['File name', 'Date Cleaned', 'Columns Cleaned',
                   'Num of Single/Two Missing Values', 'Num of Multiple Missing Values', 'Num of Outliers',
                   'Num of Large Gaps', 'Num of Format Errors', 'Linear Interpolation', 'Spline Interpolation',
-                  'Hr_Day Filling', 'Week Filling', 'Format corrections']
+                  'Hr_Day Filling', 'Week Filling', 'Profile Filling', 'Regression Filling', 'Format corrections']
 
     cleanlog_df = pd.DataFrame(np.nan, index=[0], columns=clean_cols)
     cleanlog_df['File name'] = f_name
@@ -124,6 +147,327 @@ def error_log(f_name, cols, nan_blocks, out_blocks, fmt_blocks):
     return cleanlog_df
 
 
+def set_label_bit(df, rows, label_idx, col='Solutions'):
+    """
+    Simple function to set a bit of the binary labels (e.g. the 'Solutions' labels) of many rows at once. As strings
+    are immutable, the bit is replaced through slicing.
+
+    :param df: Dataframe with the labels
+    :param rows: Positions of the rows to update
+    :param label_idx: Position of the bit in the labels
+    :param col: Column of the labels
+
+    :return: df
+    """
+    rows = np.asarray(rows, dtype=int)
+    if rows.size:
+        labels = df[col].iloc[rows].str.slice_replace(label_idx, label_idx + 1, '1')
+        df.iloc[rows, df.columns.get_loc(col)] = labels.values
+
+    return df
+
+
+def label_bits(labels):
+    """
+    Simple function to read the binary labels (e.g. the 'Solutions' labels) of every row into an array of bits at once.
+    All of the labels have the same length, so the strings are joined and read as one buffer of '0' and '1' characters.
+
+    :param labels: pd.Series of the binary labels
+
+    :return: np.ndarray (rows x bits) of the label bits (0 or 1)
+    """
+    if len(labels) == 0:
+        return np.zeros((0, 0), dtype=np.uint8)
+
+    bits = np.frombuffer(''.join(labels.astype(str)).encode('ascii'), dtype=np.uint8) - ord('0')
+
+    return bits.reshape(len(labels), -1)
+
+
+def spline_fill(values, blocks, kind='akima', context=SPLINE_CONTEXT):
+    """
+    Fills gaps in a series of values with local splines, each fitted to the 'context' values either side of its gap.
+    Rather than one interpolation per gap, the gaps are grouped by their length so that the splines of a group share
+    the same positions and are fitted and evaluated in one call (a spline per column of the group). The cost is
+    linear in the number of gaps.
+
+    Gaps that do not have a full context (i.e. near the ends of the data or other missing values) are not filled.
+
+    :param values: np.ndarray of the values (NaN where missing)
+    :param blocks: The gaps to fill as single positions or [start, end] blocks (see 'err_nan_blocks')
+    :param kind: 'akima' (no overshoot of the context) or 'cubic'
+    :param context: Number of values either side of a gap to fit to
+
+    :return: np.ndarray of the filled values, np.ndarray (bool) of whether each block was filled
+    """
+    values = np.asarray(values, dtype=float)
+    filled = values.copy()
+    starts = np.array([block[0] if type(block) == list else block for block in blocks], dtype=int)
+    lengths = np.array([block[-1] - block[0] + 1 if type(block) == list else 1 for block in blocks], dtype=int)
+    done = np.zeros(len(blocks), dtype=bool)
+    spline = {'akima': Akima1DInterpolator, 'cubic': CubicSpline}[kind]
+
+    for length in np.unique(lengths):
+        group = np.flatnonzero((lengths == length) & (starts >= context) & (starts + length + context <= len(values)))
+        if group.size == 0:
+            continue
+
+        # Positions of the context (either side) and the gap relative to the start of each gap
+        ctx_pos = np.concatenate([np.arange(-context, 0), np.arange(length, length + context)])
+        gap_pos = np.arange(length)
+        ctx_vals = values[starts[group, None] + ctx_pos[None, :]]
+
+        # Only gaps with a full context are filled
+        full = ~np.isnan(ctx_vals).any(axis=1)
+        group, ctx_vals = group[full], ctx_vals[full]
+        if group.size == 0:
+            continue
+
+        filled[starts[group, None] + gap_pos[None, :]] = spline(ctx_pos, ctx_vals.T, axis=0)(gap_pos).T
+        done[group] = True
+
+    return filled, done
+
+
+def typical_profile(series, freq):
+    """
+    Builds the typical profile of a series, the median of each weekday and time of day, in one groupby pass.
+
+    :param series: pd.Series on a time index (NaN where missing)
+    :param freq: The time frequency of the data (see 'time_freq')
+
+    :return: np.ndarray of the profile (flat, weekday x time of day), np.ndarray of the profile cell of each value
+    """
+    slots = max(int(pd.Timedelta(days=1) / freq), 1)
+    index = pd.DatetimeIndex(series.index)
+    slot = np.minimum(np.asarray((index - index.normalize()) // freq, dtype=int), slots - 1)
+    cells = np.asarray(index.weekday, dtype=int) * slots + slot
+
+    profile = series.groupby(cells).median().reindex(np.arange(7 * slots)).values
+
+    return profile, cells
+
+
+def profile_fill(values, cells, profile, blocks, edge=PROFILE_EDGE, scale=True):
+    """
+    Fills gaps in a series of values from its typical profile (see 'typical_profile') by direct indexing of the
+    profile cells of each gap, so the cost of a gap is its size. If 'scale' is used, the profile is shifted to the
+    local level of the data, from the mean difference of the 'edge' values either side of the gap to the profile
+    (linear across the gap).
+
+    Gaps where a cell of the profile has no data are not filled.
+
+    :param values: np.ndarray of the values (NaN where missing)
+    :param cells: Profile cell of each value
+    :param profile: The typical profile
+    :param blocks: The gaps to fill as single positions or [start, end] blocks (see 'err_nan_blocks')
+    :param edge: Number of values either side of a gap used for the local level
+    :param scale: Whether to shift the profile to the local level
+
+    :return: np.ndarray of the filled values, np.ndarray (bool) of whether each block was filled
+    """
+    values = np.asarray(values, dtype=float)
+    filled = values.copy()
+    done = np.zeros(len(blocks), dtype=bool)
+
+    for b, block in enumerate(blocks):
+        start, end = (block[0], block[-1]) if type(block) == list else (block, block)
+        fill_vals = profile[cells[start:end + 1]]
+        if np.isnan(fill_vals).any():
+            continue
+
+        if scale:
+            # Difference of the data to the profile before and after the gap (either side if one is missing)
+            shifts = []
+            for side in (slice(max(start - edge, 0), start), slice(end + 1, end + 1 + edge)):
+                diff = values[side] - profile[cells[side]]
+                diff = diff[~np.isnan(diff)]
+                shifts.append(diff.mean() if diff.size else np.nan)
+            before, after = np.nan_to_num([shifts[0] if np.isfinite(shifts[0]) else shifts[1],
+                                           shifts[1] if np.isfinite(shifts[1]) else shifts[0]])
+            weight = np.arange(1, end - start + 2) / (end - start + 2)
+            fill_vals = fill_vals + before * (1 - weight) + after * weight
+
+        filled[start:end + 1] = fill_vals
+        done[b] = True
+
+    return filled, done
+
+
+def fit_companions(X, targets, n_companions=REG_COMPANIONS, min_corr=REG_MIN_CORR, chunk_rows=REG_CHUNK_ROWS):
+    """
+    Fits a linear model of each target column of a dataset against its most correlated companion columns (e.g. the
+    other phases, or the Min/Avg/Max of a channel), for every target at once:
+
+    The correlations of the targets with every column (over the rows where both are present) are matrix products
+    of the masks and masked values, the companions of each target are its 'n_companions' most correlated columns
+    (of at least 'min_corr') and the least squares normal equations of every target are summed over chunks of rows
+    and solved in one batch.
+
+    :param X: np.ndarray of the data (rows x columns, NaN where missing)
+    :param targets: Positions of the target columns
+    :param n_companions: The largest number of companions of a target
+    :param min_corr: The minimum absolute correlation of a companion
+    :param chunk_rows: The number of rows used at once
+
+    :return: companions (np.ndarray of int, targets x n_companions, -1 where unused), coefs (targets x
+    n_companions + 1, intercept first, NaN for targets without companions), column means that the model is
+    centred on
+    """
+    X = np.asarray(X, dtype=float)
+    targets = np.asarray(targets, dtype=int)
+    mask = ~np.isnan(X)
+    means = np.where(mask, X, 0.0).sum(axis=0) / np.maximum(mask.sum(axis=0), 1)
+    X0 = np.where(mask, X - means, 0.0)
+    Mf = mask.astype(float)
+
+    # Pearson correlation of each target with every column over the rows where both are present
+    Mt, Xt = Mf[:, targets], X0[:, targets]
+    n = Mt.T @ Mf
+    sx, sy = Xt.T @ Mf, Mt.T @ X0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = Xt.T @ X0 - sx * sy / n
+        var = ((Xt ** 2).T @ Mf - sx ** 2 / n) * (Mt.T @ X0 ** 2 - sy ** 2 / n)
+        corr = np.abs(cov / np.sqrt(var))
+    corr[np.arange(len(targets)), targets] = np.nan
+    corr = np.nan_to_num(corr, nan=-1.0)
+
+    # The most correlated companions of each target
+    k = min(n_companions, X.shape[1] - 1)
+    order = np.argsort(-corr, axis=1)[:, :k]
+    used = np.take_along_axis(corr, order, axis=1) >= min_corr
+    companions = np.where(used, order, -1)
+
+    # Normal equations of each target (intercept and companions), over the rows where the target and its companions
+    # are present
+    A = np.zeros((len(targets), k + 1, k + 1))
+    b = np.zeros((len(targets), k + 1))
+    count = np.zeros(len(targets))
+    for start in range(0, len(X), chunk_rows):
+        rows = slice(start, start + chunk_rows)
+        Z = _companion_terms(X0[rows], mask[rows], order, used)
+        y = np.where(mask[rows][:, targets], X0[rows][:, targets], np.nan)
+        valid = ~(np.isnan(y) | np.isnan(Z).any(axis=2))
+        Z, y = np.where(valid[..., None], Z, 0.0), np.where(valid, y, 0.0)
+        A += np.einsum('rtk,rtl->tkl', Z, Z)
+        b += np.einsum('rtk,rt->tk', Z, y)
+        count += valid.sum(axis=0)
+
+    # Unused companions get a zero coefficient
+    A[:, np.arange(1, k + 1), np.arange(1, k + 1)] += ~used
+    coefs = np.einsum('tkl,tl->tk', np.linalg.pinv(A), b)
+    coefs[~used.any(axis=1) | (count < k + 2)] = np.nan
+
+    return companions, coefs, means
+
+
+def _companion_terms(X0, mask, order, used):
+    """
+    Simple function for the regression terms (intercept and companions) of each target for some rows, NaN where a
+    used companion is missing
+    """
+    Z = np.where(mask[:, order], X0[:, order], np.nan)
+    Z = np.where(used[None, :, :], Z, 0.0)
+
+    return np.concatenate([np.ones(Z.shape[:2] + (1,)), Z], axis=2)
+
+
+def predict_companions(X, rows, targets, companions, coefs, means):
+    """
+    Predicts the target columns of some rows of a dataset from their companions (see 'fit_companions') in one
+    matrix multiply.
+
+    :param X: np.ndarray of the data (rows x columns, NaN where missing)
+    :param rows: Positions of the rows to predict
+    :param targets: Positions of the target columns
+    :param companions: Companions of each target (from 'fit_companions')
+    :param coefs: Coefficients of each target (from 'fit_companions')
+    :param means: Column means (from 'fit_companions')
+
+    :return: np.ndarray of the predictions (rows x targets), NaN where a companion is missing
+    """
+    X = np.asarray(X, dtype=float)[np.asarray(rows, dtype=int)]
+    used = companions >= 0
+    Z = _companion_terms(X - means, ~np.isnan(X), np.maximum(companions, 0), used)
+
+    return np.einsum('rtk,tk->rt', Z, coefs) + means[np.asarray(targets, dtype=int)]
+
+
+def index_blocks(idx):
+    """
+    Simple function to group sorted row positions into blocks of consecutive rows, in the format of the error blocks
+    (a single position or a [start, end] block, and the size of each).
+
+    :param idx: Sorted positions
+
+    :return: blocks, sizes
+    """
+    idx = np.asarray(idx, dtype=int)
+    if idx.size == 0:
+        return [], []
+
+    breaks = np.flatnonzero(np.diff(idx) != 1)
+    starts = idx[np.concatenate([[0], breaks + 1])]
+    ends = idx[np.concatenate([breaks, [idx.size - 1]])]
+    blocks = [int(start) if start == end else [int(start), int(end)] for start, end in zip(starts, ends)]
+
+    return blocks, [int(size) for size in ends - starts + 1]
+
+
+def format_check(series, fmt_cats=FMT_CATS):
+    """
+    Checks the formatting of a string column and corrects it. The column is factorised once and the formatting rules
+    are only evaluated on its unique values, with the flags and corrections of each row taken through its code, so
+    the cost scales with the number of unique values rather than rows. Values that are not strings are not checked.
+
+    The formatting categories are:
+
+    'caps_fmt': Values that differ from the most common case of the column (weighted by the rows of each value).
+                Values without letters are ignored. If the most common case is mixed, values are corrected to upper
+    'space_fmt': Values with unnecessary spacing (leading, trailing or repeated), which is removed
+    'char_fmt': Values with non-printable characters (e.g. tabs or zero-width spaces), which are removed
+
+    :param series: pd.Series of the column
+    :param fmt_cats: List of the formatting categories to check
+
+    :return: np.ndarray (bool) of the rows with a formatting error, pd.Series of the corrected column
+    """
+    codes, uniques = pd.factorize(series)
+    values = pd.Series(uniques, dtype=object)
+    is_str = values.map(lambda v: isinstance(v, str)).values
+    text = values.where(is_str, '').astype(str)
+    corrected = text.copy()
+
+    if 'char_fmt' in fmt_cats:
+        # Zero-width characters are always removed, whereas tabs, newlines and NBSPs separate words and are kept as a
+        # space if the spacing is also being corrected
+        corrected = corrected.str.replace(r'[\u200b-\u200d\ufeff]', '', regex=True)
+        corrected = corrected.str.replace(r'[^\S ]', ' ' if 'space_fmt' in fmt_cats else '', regex=True)
+
+    if 'space_fmt' in fmt_cats:
+        corrected = corrected.str.strip().str.replace(r' {2,}', ' ', regex=True)
+
+    if 'caps_fmt' in fmt_cats:
+        lower, upper = corrected.str.islower().values, corrected.str.isupper().values
+        cased = (corrected.str.lower() != corrected.str.upper()).values & is_str
+        rows = np.bincount(codes[codes >= 0], minlength=len(values))
+        cases = [rows[lower & cased].sum(), rows[upper & cased].sum(), rows[~lower & ~upper & cased].sum()]
+        if cases.index(max(cases)) == 0:
+            corrected = corrected.where(~cased, corrected.str.lower())
+        else:
+            corrected = corrected.where(~cased, corrected.str.upper())
+
+    # Only the values that change are formatting errors
+    errors = is_str & (corrected != text).values
+    corrected = values.where(~errors, corrected)
+
+    row_errors = np.where(codes >= 0, errors[np.maximum(codes, 0)], False)
+    row_values = pd.Series(np.where(codes >= 0, corrected.values[np.maximum(codes, 0)], series.values),
+                           index=series.index, name=series.name)
+
+    return row_errors, row_values
+
+
 class Formatting:
     """
     This class contains/will contain a few functions for preparing a dataset for Errors and Solutions application.
@@ -138,7 +482,7 @@ class Formatting:
 
     def __init__(self,
                  err_labels=5,
-                 sol_labels=5,
+                 sol_labels=7,
                  db_path='/Users/mashtine/PycharmProjects/ProjectLEO_Data/Downloads/Submitted Data',
                  log_path='/Users/mashtine/PycharmProjects/ProjectLEO_Data/Cleaning',
                  log_file='Project LEO Data Cleaning Log.csv'):
@@ -173,6 +517,8 @@ class Formatting:
         Hour-Day-Filling (hr_day_fill)
         Week-Filling (week_fill)
         Format correction (fmt_correct)
+        Profile-Filling (prof_fill)
+        Regression-Filling (reg_fill)
 
 
         It is best to use subsets of large dataframes (with many parameters) for cleaning. Only input dataframes with
@@ -481,13 +827,16 @@ class Errors:
         This function will comb through a dataframe to find regions of formatting errors in the data depending on the
         categories set by the user. This function will ignore columns that are numeric in type
 
-        The available formatting categories are:
+        The available formatting categories are (see 'format_check'):
 
         'caps_fmt': Looks for regions where the data differs from the most common case used in the column
         'space_fmt': Looks for regions where the data contains unnecessary spacing
+        'char_fmt': Looks for regions where the data contains non-printable characters
         TODO: Need to think of others. Probably one related to time though this will be difficult to automate
                 and perhaps not necessary
 
+        Each column is factorised once and the categories are checked on its unique values only.
+
         :param df: The formatted dataframe that contains the 'Errors' and 'Solutions' labels
         :param cols: Columns to be checked
 
@@ -495,128 +844,22 @@ class Errors:
         """
         # Use the standard formatting error checks.
         if self.fmt_cats is None:
-            fmt_cats = ['caps_fmt', 'space_fmt']
+            fmt_cats = FMT_CATS
         else:
             fmt_cats = self.fmt_cats
 
-        # Determine the indicies of nan locations for each of the columns of interest
+        # Determine the indicies of formatting errors for each of the columns of interest
         fmt_blocks = {}
 
-        # Only performs this on columns containing numeric data (or data matching a 'np.number' type)
-        num_cols = [c for c in cols if np.issubdtype(df[c].dtype, np.number)]
-        non_num = [nn for nn in cols if nn not in num_cols]
+        # Only performs this on columns that are not numeric in type
+        non_num = [c for c in cols if not pd.api.types.is_numeric_dtype(df[c])]
 
         for col in non_num:
-            blocks = []
-            sizes = []
-
-            if 'caps_fmt' in fmt_cats:
-                # This section will pull out a subset of the data to determine the common case of the data
-                # Ensures that the dataset is at least twice the size of the random data subset pulled
-                samp = 100
-                cases_idx = ['lower', 'upper', 'mixed']
-
-                if len(df[col]) > 2 * samp:
-                    samp_data = df[col].sample(n=samp).dropna()
-                else:
-                    samp_data = df[col].sample(n=(len(df[col]) / 2)).dropna()
-
-                # Determines the most common case through examining 'False' cases
-                tot = len(samp_data)  # Without any Nan values
-                cases = []
-
-                # Create a list of case counts ['lower', 'upper', 'mixed']
-                cases.append(len(samp_data[samp_data.str.islower()]))
-                cases.append(len(samp_data[samp_data.str.isupper()]))
-                cases.append(tot - sum(cases))
-
-                max_idx = cases.index(max(cases))
-
-                # Pull out the indices of times where the common case is not met from the full dataset col
-                # There is no way to automatically correct the strings to values of mixed case, so if 'mixed' is the
-                # main cat, these will be converted to upper during the 'Solutions' phase
-                if max_idx == 0:
-                    case_errs = df[col].str.islower().dropna()
-                    fmt_idx = np.where(case_errs == False)[0]
-                else:
-                    case_errs = df[col].str.isupper().dropna()
-                    fmt_idx = np.where(case_errs == False)[0]
-
-            if 'space_fmt' in fmt_cats:
-                # This section will find values that have spacing in them. 'str.find(' ')' denotes '-1' as regions having no
-                # spaces.
-                spc_errs = np.where(df[col].dropna().str.find(' ') != -1)[0]
-                fmt_idx = np.append(fmt_idx, spc_errs)
-                np.sort(fmt_idx)
-
-            else:
-                fmt_idx = []
-                sys.exit()
-
-            # Only perform if formatting errors exist
-            if fmt_idx.size == 0:
-                # Skip the rest of the loop and go to the next column
-                continue
-
-            # This loop will pull out consecutive blocks of nans found in the dataframe cols
-            for f, fmt in enumerate(fmt_idx):
-                # Ignore 'i-1' idx. The code will restart the code over if this
-                # condition is true
-                if f == 0:
-                    start = fmt_idx[0]
-                    continue
-
-                # This condition below checks if the current idx is equal to the one before and
-                # if the iteration is not at the end. If true, then it restarts the loop as it means that the
-                # nan value is part of a larger block
-                if (fmt == fmt_idx[f - 1] + 1) and (f != (len(fmt_idx) - 1)):
-                    continue
-
-                # Determines if the loop is at the end. If the following is true for both,
-                # that mean that the previous nan was not part of a block and the last value is a singular nan as well
-                elif f == (len(fmt_idx) - 1) and fmt - fmt_idx[f - 1] != 1:  # last point
-                    size = 1
-
-                    # Append to main blocks
-                    blocks.append(fmt_idx[f - 1])
-                    blocks.append(fmt)
-                    sizes.append(size)
-                    sizes.append(size)
-                    continue
-
-                # Block has ended (which is one that ends at the end of the 'nans' list and thus 'end' should be the last
-                # nan value
-                elif f == (len(fmt_idx) - 1) and fmt - fmt_idx[f - 1] == 1:
-                    end = fmt
-
-                # Otherwise treat the end as the value before
-                else:
-                    end = fmt_idx[f - 1]
-
-                # If true, treat as a single nan, not a block
-                if end == start:
-                    block = start
-                    size = 1
-
-                else:
-                    # Assign the boundaries of the block of nans
-                    block = [start, end]
-                    size = end - start + 1
+            fmt_idx = np.flatnonzero(format_check(df[col], fmt_cats)[0])
 
-                # Append to main lists
-                blocks.append(block)
-                sizes.append(size)
-
-                # Restarts to the new block
-                start = fmt
-
-            # Add the blocks and sizes information into a dict for each of the cols
-            # The following line will capture any instances where there is only one outlier
-            if fmt_idx.size == 1:
-                blocks.append(fmt_idx[0])
-                sizes.append(1)
-
-            fmt_blocks[col] = [blocks, sizes]
+            # Only add if formatting errors exist, as blocks of consecutive rows
+            if fmt_idx.size:
+                fmt_blocks[col] = list(index_blocks(fmt_idx))
 
         return fmt_blocks
 
@@ -787,7 +1030,7 @@ class Errors:
         # First determine where the nan/missing values are located within the cols of interest
         # There is an optional argument 'fmt_cats' but this functionality will be expanded on in later version
         # to accommodate more formatting checks if needed
-        fmt_blocks = Errors().err_fmt_blocks(df, cols)
+        fmt_blocks = self.err_fmt_blocks(df, cols)
 
         # Use the 'pos' variable to declare the position of a format error in the '00000' Error Bit Label
         # This is a bit of hardcoding and the script will fail if this naming structure is not used
@@ -796,41 +1039,14 @@ class Errors:
 
         # The output of the 'err_fmt_blocks' function will be used to update the Error Labels in the dataframe
         # based on the col where the formatting error lies.
-        for i, key in enumerate(fmt_blocks.keys()):
-            fmt_idx = fmt_blocks[key][0]
-            size_idx = fmt_blocks[key][1]
-
-            for s, sze in enumerate(size_idx):
-                # This will then change the appropriate Error Label in the 'Errors' col
-                if sze == 1:
-                    # Find the bit to update in the label based on the number of Error labels,
-                    # the column number from the df that is being searched (i), and the position of
-                    # of the error label in the order of bits
-                    label_idx = (i * len(self.err_labels)) + fmt_pos
-
-                    idx = fmt_idx[s]
-                    label = df["Errors"].iloc[idx]
-
-                    # As strings are immutable, this works to replace the respective bit with a '1' through
-                    # slicing
-                    new_label = label[:label_idx] + '1' + label[label_idx + 1:]
-                    df.loc[idx, "Errors"] = new_label
-                    fmt_tot += 1
-
-                else:
-                    label_idx = (i * len(self.err_labels)) + fmt_pos
-                    start, end = fmt_idx[s][0], fmt_idx[s][1]
-                    labels = df["Errors"].iloc[start:end + 1]
-
-                    # It is important to change each label individually as to not erode any previous
-                    # bit information from other errors
-                    for l, lbl in enumerate(labels):
-                        new_label = lbl[:label_idx] + '1' + lbl[label_idx + 1:]
-                        labels.iloc[l] = new_label
-
-                    # Put the new labels back into the dataframe
-                    df["Errors"].iloc[start:end + 1] = labels
-                    fmt_tot += 1
+        for key, (fmt_idx, size_idx) in fmt_blocks.items():
+            # Find the bit to update in the label based on the number of Error labels, the position of the column
+            # that is being searched, and the position of the error label in the order of bits
+            label_idx = (cols.index(key) * len(self.err_labels)) + fmt_pos
+            rows = np.concatenate([np.arange(block[0], block[-1] + 1) if type(block) == list else [block]
+                                   for block in fmt_idx])
+            df = set_label_bit(df, rows, label_idx, col='Errors')
+            fmt_tot += len(size_idx)
 
         return df, fmt_blocks, fmt_tot
 
@@ -874,8 +1090,6 @@ class Solutions:
     This class contains many different functions for dealing with errors which were detected within a parsed dataset.
     Please review the description of the individual functions for more details.
 
-    Todo: Add functionality for cleaning of formatting errors
-
     :param updated_df: The dataframe that has been checked for errors
     :param cols: Columns which have been scanned for errors
     :param nan_blocks: Results of the Nan/Missing value error check
@@ -890,7 +1104,8 @@ class Solutions:
                  log_path='/Users/mashtine/PycharmProjects/ProjectLEO_Data/Cleaning',
                  log_file='Project LEO Data Cleaning Log.csv'):
         # Use the default labels
-        sols_labels = ['lin_intpol', 'spln_intpol', 'hr_day_fill', 'week_fill', 'fmt_correct']
+        sols_labels = ['lin_intpol', 'spln_intpol', 'hr_day_fill', 'week_fill', 'fmt_correct', 'prof_fill',
+                       'reg_fill']
 
         self.updated_df = updated_df
         self.cols = cols
@@ -930,14 +1145,281 @@ class Solutions:
 
         return df, freq
 
-    def spln_interp(self):
+    def lin_interp(self, df, col, block):
+        """
+        Simple function that fills a single missing value with linear interpolation of the data just before and after
+        it (ie, 3 values) and sets the 'lin_intpol' Solutions label.
+
+        :param: df: Takes the dataframe that has time as an index as input. Use the 'time_freq' function if needed
+        :param: col: The column being cleaned
+        :param: block: The position of the missing value
+
+        :return: df: Dataset with the cleaned value and updated solution label
+        """
+        clean_col_name = col + '_cl'
+        df[clean_col_name].iloc[block-1: block+2] = df[col].iloc[block-1: block+2].interpolate(method='linear')
+
+        # Update the Solutions label
+        label_idx = (self.label_ord[col] * len(self.sols_labels)) + self.sols_labels.index('lin_intpol')
+        label = df["Solutions"].iloc[block]
+        df["Solutions"].iloc[block] = label[:label_idx] + '1' + label[label_idx + 1:]
+
+        return df
+
+    def spln_interp(self, df, out_nan_blocks, kind='akima', context=SPLINE_CONTEXT, max_gap=SPLINE_MAX_GAP):
+        """
+        This function will fill shorter gaps in datasets exhibiting non-linear relationships with interpolated data of
+        a higher order. Every gap of a column of up to 'max_gap' missing values is filled in one batched pass with a
+        local spline fitted to the 'context' values either side of the gap (see 'spline_fill'). Gaps without a full
+        context are left unfilled.
+
+        The cleaned data are added to the cleaned ('_cl') columns and the 'spln_intpol' Solutions label is set.
+
+        :param: df: Takes the dataframe that has time as an index as input. Use the 'time_freq' function if needed
+        :param: out_nan_blocks: The combined 'nan_blocks' and 'out_blocks' listing the areas of missing data to fill
+        :param: kind: The spline used, 'akima' (default) or 'cubic'
+        :param: context: The number of values either side of a gap used to fit its spline
+        :param: max_gap: The largest gap (number of missing values) to fill
+
+        :return: df: Dataset with the cleaned data and appropriately recorded solution labels
+        :return: spln_blocks: Dict of the blocks of each column with either 'spln_intpol' or 'unfilled'
+        """
+        spln_blocks = {}
+        fill_pos = self.sols_labels.index('spln_intpol')
+
+        for col, (blocks, _) in out_nan_blocks.items():
+            clean_col_name = col + '_cl'
+
+            # Only the gaps that are short enough are interpolated. The splines are fitted to the cleaned data so that
+            # removed outliers are not used
+            blocks = [block for block in blocks
+                      if (block[-1] - block[0] + 1 if type(block) == list else 1) <= max_gap]
+            filled, done = spline_fill(df[clean_col_name].values, blocks, kind, context)
+
+            rows = np.concatenate([np.arange(block[0], block[-1] + 1) if type(block) == list else [block]
+                                   for block, ok in zip(blocks, done) if ok] or [[]]).astype(int)
+            df.iloc[rows, df.columns.get_loc(clean_col_name)] = filled[rows]
+
+            # Update the specific label for the column being cleaned
+            label_idx = (self.label_ord[col] * len(self.sols_labels)) + fill_pos
+            df = set_label_bit(df, rows, label_idx)
+
+            spln_blocks[col] = [blocks, ['spln_intpol' if ok else 'unfilled' for ok in done]]
+
+        return df, spln_blocks
+
+    def prof_fill(self, df, out_nan_blocks, freq, scale=True, edge=PROFILE_EDGE):
+        """
+        This function will fill large gaps in datasets from the typical profile of each column, the median of the
+        cleaned data for each weekday and time of day (see 'typical_profile'). The profile of a column is built once
+        and the gaps are filled by direct indexing into it, optionally shifted to the local level of the data at the
+        edges of each gap (see 'profile_fill').
+
+        The cleaned data are added to the cleaned ('_cl') columns and the 'prof_fill' Solutions label is set.
+
+        :param: df: Takes the dataframe that has time as an index as input. Use the 'time_freq' function if needed
+        :param: out_nan_blocks: The combined 'nan_blocks' and 'out_blocks' listing the areas of missing data to fill
+        :param: freq: Uses the input of the time frequency
+        :param: scale: Whether to shift the profile to the local level at the edges of each gap
+        :param: edge: The number of values either side of a gap used for the local level
+
+        :return: df: Dataset with the cleaned data and appropriately recorded solution labels
+        :return: prof_blocks: Dict of the blocks of each column with either 'prof_fill' or 'unfilled'
         """
-        This function will fill longer/more complex gaps in datasets exhibiting non-linear relationships
-        with interpolated data of a higher order.
+        prof_blocks = {}
+        fill_pos = self.sols_labels.index('prof_fill')
+
+        for col, (blocks, _) in out_nan_blocks.items():
+            clean_col_name = col + '_cl'
+
+            # The profile is built from the cleaned data so that removed outliers are not used
+            profile, cells = typical_profile(df[clean_col_name], freq)
+            filled, done = profile_fill(df[clean_col_name].values, cells, profile, blocks, edge, scale)
+
+            rows = np.concatenate([np.arange(block[0], block[-1] + 1) if type(block) == list else [block]
+                                   for block, ok in zip(blocks, done) if ok] or [[]]).astype(int)
+            df.iloc[rows, df.columns.get_loc(clean_col_name)] = filled[rows]
+
+            # Update the specific label for the column being cleaned
+            label_idx = (self.label_ord[col] * len(self.sols_labels)) + fill_pos
+            df = set_label_bit(df, rows, label_idx)
+
+            prof_blocks[col] = [blocks, ['prof_fill' if ok else 'unfilled' for ok in done]]
+
+        return df, prof_blocks
+
+    def reg_fill(self, df, out_nan_blocks, n_companions=REG_COMPANIONS, min_corr=REG_MIN_CORR):
+        """
+        This function will fill gaps in a column from the other columns of the dataset that it is strongly correlated
+        with (e.g. the L1/L2/L3 phases or the Min/Avg/Max of a channel of MVSA files), which are usually present when
+        the column is missing. A linear model of each column against its most correlated companions is fitted over
+        the clean rows and the gaps of every column are predicted in one batch (see 'fit_companions' and
+        'predict_companions'). Gaps where a companion is also missing are left unfilled.
+
+        The companions are any numeric columns of the dataset, using the cleaned ('_cl') version of a cleaned column.
+        The cleaned data are added to the cleaned columns and the 'reg_fill' Solutions label is set.
+
+        :param: df: Takes the dataframe that has time as an index as input. Use the 'time_freq' function if needed
+        :param: out_nan_blocks: The combined 'nan_blocks' and 'out_blocks' listing the areas of missing data to fill
+        :param: n_companions: The largest number of companions of a column
+        :param: min_corr: The minimum absolute correlation of a companion
 
         :return: df: Dataset with the cleaned data and appropriately recorded solution labels
+        :return: reg_blocks: Dict of the blocks of each column with either 'reg_fill' or 'unfilled'
+        """
+        reg_blocks = {}
+        fill_pos = self.sols_labels.index('reg_fill')
+
+        # Candidate companions, where the raw version of a cleaned column is not used
+        cols = list(out_nan_blocks.keys())
+        candidates = [c for c in df.select_dtypes('number').columns if c not in self.cols]
+        targets = [candidates.index(col + '_cl') for col in cols]
+        X = df[candidates].values.astype(float)
+
+        companions, coefs, means = fit_companions(X, targets, n_companions, min_corr)
+
+        # Rows of every gap, predicted for every column at once
+        block_rows = {col: [np.arange(block[0], block[-1] + 1) if type(block) == list else np.array([block])
+                            for block in out_nan_blocks[col][0]] for col in cols}
+        rows = np.unique(np.concatenate([r for col in cols for r in block_rows[col]] or [[]])).astype(int)
+        preds = predict_companions(X, rows, targets, companions, coefs, means)
+
+        for t, col in enumerate(cols):
+            clean_col_name = col + '_cl'
+            filled_rows, lbls = [], []
+            for block_row in block_rows[col]:
+                fill_vals = preds[np.searchsorted(rows, block_row), t]
+                if np.isnan(fill_vals).any():
+                    lbls.append('unfilled')
+                    continue
+                X[block_row, targets[t]] = fill_vals
+                filled_rows.append(block_row)
+                lbls.append('reg_fill')
+
+            filled_rows = np.concatenate(filled_rows or [[]]).astype(int)
+            df.iloc[filled_rows, df.columns.get_loc(clean_col_name)] = X[filled_rows, targets[t]]
+
+            # Update the specific label for the column being cleaned
+            label_idx = (self.label_ord[col] * len(self.sols_labels)) + fill_pos
+            df = set_label_bit(df, filled_rows, label_idx)
+
+            reg_blocks[col] = [out_nan_blocks[col][0], lbls]
+
+        return df, reg_blocks
+
+    def fmt_correct(self, df, fmt_cats=FMT_CATS):
+        """
+        This function will correct the formatting errors that were detected in previous stages (see 'err_fmt_blocks'),
+        e.g. values that differ from the common case of a column or have unnecessary spacing. Each column is
+        factorised once and the corrections of its unique values are taken to each row (see 'format_check').
+
+        The corrected data are added to the cleaned ('_cl') columns and the 'fmt_correct' Solutions label is set.
+
+        :param: df: The dataframe that has been checked for errors
+        :param: fmt_cats: The formatting categories that were checked
+
+        :return: df: Dataset with the corrected data and appropriately recorded solution labels
+        :return: corr_blocks: Dict of the corrected blocks of each column
         """
-        test = 'test'
+        corr_blocks = {}
+        fix_pos = self.sols_labels.index('fmt_correct')
+
+        for col, (blocks, _) in self.fmt_blocks.items():
+            clean_col_name = col + '_cl'
+            rows = np.concatenate([np.arange(block[0], block[-1] + 1) if type(block) == list else [block]
+                                   for block in blocks] or [[]]).astype(int)
+
+            corrected = format_check(df[col], fmt_cats)[1]
+            df.iloc[rows, df.columns.get_loc(clean_col_name)] = corrected.values[rows]
+
+            # Update the specific label for the column being cleaned
+            label_idx = (self.label_ord[col] * len(self.sols_labels)) + fix_pos
+            df = set_label_bit(df, rows, label_idx)
+
+            corr_blocks[col] = [blocks, ['fmt_correct'] * len(blocks)]
+
+        return df, corr_blocks
+
+    def settlement_agg(self, df, freq, period=SETTLEMENT_PERIOD, cols=None):
+        """
+        This function aggregates the cleaned power data to the settlement periods of the market (half-hourly by
+        default) in one resample of the data, so that the much smaller settlement-ready data can be used without
+        re-processing the full resolution data. The quality of each period is given by the number of raw, filled
+        (any of the FILL_LABELS set in the 'Solutions' labels) and unfilled samples, where the unfilled samples are
+        those that are missing from the cleaned data (including any missing timestamps) of the samples expected at the
+        frequency of the data.
+
+        The energy of a period is the mean of the cleaned power of the period over its raw and filled samples,
+        multiplied by the length of the period (in hours), i.e. it is weighted up to the whole period where samples
+        remain unfilled. The 'Completeness' of the period (the fraction of the expected samples that are raw or filled)
+        should be used to judge the energy of a period. NB: The energy is in the units of the power multiplied by hours
+        (e.g. kW to kWh).
+
+        :param: df: The cleaned dataframe (with time as the index)
+        :param: freq: The frequency of the data (see 'time_freq')
+        :param: period: The settlement period
+        :param: cols: The columns to aggregate [default: None, the cleaned columns]
+
+        :return: df: Dataset with the energy and the quality columns of each column for every settlement period
+        """
+        cols = self.cols if cols is None else cols
+        period = pd.to_timedelta(period)
+        expected = max(period // freq, 1) if freq and freq > pd.Timedelta(0) else np.nan
+
+        # The fill bits of every column are read from the 'Solutions' labels at once
+        bits = label_bits(df['Solutions'])
+        fill_pos = [self.sols_labels.index(lbl) for lbl in FILL_LABELS]
+
+        parts = {}
+        for col in cols:
+            values = pd.to_numeric(df[col + '_cl'], errors='coerce').values
+            present = ~np.isnan(values)
+            label_pos = self.label_ord[col] * len(self.sols_labels)
+            filled = present & bits[:, [label_pos + pos for pos in fill_pos]].any(axis=1)
+
+            parts[(col, 'sum')] = np.where(present, values, 0)
+            parts[(col, 'present')] = present.astype(int)
+            parts[(col, 'filled')] = filled.astype(int)
+
+        sums = pd.DataFrame(parts, index=df.index).resample(period).sum()
+
+        settle_df = pd.DataFrame(index=sums.index)
+        settle_df.index.name = 'Settlement Period'
+        hours = period / pd.Timedelta(hours=1)
+        for col in cols:
+            present, filled = sums[(col, 'present')], sums[(col, 'filled')]
+            settle_df[col + ' Energy'] = sums[(col, 'sum')] / present.where(present > 0) * hours
+            settle_df[col + ' Raw'] = present - filled
+            settle_df[col + ' Filled'] = filled
+            settle_df[col + ' Unfilled'] = (expected - present).clip(lower=0)
+            settle_df[col + ' Completeness'] = (present / expected).clip(upper=1)
+
+        return settle_df
+
+    def unfilled_blocks(self, *records):
+        """
+        Simple function to collect the blocks of each column that are 'unfilled' in the records of the filling
+        functions (e.g. the 'fill_blocks' and 'interp_blocks' of 'power_fill')
+        """
+        unfilled = {}
+        for record in records:
+            for col, (blocks, lbls) in record.items():
+                unfilled.setdefault(col, [[], None])[0].extend(
+                    [block for block, lbl in zip(blocks, lbls) if lbl == 'unfilled'])
+
+        return {col: blocks for col, blocks in unfilled.items() if blocks[0]}
+
+    def update_records(self, filled, *records):
+        """
+        Simple function to update the 'unfilled' blocks of the records of the filling functions with the labels of a
+        later filling function
+        """
+        for col, (blocks, lbls) in filled.items():
+            new_lbls = {tuple(block) if type(block) == list else block: lbl for block, lbl in zip(blocks, lbls)}
+            for record in records:
+                if col in record:
+                    record[col][1] = [new_lbls.get(tuple(block) if type(block) == list else block, lbl)
+                                      if lbl == 'unfilled' else lbl for block, lbl in zip(*record[col])]
 
     def rvm_outliers(self, df):
         """
@@ -982,7 +1464,7 @@ class Solutions:
 
         return df, out_nan_blocks
 
-    def power_fill(self, df, out_nan_blocks, freq, offset=1, interp='linear'):
+    def power_fill(self, df, out_nan_blocks, freq, offset=1, interp='linear', regression=False, profile=False):
         """
         This function will be used to fill data gaps in datasets. NB: Minimum resolution of hourly data.
         Single missing data points are filled with interpolation, 'linear' being the default method.
@@ -1005,16 +1487,19 @@ class Solutions:
         :param: out_nan_blocks: The combined 'nan_blocks' and 'out_blocks' listing all areas of missing data
         :param: freq: Uses the input of the time frequency
         :param: offset: The number of hours ahead or after to use for averaging
-        :param: interp: The default interpolation method. If 'spline' used, the user will be asked for the order to use
+        :param: interp: The default interpolation method, 'linear' or a spline ('spline'/'akima' or 'cubic'). If a
+        spline is used, the single missing values and any short gaps that could not be filled from the wrapping
+        periods are interpolated in one batch per column (see 'spln_interp')
+        :param: regression: Whether to fill the gaps that remain unfilled from the correlated columns of the dataset
+        (see 'reg_fill')
+        :param: profile: Whether to fill the gaps that remain unfilled (after any regression) from the typical
+        weekday and time of day profile of the data, shifted to the local level (see 'prof_fill')
 
         :return: df: Dataframe with the clean data if appropriate
         """
 
-        # Set parameters if spline interpolation used (only other option)
-        #TODO: Needs to be updated for the web-app tool for user input
-        # if interp == 'spline':
-        #     order = input("You have selected to run a spline interpolation method for the filling of single "
-        #                   "missing values.\nPlease enter the order number to run these interpolations (eg: 3):")
+        # Spline interpolation used (only other option), where 'spline' is the Akima spline
+        spln_kind = {'spline': 'akima'}.get(interp, interp)
 
         # Pulls the data columns from where errors existed
         data_cols = list(out_nan_blocks.keys())
@@ -1028,6 +1513,7 @@ class Solutions:
             clean_col_name = col + '_cl'
             int_blocks, int_lbls = [], []
             f_blocks, f_lbls = [], []
+            spln_pending = []
 
             for block in out_nan_blocks[col][0]:
                 # First part deals with multiple missing values (blocks with start and end values, ie, not int values)
@@ -1141,7 +1627,8 @@ class Solutions:
                         # Record the lack of solution for reporting to the user after the func runs
                         f_blocks.append(block)
                         f_lbls.append("unfilled")
-                        pass
+                        if interp != 'linear':
+                            spln_pending.append(block)
 
                 # This part will deal with single missing values. As single missing values do not need to maintain
                 # historical patterns in the data (for instance, 5 hrs of missing data can not be simply filled with
@@ -1157,34 +1644,50 @@ class Solutions:
                         int_lbls.append("unfilled")
                         pass
 
+                    # The splines of the single values are fitted together after the loop
+                    elif interp != 'linear':
+                        spln_pending.append(block)
+
                     else:
                         # Fill based on the interpolation chosen by the user
-                        # if interp == 'linear':
-                        df[clean_col_name].iloc[block-1: block+2] = df[col].iloc[block-1: block+2]\
-                            .interpolate(method=interp)
-                        sols_lbl = 'lin_intpol'
+                        df = self.lin_interp(df, col, block)
                         int_blocks.append(block)
                         int_lbls.append("lin_intpol")
 
-                        # else:
-                        #     df[clean_col_name].iloc[block - 1: block + 2] = df[col].iloc[block - 1: block + 2]\
-                        #         .interpolate(method=interp, order=order)
-                        #     sols_lbl = 'spln_intpol'
-                        #     int_blocks.append(block)
-                        #     int_lbls.append("spln_intpol")
-
-                        # Update the Solutions label
-                        col_pos = self.label_ord[col]
-                        fill_pos = self.sols_labels.index(sols_lbl)
-                        label_idx = (col_pos * len(self.sols_labels)) + fill_pos
-                        label = df["Solutions"].iloc[block]
-                        new_label = label[:label_idx] + '1' + label[label_idx + 1:]
-                        df["Solutions"].iloc[block] = new_label
+            # Position of each gap in the records, for updating the records of the gaps filled below
+            f_pos = {tuple(block): b for b, block in enumerate(f_blocks)}
+
+            # Spline interpolation of the single values and the unfilled gaps in one batch. Single values without a
+            # full context for their spline (e.g. near another gap) are filled by linear interpolation instead, so that
+            # a spline never fills fewer values than the linear interpolation
+            if spln_pending:
+                df, spln_blocks = self.spln_interp(df, {col: [spln_pending, None]}, kind=spln_kind)
+                for block, lbl in zip(*spln_blocks[col]):
+                    if type(block) == list:
+                        f_lbls[f_pos[tuple(block)]] = lbl
+                    else:
+                        if lbl == 'unfilled':
+                            df = self.lin_interp(df, col, block)
+                            lbl = 'lin_intpol'
+                        int_blocks.append(block)
+                        int_lbls.append(lbl)
 
             # Add the relevant recordings for the column being cleaned
             fill_blocks[col] = [f_blocks, f_lbls]
             interp_blocks[col] = [int_blocks, int_lbls]
 
+        # Regression filling of the remaining unfilled gaps of every column in one batch
+        unfilled = self.unfilled_blocks(fill_blocks, interp_blocks)
+        if regression and unfilled:
+            df, reg_blocks = self.reg_fill(df, unfilled)
+            self.update_records(reg_blocks, fill_blocks, interp_blocks)
+
+        # Profile filling of the gaps that remain unfilled
+        unfilled = self.unfilled_blocks(fill_blocks, interp_blocks)
+        if profile and unfilled:
+            df, prof_blocks = self.prof_fill(df, unfilled, freq)
+            self.update_records(prof_blocks, fill_blocks, interp_blocks)
+
         # # banner("Gaps More Than 1 Missing Values", size='small')
         # for k in fill_blocks.keys():
         #     print("{}: {} ({})".format(k, fill_blocks[k][0], fill_blocks[k][1]))
@@ -0,0 +1,404 @@
+"""
+This python module contains the ingestion of the csv/txt files of the Dash tools. A file is memory mapped (or the
+uploaded contents decoded) once and the same buffer is used to detect the format of the file and to parse it, so the
+data are never read twice:
+
+encoding: from the byte order mark, otherwise the first of ENCODINGS that decodes the start of the file
+delimiter: the one of DELIMITERS (e.g. the tab of the MVSA exports) that splits the most lines into the same number of
+           fields (the widest split where there is a tie, so that a decimal comma is not taken as the delimiter)
+header row: the first row with as many fields as the data (any preamble above it is skipped), which is a header if it is
+            not numeric where the data are
+decimal: ',' where the delimiter is not a comma and the numbers of the file are written with a decimal comma
+
+If pyarrow is installed, the buffer is parsed with its multithreaded csv reader, otherwise with the pandas (C) parser.
+
+Many files of the same meter (e.g. daily or monthly MVSA exports) can be streamed in chunks and merged by their
+timestamps into one continuous series (see 'merge_chunks'), where only a chunk of each file is held at a time and the
+overlapping duplicate timestamps are dropped (or flagged).
+
+NB: Only the start of the file (SNIFF_BYTES) is used to detect the format.
+"""
+
+# Importing the relevant modules
+import base64
+import codecs
+import csv
+import heapq
+import io
+import mmap
+import os
+import re
+from collections import Counter
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa, pa_csv = None, None
+
+# The number of bytes at the start of the file used to detect its format
+SNIFF_BYTES = 65536
+
+# The number of lines (the last lines of the sample) used to detect the delimiter and the number of fields
+SNIFF_LINES = 50
+
+# The delimiters that are detected
+DELIMITERS = ',;\t|'
+
+# The encodings tried in order where the file has no byte order mark (latin-1 decodes any file)
+ENCODINGS = ['utf-8', 'cp1252', 'latin-1']
+
+# The number of rows of each chunk when files are streamed
+CHUNK_ROWS = 65536
+
+# The name of the column that flags the duplicate timestamps of merged files
+DUP_COL = 'Duplicate'
+
+# Numbers written with a decimal comma and with a decimal point
+DEC_COMMA = re.compile(r'^\s*[-+]?\d+,\d+\s*$')
+DEC_POINT = re.compile(r'^\s*[-+]?\d+\.\d+\s*$')
+
+
+class _BufferReader(io.RawIOBase):
+    """
+    Read-only file object over a buffer (e.g. a memory map or bytes) which pandas can read without copying the buffer.
+    """
+
+    def __init__(self, buf):
+        self._view = memoryview(buf).cast('B')
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        n = min(len(b), len(self._view) - self._pos)
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def close(self):
+        # The view is released so that a memory map can be closed once it has been parsed
+        self._view.release()
+        super().close()
+
+
+def detect_encoding(sample):
+    """
+    Simple function to detect the encoding of a file from its byte order mark or the first of ENCODINGS that decodes
+    the start of the file.
+
+    :param sample: bytes at the start of the file
+
+    :return: str: encoding
+    """
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+
+    # The sample may end part way through a character, so only the complete lines are decoded
+    sample = sample[:sample.rfind(b'\n') + 1] or sample
+    for encoding in ENCODINGS:
+        try:
+            sample.decode(encoding)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+
+    return ENCODINGS[-1]
+
+
+def detect_delimiter(lines):
+    """
+    Simple function to detect the delimiter of a file as the one of DELIMITERS that splits the most lines into the same
+    number of fields (and into the most fields where there is a tie).
+
+    :param lines: list of the lines of the data
+
+    :return: str: delimiter, and int: number of fields of the data
+    """
+    best = (0, 1, ',')
+    for delimiter in DELIMITERS:
+        widths = Counter(len(row) for row in csv.reader(lines, delimiter=delimiter))
+        width, freq = widths.most_common(1)[0] if widths else (1, 0)
+        if width > 1 and (freq, width) > best[:2]:
+            best = (freq, width, delimiter)
+
+    return best[2], best[1]
+
+
+def _is_number(field, decimal='.'):
+    """
+    Simple function to check if a field is a number (with the given decimal separator).
+    """
+    try:
+        float(field.strip().replace(decimal, '.'))
+        return True
+    except ValueError:
+        return False
+
+
+def sniff(buf, sample_size=SNIFF_BYTES):
+    """
+    This function detects the format of a csv/txt file from the start of its buffer.
+
+    :param buf: The buffer of the file (bytes, memory map etc.)
+    :param sample_size: The number of bytes used
+
+    :return: dict of the 'encoding', 'delimiter', 'header' (0 or None), 'skiprows' and 'decimal' of the file
+    """
+    sample = bytes(buf[:sample_size])
+    encoding = detect_encoding(sample)
+
+    # The last line of the sample is dropped where it may have been cut
+    lines = sample.decode(encoding, errors='ignore').split('\n')
+    if len(buf) > sample_size and len(lines) > 1:
+        lines = lines[:-1]
+    lines = [line.rstrip('\r') for line in lines]
+    body = [line for line in lines if line.strip()][-SNIFF_LINES:]
+
+    # The delimiter is detected from the last lines of the sample, so that a preamble does not affect it
+    delimiter, width = detect_delimiter(body)
+
+    # The header (or first data row) is the first row with the number of fields of the data
+    rows = list(csv.reader(lines, delimiter=delimiter))
+    skiprows = next((i for i, row in enumerate(rows) if len(row) == width), 0)
+
+    # A decimal comma is only possible where the delimiter is not a comma
+    decimal = '.'
+    if delimiter != ',':
+        fields = [field for row in csv.reader(body, delimiter=delimiter) for field in row]
+        if sum(bool(DEC_COMMA.match(f)) for f in fields) > sum(bool(DEC_POINT.match(f)) for f in fields):
+            decimal = ','
+
+    # The row is a header unless it is numeric in every column where the data below it are numeric
+    has_header = True
+    if skiprows < len(rows):
+        data = [row for row in rows[skiprows + 1:skiprows + 1 + SNIFF_LINES] if len(row) == width]
+        num_cols = [c for c in range(width) if data and all(_is_number(row[c], decimal) for row in data)]
+        has_header = not num_cols or not all(_is_number(rows[skiprows][c], decimal) for c in num_cols)
+
+    return {'encoding': encoding, 'delimiter': delimiter, 'header': 0 if has_header else None, 'skiprows': skiprows,
+            'decimal': decimal}
+
+
+def _arrow_read(buf, fmt, usecols=None):
+    """
+    Parses the buffer with the multithreaded csv reader of pyarrow. The date/time columns are returned as strings (as
+    with pandas) so that they are handled in the same way by the tools.
+    """
+    read_options = pa_csv.ReadOptions(use_threads=True, skip_rows=fmt['skiprows'],
+                                      autogenerate_column_names=fmt['header'] is None,
+                                      encoding='utf8' if fmt['encoding'] in ('utf-8', 'utf-8-sig') else fmt['encoding'])
+    parse_options = pa_csv.ParseOptions(delimiter=fmt['delimiter'])
+    convert_options = pa_csv.ConvertOptions(include_columns=usecols, strings_can_be_null=True)
+    table = pa_csv.read_csv(pa.BufferReader(pa.py_buffer(buf)), read_options, parse_options, convert_options)
+
+    for i, field in enumerate(table.schema):
+        if pa.types.is_temporal(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(pa.string()))
+
+    df = table.to_pandas()
+    if fmt['header'] is None:
+        df.columns = range(len(df.columns))
+
+    return df
+
+
+def read_buffer(buf, usecols=None):
+    """
+    This function detects the format of a csv/txt file and parses it from the same buffer.
+
+    :param buf: The buffer of the file (bytes, memory map etc.)
+    :param usecols: list of the columns to parse [default: None, every column]
+
+    :return: pd.DataFrame of the file
+    """
+    fmt = sniff(buf)
+
+    if pa_csv is not None and fmt['decimal'] == '.':
+        return _arrow_read(buf, fmt, usecols)
+
+    with io.BufferedReader(_BufferReader(buf)) as handle:
+        return pd.read_csv(handle, sep=fmt['delimiter'], header=fmt['header'], skiprows=fmt['skiprows'],
+                           decimal=fmt['decimal'], encoding=fmt['encoding'], usecols=usecols, index_col=False)
+
+
+def read_file(path, usecols=None):
+    """
+    This function memory maps a csv/txt file and parses it (see 'read_buffer').
+
+    :param path: Path of the file
+    :param usecols: list of the columns to parse [default: None, every column]
+
+    :return: pd.DataFrame of the file
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return read_buffer(b'', usecols)
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            return read_buffer(buf, usecols)
+
+
+def read_contents(contents, usecols=None):
+    """
+    This function decodes the contents of a dcc.Upload and parses the file (see 'read_buffer').
+
+    :param contents: The contents of the upload ('data:<type>;base64,<string>')
+    :param usecols: list of the columns to parse [default: None, every column]
+
+    :return: pd.DataFrame of the file
+    """
+    content_type, content_string = contents.split(',')
+
+    return read_buffer(base64.b64decode(content_string), usecols)
+
+
+def iter_buffer(buf, usecols=None, chunksize=CHUNK_ROWS):
+    """
+    This function detects the format of a csv/txt file and parses it from the same buffer in chunks of rows.
+
+    :param buf: The buffer of the file (bytes, memory map etc.)
+    :param usecols: list of the columns to parse [default: None, every column]
+    :param chunksize: The number of rows of each chunk
+
+    :return: generator of pd.DataFrame chunks of the file
+    """
+    fmt = sniff(buf)
+
+    with io.BufferedReader(_BufferReader(buf)) as handle:
+        yield from pd.read_csv(handle, sep=fmt['delimiter'], header=fmt['header'], skiprows=fmt['skiprows'],
+                               decimal=fmt['decimal'], encoding=fmt['encoding'], usecols=usecols, index_col=False,
+                               chunksize=chunksize)
+
+
+def iter_file(path, usecols=None, chunksize=CHUNK_ROWS):
+    """
+    This function memory maps a csv/txt file and parses it in chunks of rows (see 'iter_buffer').
+
+    :return: generator of pd.DataFrame chunks of the file
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield from iter_buffer(b'', usecols, chunksize)
+            return
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            yield from iter_buffer(buf, usecols, chunksize)
+
+
+def iter_contents(contents, usecols=None, chunksize=CHUNK_ROWS):
+    """
+    This function decodes the contents of a dcc.Upload and parses the file in chunks of rows (see 'iter_buffer').
+
+    :return: generator of pd.DataFrame chunks of the file
+    """
+    content_type, content_string = contents.split(',')
+
+    return iter_buffer(base64.b64decode(content_string), usecols, chunksize)
+
+
+def merge_chunks(sources, time_col, duplicates='drop'):
+    """
+    This function merges the chunks of many files (e.g. the daily files of a meter) by their timestamps into one
+    continuous series (a k-way merge). Each file must be in time order, although the files may be given in any order
+    and may overlap.
+
+    Only one chunk of each file is held at a time. All of the rows up to the earliest of the last timestamps of the
+    held chunks are merged and returned (no later chunk can hold an earlier timestamp), then the files whose chunks have
+    been used up are read on. A heap of the last timestamps gives the files to read on.
+
+    Where several rows have the same timestamp (e.g. where the files overlap), the row of the first file given is kept
+    as the original and the others are duplicates.
+
+    :param sources: list of the iterables of the chunks (pd.DataFrame) of each file
+    :param time_col: The name of the timestamp column
+    :param duplicates: 'drop' to drop the duplicates or 'flag' to keep them with the DUP_COL column set to True
+
+    :return: generator of the merged pd.DataFrame chunks, in time order
+    """
+    if duplicates not in ('drop', 'flag'):
+        raise ValueError("'duplicates' must be 'drop' or 'flag'")
+
+    sources = [iter(source) for source in sources]
+    held = [None] * len(sources)
+    last = [None] * len(sources)
+
+    def read_on(i):
+        # The next chunk of the file (in time order) or None once the file has been read
+        for chunk in sources[i]:
+            if len(chunk) == 0:
+                continue
+            chunk = chunk.sort_values(time_col, kind='mergesort')
+            times = chunk[time_col]
+            if last[i] is not None and times.iloc[0] < last[i]:
+                raise ValueError("File {} is not in time order at {}".format(i, times.iloc[0]))
+            last[i] = times.iloc[-1]
+            return chunk
+        return None
+
+    heap = []
+    for i in range(len(sources)):
+        held[i] = read_on(i)
+        if held[i] is not None:
+            heap.append((last[i], i))
+    heapq.heapify(heap)
+
+    prev_time = None
+    while heap:
+        # Every row up to the earliest last timestamp of the held chunks is merged. The chunks are taken in the order
+        # of the files and the stable sort keeps that order for equal timestamps
+        until = heap[0][0]
+        parts = []
+        for i, chunk in enumerate(held):
+            if chunk is None:
+                continue
+            n = chunk[time_col].searchsorted(until, side='right')
+            if n:
+                parts.append(chunk.iloc[:n])
+                held[i] = chunk.iloc[n:]
+
+        merged = pd.concat(parts).sort_values(time_col, kind='mergesort')
+        times = merged[time_col]
+        dup = times.duplicated().values
+        if prev_time is not None:
+            dup = dup | (times == prev_time).values
+        prev_time = times.iloc[-1]
+
+        if duplicates == 'drop':
+            yield merged[~dup]
+        else:
+            yield merged.assign(**{DUP_COL: dup})
+
+        # The files whose chunks have been used up are read on
+        while heap and heap[0][0] <= until:
+            _, i = heapq.heappop(heap)
+            held[i] = read_on(i)
+            if held[i] is not None:
+                heapq.heappush(heap, (last[i], i))
+
+
+def merge_sources(sources, time_col, duplicates='drop'):
+    """
+    This function merges the chunks of many files into one dataframe (see 'merge_chunks').
+
+    :param sources: list of the iterables of the chunks (pd.DataFrame) of each file
+    :param time_col: The name of the timestamp column
+    :param duplicates: 'drop' to drop the duplicates or 'flag' to keep them with the DUP_COL column set to True
+
+    :return: pd.DataFrame of the merged files (with a new range index), int: number of duplicates
+    """
+    chunks = list(merge_chunks(sources, time_col, duplicates='flag'))
+    if not chunks:
+        return pd.DataFrame(), 0
+
+    df = pd.concat(chunks, ignore_index=True)
+    n_dup = int(df[DUP_COL].sum())
+    if duplicates == 'drop':
+        df = df[~df[DUP_COL].values].drop(columns=DUP_COL).reset_index(drop=True)
+
+    return df, n_dup
@@ -0,0 +1,639 @@
+"""
+This python module contains the time syncing engine of the Project LEO Time Syncing Notebook. The lag between two
+signals is found from their normalised cross-correlation, which is calculated for every lag at once through FFTs in
+O(n log n) instead of correlating the shifted series once per lag.
+
+Lags of hours in long records can be found coarse-to-fine (see 'pyramid_lag'): the lag is searched on block means of
+the signals first and then refined within a few samples at each finer level, where only those lags are correlated.
+
+Long recordings can be synced window by window (see 'window_lags'), where the lag of each window is refined to a
+fraction of a sample and a drift model of the lag over time is fitted to follow meter clocks that drift. The second
+signal is then re-timed onto the samples of the first in a single interpolation (see 'retime').
+
+The lag follows the convention of the notebook's 'crosscorr(data1, data2, lag)', i.e. a lag L means that data1 at
+sample t matches data2 at sample t - L (data2.shift(L) lines up with data1).
+
+Many sites can be synced against one reference (e.g. the asset meters of a feeder against its substation meter, see
+'sync_sites'). Each site is resampled once onto the grid of the reference and the lags of all the sites are found with
+batched FFTs, where the spectra of the reference are only calculated once.
+
+Missing values (NaN) are handled through masked normalisation: for each lag the correlation only uses the pairs of
+samples that are both present, as pandas' Series.corr does, by correlating the masks and masked values alongside the
+signals.
+"""
+
+# Importing the relevant modules
+from concurrent.futures import ProcessPoolExecutor
+from scipy import fft
+from scripts.dash_ingest import read_file
+import time
+import math
+import os
+import pandas as pd
+import numpy as np
+
+# The default minimum fraction of the samples of the shorter series that must overlap for a lag to be considered
+MIN_OVERLAP = 0.1
+
+# The default minimum correlation of a window for its lag to be used in the drift model
+MIN_CORR = 0.5
+
+# The decimation between the levels of a coarse-to-fine lag search and the largest number of samples of its coarsest
+# level
+PYRAMID_FACTOR = 8
+COARSE_LEN = 20000
+
+# The number of sites correlated at once against the reference (the memory of a batch grows with the number of sites)
+CHUNK_SITES = 8
+
+
+def _masked_terms(x):
+    """
+    Simple function to split a signal (or each row of a stack of signals) into its mask and the masked values (and
+    squares) about its mean
+    """
+    x = np.asarray(x, dtype=float)
+    mask = ~np.isnan(x)
+    count = mask.sum(axis=-1, keepdims=True)
+    mean = np.where(mask, x, 0.0).sum(axis=-1, keepdims=True) / np.maximum(count, 1)
+    values = np.where(mask, x - mean, 0.0)
+
+    return mask.astype(float), values, values ** 2
+
+
+def _spectra(x, n_fft):
+    """
+    Simple function for the rFFTs of the mask, masked values and squares of a signal (or stack of signals)
+    """
+    return fft.rfft(np.stack(_masked_terms(x), axis=-2), n_fft)
+
+
+def _spectra_corr(fx, fy, n_x, n_y, n_fft, max_lag=None, min_overlap=MIN_OVERLAP):
+    """
+    Calculates the normalised cross-correlation from the spectra of the signals (see '_spectra'), where either can be
+    a stack of signals (the correlations of each row are returned)
+    """
+    # The first term of the spectrum of a mask is its sum (the number of samples present)
+    if min_overlap < 1:
+        min_overlap = min_overlap * np.minimum(fx[..., 0, 0].real, fy[..., 0, 0].real)[..., None]
+    fy = np.conj(fy)
+
+    # Lags of the output, from -(n_y - 1) to n_x - 1 (or +/- max_lag)
+    lags = np.arange(-(n_y - 1), n_x)
+    if max_lag is not None:
+        lags = lags[np.abs(lags) <= max_lag]
+    idx = lags % n_fft
+
+    # sum_t a[t] * b[t - lag] for each pair of terms, with the negative lags wrapped to the end of the output
+    def xcorr(a, b):
+        return fft.irfft(fx[..., a, :] * fy[..., b, :], n_fft)[..., idx]
+
+    n = np.rint(xcorr(0, 0))
+    sx, sy = xcorr(1, 0), xcorr(0, 1)
+    sxx, syy = xcorr(2, 0), xcorr(0, 2)
+    sxy = xcorr(1, 1)
+
+    # Pearson correlation of the overlapping pairs at each lag
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = sxy - sx * sy / n
+        var = (sxx - sx ** 2 / n) * (syy - sy ** 2 / n)
+        corr = cov / np.sqrt(var)
+    corr = np.where((n < np.maximum(min_overlap, 2)) | ~(var > 0), np.nan, corr)
+
+    return lags, np.clip(corr, -1.0, 1.0)
+
+
+def masked_xcorr(x, y, max_lag=None, min_overlap=MIN_OVERLAP):
+    """
+    Calculates the normalised (Pearson) cross-correlation of two signals for every lag, ignoring missing values. Each
+    of the sums for the correlation at every lag is a cross-correlation of the signals, their masks or their squares,
+    which is equivalent to scipy.signal.correlate(..., method='fft') but with the FFT of each input only done once.
+
+    :param x: First signal (np.ndarray or pd.Series, evenly sampled)
+    :param y: Second signal, on the same sampling as x, or a stack of signals (2D np.ndarray, one signal per row)
+    :param max_lag: The largest absolute lag (samples) to return [default: None, every lag]
+    :param min_overlap: The minimum number of overlapping samples for a lag (or fraction of the samples of the shorter
+    signal if below 1), the correlation of lags with less overlap is NaN
+
+    :return: lags (np.ndarray of int), corr (np.ndarray, with a row for each signal of a stack)
+    """
+    n_x, n_y = np.shape(x)[-1], np.shape(y)[-1]
+
+    # The FFTs are padded to at least the full length of the correlation so that the correlation is not circular
+    n_fft = fft.next_fast_len(n_x + n_y - 1, real=True)
+
+    return _spectra_corr(_spectra(x, n_fft), _spectra(y, n_fft), n_x, n_y, n_fft, max_lag, min_overlap)
+
+
+def find_lag(x, y, max_lag=None, min_overlap=MIN_OVERLAP):
+    """
+    Finds the lag (samples) with the highest correlation between two signals (see 'masked_xcorr').
+
+    :return: lag (int), correlation at the lag, lags, corr
+    """
+    lags, corr = masked_xcorr(x, y, max_lag, min_overlap)
+    if np.isnan(corr).all():
+        raise ValueError("The signals do not overlap enough to be correlated")
+
+    best = np.nanargmax(corr)
+
+    return int(lags[best]), corr[best], lags, corr
+
+
+def lag_corr(x, y, lags, min_overlap=MIN_OVERLAP):
+    """
+    Calculates the normalised cross-correlation of two signals at a few lags directly (O(n) for each lag), which is
+    the same as 'masked_xcorr' at those lags but cheaper when only a handful of lags are needed.
+
+    :param x: First signal (np.ndarray, evenly sampled)
+    :param y: Second signal, on the same sampling as x
+    :param lags: Lags (samples) to correlate
+    :param min_overlap: See 'masked_xcorr'
+
+    :return: corr (np.ndarray, one for each lag)
+    """
+    (mx, x0, xx), (my, y0, yy) = _masked_terms(x), _masked_terms(y)
+    if min_overlap < 1:
+        min_overlap = min_overlap * min(mx.sum(), my.sum())
+
+    corr = np.full(len(lags), np.nan)
+    for i, lag in enumerate(lags):
+        # x[t] is paired with y[t - lag] over the samples where both exist, and the sums of the pairs that are both
+        # present are dot products of the masks and masked values (as in 'masked_xcorr')
+        lo, hi = max(0, lag), min(len(x0), len(y0) + lag)
+        if hi - lo < 2:
+            continue
+        a, b = slice(lo, hi), slice(lo - lag, hi - lag)
+        n = mx[a] @ my[b]
+        if n < max(min_overlap, 2):
+            continue
+        sx, sy = x0[a] @ my[b], mx[a] @ y0[b]
+        cov = x0[a] @ y0[b] - sx * sy / n
+        var = (xx[a] @ my[b] - sx ** 2 / n) * (mx[a] @ yy[b] - sy ** 2 / n)
+        if var > 0:
+            corr[i] = np.clip(cov / np.sqrt(var), -1.0, 1.0)
+
+    return corr
+
+
+def decimate(x, factor):
+    """
+    Decimates a signal to the means of blocks of 'factor' samples, ignoring missing values (a block with no values is
+    NaN). Any samples beyond the last full block are dropped.
+
+    :param x: Signal (np.ndarray)
+    :param factor: Number of samples in each block
+
+    :return: np.ndarray of the block means
+    """
+    x = np.asarray(x, dtype=float)
+    blocks = x[:len(x) // factor * factor].reshape(-1, factor)
+    count = (~np.isnan(blocks)).sum(axis=1)
+    with np.errstate(invalid='ignore'):
+        return np.where(count > 0, np.nansum(blocks, axis=1) / count, np.nan)
+
+
+def pyramid_lag(x, y, max_lag=None, factor=PYRAMID_FACTOR, levels=None, refine=None, min_overlap=MIN_OVERLAP):
+    """
+    Finds the lag (samples) with the highest correlation between two signals coarse-to-fine. The signals are decimated
+    (see 'decimate') by 'factor' at each level, every lag of the coarsest level is searched (see 'find_lag') and the
+    lag is then refined within +/- 'refine' samples at each finer level (see 'lag_corr').
+
+    :param x: First signal (np.ndarray, evenly sampled)
+    :param y: Second signal, on the same sampling as x
+    :param max_lag: The largest absolute lag (samples) searched [default: None, every lag]
+    :param factor: Decimation between the levels
+    :param levels: Number of decimated levels [default: None, enough for the coarsest to have at most COARSE_LEN
+    samples]
+    :param refine: Lags (samples) searched either side of the estimate at each finer level [default: factor, the
+    resolution of the level above]
+    :param min_overlap: See 'masked_xcorr'
+
+    :return: lag (int), correlation at the lag, pd.DataFrame of each level (coarsest first) with the time (s) to
+    decimate and search it
+    """
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    n = max(len(x), len(y))
+    if levels is None:
+        levels = max(0, math.ceil(math.log(n / COARSE_LEN, factor))) if n > COARSE_LEN else 0
+    refine = factor if refine is None else refine
+
+    # Decimated levels, finest first
+    pyramid, decimate_times = [(x, y)], [0.0]
+    for _ in range(levels):
+        start = time.perf_counter()
+        pyramid.append((decimate(pyramid[-1][0], factor), decimate(pyramid[-1][1], factor)))
+        decimate_times.append(time.perf_counter() - start)
+
+    # Every lag of the coarsest level
+    start = time.perf_counter()
+    scale = factor ** levels
+    xc, yc = pyramid[-1]
+    lag, corr, lags, _ = find_lag(xc, yc, None if max_lag is None else math.ceil(max_lag / scale), min_overlap)
+    timings = [(levels, scale, len(xc), len(lags), decimate_times[levels], time.perf_counter() - start)]
+
+    # Refined within a few lags at each finer level
+    for level in range(levels - 1, -1, -1):
+        start = time.perf_counter()
+        xl, yl = pyramid[level]
+        lags = np.arange(lag * factor - refine, lag * factor + refine + 1)
+        if max_lag is not None:
+            lags = lags[np.abs(lags) <= max_lag]
+        corrs = lag_corr(xl, yl, lags, min_overlap)
+        if np.isnan(corrs).all():
+            raise ValueError("The signals do not overlap enough to be correlated at level {}".format(level))
+        best = np.nanargmax(corrs)
+        lag, corr = int(lags[best]), corrs[best]
+        timings.append((level, factor ** level, len(xl), len(lags), decimate_times[level], time.perf_counter() - start))
+
+    timing_df = pd.DataFrame(timings, columns=['Level', 'Decimation', 'Samples', 'Lags', 'Decimate (s)', 'Search (s)'])
+
+    return lag, corr, timing_df
+
+
+def subsample_peak(corr, best):
+    """
+    Refines the position of a correlation peak to a fraction of a sample by fitting a parabola through the peak and
+    its two neighbours.
+
+    :param corr: Correlation for each lag (evenly spaced lags)
+    :param best: Position of the peak in corr
+
+    :return: Offset of the peak from 'best' (between -0.5 and 0.5)
+    """
+    if best == 0 or best == len(corr) - 1:
+        return 0.0
+
+    c_prev, c_peak, c_next = corr[best - 1], corr[best], corr[best + 1]
+    curve = c_prev - 2 * c_peak + c_next
+    if not np.isfinite(curve) or curve >= 0:
+        return 0.0
+
+    return float(np.clip(0.5 * (c_prev - c_next) / curve, -0.5, 0.5))
+
+
+def window_lags(x, y, window, step=None, max_lag=None, min_overlap=MIN_OVERLAP):
+    """
+    Estimates the lag of the second signal against the first for each window of the signals, refined to a fraction of
+    a sample. The windows are read one at a time (e.g. from memory mapped arrays) so that long recordings can be
+    streamed through.
+
+    For each window of x, the lag is searched within +/- max_lag samples of y around the window.
+
+    :param x: First signal (np.ndarray, evenly sampled)
+    :param y: Second signal, on the same sampling as x
+    :param window: Number of samples in each window
+    :param step: Number of samples between the start of each window [default: window]
+    :param max_lag: The largest absolute lag (samples) searched in each window [default: window // 2]
+    :param min_overlap: See 'masked_xcorr', as a fraction of the window if below 1
+
+    :return: generator of (window centre (samples), lag (samples), correlation) for each window
+    """
+    step = step or window
+    max_lag = window // 2 if max_lag is None else max_lag
+    n = min(len(x), len(y))
+    if min_overlap < 1:
+        min_overlap = min_overlap * window
+
+    for start in range(0, max(n - window, 0) + 1, step):
+        # The window of x is placed within the extended window of y (NaN outside the window) so that both share the
+        # same sample positions and the lags of the correlation are the lags of the window
+        ext_start, ext_end = max(start - max_lag, 0), min(start + window + max_lag, n)
+        x_ext = np.full(ext_end - ext_start, np.nan)
+        x_ext[start - ext_start:start - ext_start + window] = x[start:start + window]
+        y_ext = np.asarray(y[ext_start:ext_end], dtype=float)
+
+        lags, corr = masked_xcorr(x_ext, y_ext, max_lag, min_overlap)
+        if np.isnan(corr).all():
+            continue
+
+        best = np.nanargmax(corr)
+        yield start + window / 2, lags[best] + subsample_peak(corr, best), corr[best]
+
+
+class DriftModel:
+    """
+    Model of the lag (samples) between two signals over time, fitted to the lags of the windows of 'window_lags'.
+    A 'linear' model is a constant offset plus a constant clock drift, whereas a 'piecewise' model follows the lags
+    of the windows (linear between the window centres) for clocks that drift unevenly.
+
+    Windows with a correlation below 'min_corr' and outliers (more than 'n_mad' median absolute deviations from the
+    fit) are not used.
+
+    :param centres: Window centres (samples)
+    :param lags: Lags of the windows (samples)
+    :param corr: Correlations of the windows
+    :param kind: 'linear' or 'piecewise'
+    :param min_corr: The minimum correlation of a window
+    :param n_mad: The outlier threshold
+    """
+
+    def __init__(self, centres, lags, corr, kind='linear', min_corr=MIN_CORR, n_mad=5.0):
+
+        centres, lags, corr = [np.asarray(values, dtype=float) for values in (centres, lags, corr)]
+        used = corr >= min_corr
+        if not used.any():
+            raise ValueError("No window has a correlation of at least {}".format(min_corr))
+
+        self.kind = kind
+        self.coefs = None
+
+        # Outliers are dropped against the linear fit, or the running median of the windows for a piecewise model
+        order = np.argsort(centres)
+        for _ in range(2):
+            if kind == 'piecewise':
+                running = pd.Series(lags[order]).where(used[order]).rolling(5, center=True, min_periods=1).median()
+                resid = np.empty_like(lags)
+                resid[order] = lags[order] - running.values
+            else:
+                resid = lags - self._fit(centres[used], lags[used], corr[used])(centres)
+            mad = np.median(np.abs(resid[used] - np.median(resid[used])))
+            used &= np.abs(resid) <= n_mad * max(mad, 0.05)
+
+        self.centres, self.lags, self.corr, self.used = centres, lags, corr, used
+        self._model = self._fit(centres[used], lags[used], corr[used])
+
+    def _fit(self, centres, lags, corr):
+        """
+        Fits the model to the windows, returning a function of the lag at any sample
+        """
+        if self.kind == 'piecewise' or len(centres) < 2:
+            order = np.argsort(centres)
+            return lambda t: np.interp(t, centres[order], lags[order])
+
+        # Weighted least squares of the lag against time, where the better correlated windows have more weight
+        self.coefs = np.polyfit(centres, lags, 1, w=corr)
+        return np.poly1d(self.coefs)
+
+    def __call__(self, t):
+        """
+        :param t: Sample positions
+
+        :return: Lag (samples) at each position
+        """
+        return self._model(np.asarray(t, dtype=float))
+
+
+def retime(y, lag):
+    """
+    Re-times the second signal onto the samples of the first, i.e. returns y(t - lag(t)) for every sample t of the
+    first signal, through a single linear interpolation of the fractional sample positions. Samples that need a
+    missing value of y (or are beyond either end of y) are NaN.
+
+    :param y: Second signal (np.ndarray, evenly sampled)
+    :param lag: Lag (samples) at each sample of the first signal (np.ndarray) or a constant lag
+
+    :return: np.ndarray of the re-timed signal
+    """
+    y = np.asarray(y, dtype=float)
+    lag = np.asarray(lag, dtype=float)
+    pos = np.arange(lag.size if lag.ndim else len(y)) - lag
+
+    # The two samples of y either side of each position and the weight of the later sample
+    lower = np.floor(pos).astype(int)
+    frac = pos - lower
+    valid = ((lower >= 0) & (lower < len(y) - 1)) | ((lower == len(y) - 1) & (frac == 0))
+    lower = np.clip(lower, 0, len(y) - 1)
+    upper = np.minimum(lower + 1, len(y) - 1)
+
+    out = y[lower] * (1 - frac) + y[upper] * frac
+    # Exact positions only use the sample itself, so a missing neighbour is not spread
+    out = np.where(frac == 0, y[lower], out)
+    out[~valid] = np.nan
+
+    return out
+
+
+def sample_period(index):
+    """
+    The sampling period of a time index (the median difference of the timestamps) rather than assuming 1 Hz data
+
+    :param index: pd.DatetimeIndex
+
+    :return: pd.Timedelta
+    """
+    return pd.Series(index).diff().median()
+
+
+def sync_series(s1, s2, window=None, step=None, max_lag=None, kind='linear', min_corr=MIN_CORR):
+    """
+    Syncs the second series to the first. The series must be on the same (evenly sampled) time index, e.g. the
+    inner join of the two sites in the notebook.
+
+    :param s1: First series (the reference)
+    :param s2: Second series
+    :param window: Number of samples in each window [default: None, one window over the whole record]
+    :param step: Number of samples between the start of each window [default: window]
+    :param max_lag: The largest absolute lag (samples) searched [default: None, every lag of a single window]
+    :param kind: 'linear' or 'piecewise' drift model (see 'DriftModel')
+    :param min_corr: The minimum correlation of a window for the drift model
+
+    :return: synced second series (on the index of the first), pd.DataFrame of the lag of each window, DriftModel
+    """
+    x, y = s1.values.astype(float), s2.values.astype(float)
+    period = sample_period(s1.index)
+
+    if window is None:
+        lag, corr, _, corrs = find_lag(x, y, max_lag)
+        windows = [(len(x) / 2, lag + subsample_peak(corrs, int(np.nanargmax(corrs))), corr)]
+    else:
+        windows = list(window_lags(x, y, window, step, max_lag))
+
+    lag_df = pd.DataFrame(windows, columns=['Centre', 'Lag (samples)', 'Correlation'])
+    model = DriftModel(lag_df['Centre'], lag_df['Lag (samples)'], lag_df['Correlation'], kind, min_corr)
+
+    lag_df['Time'] = s1.index[0] + lag_df['Centre'] * period
+    lag_df['Lag'] = lag_df['Lag (samples)'] * period
+    lag_df['Used'] = model.used
+
+    synced = pd.Series(retime(y, model(np.arange(len(x)))), index=s1.index, name=s2.name)
+
+    return synced, lag_df[['Time', 'Lag (samples)', 'Lag', 'Correlation', 'Used']], model
+
+
+def read_site_frame(path, time_cols=(0,)):
+    """
+    Reads the data of a site from a csv/txt file, where the format of the file (delimiter, header row, decimal and
+    encoding) is detected from the same memory-mapped buffer that is parsed (see 'dash_ingest.py') and the date/time
+    columns are joined into the timestamp.
+
+    :param path: Path of the file
+    :param time_cols: Positions of the date/time columns
+
+    :return: pd.DataFrame of the remaining columns, indexed by the 'timestamp'
+    """
+    df = read_file(path)
+    times = df.iloc[:, list(time_cols)].astype(str).agg(' '.join, axis=1)
+    df = df.drop(columns=df.columns[list(time_cols)])
+    df.index = pd.DatetimeIndex(pd.to_datetime(times.values), name='timestamp')
+
+    return df
+
+
+def read_site(path, time_cols=(0,), column=None):
+    """
+    Reads a single column of the data of a site from a csv/txt file (see 'read_site_frame').
+
+    :param path: Path of the file
+    :param time_cols: Positions of the date/time columns
+    :param column: Column of the values [default: None, the first numeric column]
+
+    :return: pd.Series of the values, on the (sorted) timestamps
+    """
+    df = read_site_frame(path, time_cols)
+
+    if column is None:
+        column = df.select_dtypes('number').columns[0]
+
+    return df[column].rename(column).sort_index()
+
+
+def resample_sites(reference, sites, freq=None):
+    """
+    Resamples the reference and each site once onto a common grid: the span of the reference at 'freq', where each
+    sample is the mean of the values in its period.
+
+    :param reference: pd.Series of the reference
+    :param sites: dict of pd.Series of each site
+    :param freq: Period of the grid [default: None, the sampling period of the reference]
+
+    :return: pd.DataFrame of the reference (first column) and each site on the grid
+    """
+    freq = sample_period(reference.index) if freq is None else pd.to_timedelta(freq)
+    if not freq > pd.Timedelta(0):
+        raise ValueError("The period of the grid must be positive (check the date/time columns of the reference)")
+    grid = pd.date_range(reference.index[0], reference.index[-1], freq=freq)
+
+    columns = {reference.name: reference}
+    columns.update(sites)
+
+    return pd.DataFrame({name: series.resample(freq, origin=grid[0]).mean().reindex(grid)
+                         for name, series in columns.items()}, index=grid)
+
+
+def _chunk_lags(fx, ys, n_x, n_fft, max_lag, min_overlap):
+    """
+    Simple function to find the lag of each of a chunk of signals from the spectra of the reference (see 'batch_lags')
+    """
+    lags, corr = _spectra_corr(fx, _spectra(ys, n_fft), n_x, ys.shape[1], n_fft, max_lag, min_overlap)
+
+    found, peaks = np.full(len(ys), np.nan), np.full(len(ys), np.nan)
+    for row, row_corr in enumerate(corr):
+        if not np.isnan(row_corr).all():
+            best = np.nanargmax(row_corr)
+            found[row], peaks[row] = lags[best] + subsample_peak(row_corr, best), row_corr[best]
+
+    return found, peaks
+
+
+def batch_lags(x, ys, max_lag=None, min_overlap=MIN_OVERLAP, processes=1, chunk_sites=CHUNK_SITES):
+    """
+    Finds the lag of each of a stack of signals against a reference, refined to a fraction of a sample. The spectra
+    of the reference are calculated once and the signals are correlated 'chunk_sites' at a time in batched FFTs.
+
+    :param x: Reference signal (np.ndarray, evenly sampled)
+    :param ys: Stack of signals on the same sampling as x (2D np.ndarray, one signal per row)
+    :param max_lag: The largest absolute lag (samples) searched [default: None, every lag]
+    :param min_overlap: See 'masked_xcorr'
+    :param processes: Number of processes to spread the chunks across (None for every core)
+    :param chunk_sites: Number of signals in each chunk
+
+    :return: lags (np.ndarray, NaN for the signals that do not overlap enough), correlations at the lags
+    """
+    x = np.asarray(x, dtype=float)
+    ys = np.atleast_2d(np.asarray(ys, dtype=float))
+    n_fft = fft.next_fast_len(len(x) + ys.shape[1] - 1, real=True)
+    fx = _spectra(x, n_fft)
+
+    chunks = [ys[start:start + chunk_sites] for start in range(0, len(ys), chunk_sites)]
+    args = [[fx] * len(chunks), chunks, [len(x)] * len(chunks), [n_fft] * len(chunks), [max_lag] * len(chunks),
+            [min_overlap] * len(chunks)]
+
+    if processes == 1 or len(chunks) == 1:
+        results = list(map(_chunk_lags, *args))
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(_chunk_lags, *args))
+
+    return np.concatenate([lags for lags, _ in results]), np.concatenate([corr for _, corr in results])
+
+
+def _sync_site(s1, s2, window, step, max_lag, kind, min_corr):
+    """
+    Simple function to sync a site window by window (see 'sync_series'), returning the synced values, the lags at
+    both ends of the record (samples), the median correlation and the number of windows used
+    """
+    synced, lag_df, model = sync_series(s1, s2, window, step, max_lag, kind, min_corr)
+    start_lag, end_lag = model([0, len(s1) - 1])
+
+    return synced.values, start_lag, end_lag, lag_df.loc[lag_df['Used'], 'Correlation'].median(), lag_df['Used'].sum()
+
+
+def sync_sites(reference, sites, freq=None, max_lag=None, window=None, step=None, kind='linear', min_corr=MIN_CORR,
+               processes=1, chunk_sites=CHUNK_SITES):
+    """
+    Syncs many sites to a reference. The sites are resampled once onto the grid of the reference (see
+    'resample_sites'). With a single window (the default) the lags of all the sites are found in batches (see
+    'batch_lags'), otherwise each site is synced window by window (see 'sync_series') in parallel.
+
+    :param reference: pd.Series of the reference
+    :param sites: dict of pd.Series of each site
+    :param freq: Period of the common grid [default: None, the sampling period of the reference]
+    :param max_lag: The largest absolute lag (samples of the grid) searched [default: None, every lag]
+    :param window: Number of samples in each window [default: None, one window over the whole record]
+    :param step: Number of samples between the start of each window [default: window]
+    :param kind: 'linear' or 'piecewise' drift model (see 'DriftModel')
+    :param min_corr: The minimum correlation of a window for the drift model
+    :param processes: Number of processes to spread the sites across (None for every core)
+    :param chunk_sites: Number of sites in each batch (single window only)
+
+    :return: pd.DataFrame of the reference and the synced sites on the grid, pd.DataFrame of the lag of each site
+    """
+    grid_df = resample_sites(reference, sites, freq)
+    period = grid_df.index[1] - grid_df.index[0] if len(grid_df) > 1 else sample_period(reference.index)
+    ref_name, names = grid_df.columns[0], list(grid_df.columns[1:])
+    x = grid_df[ref_name].values
+
+    if window is None:
+        lags, corr = batch_lags(x, grid_df[names].values.T, max_lag, processes=processes, chunk_sites=chunk_sites)
+        results = [(retime(grid_df[name].values, lag) if np.isfinite(lag) else np.full(len(x), np.nan), lag, lag,
+                    site_corr, int(np.isfinite(lag))) for name, lag, site_corr in zip(names, lags, corr)]
+    else:
+        args = [[grid_df[ref_name]] * len(names), [grid_df[name] for name in names], [window] * len(names),
+                [step] * len(names), [max_lag] * len(names), [kind] * len(names), [min_corr] * len(names)]
+        if processes == 1 or len(names) == 1:
+            results = list(map(_sync_site, *args))
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                results = list(executor.map(_sync_site, *args))
+
+    synced_df = pd.DataFrame({ref_name: x}, index=grid_df.index.rename('Time'))
+    for name, (values, *_) in zip(names, results):
+        synced_df[name] = values
+
+    lag_df = pd.DataFrame([result[1:] for result in results], index=pd.Index(names, name='Site'),
+                          columns=['Start Lag (samples)', 'End Lag (samples)', 'Correlation', 'Windows Used'])
+    lag_df['Start Lag'] = lag_df['Start Lag (samples)'] * period
+    lag_df['End Lag'] = lag_df['End Lag (samples)'] * period
+
+    return synced_df, lag_df
+
+
+def write_columnar(df, path):
+    """
+    Writes a dataset (e.g. from 'sync_sites') to one columnar file, chosen by the extension of the path: '.parquet' or
+    '.feather' (which need pyarrow) or '.npz' (a numpy array for the time index and each column).
+
+    :param df: pd.DataFrame on a time index
+    :param path: Path of the file
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.parquet':
+        df.to_parquet(path)
+    elif ext == '.feather':
+        df.reset_index().to_feather(path)
+    elif ext == '.npz':
+        arrays = {str(col): df[col].values for col in df.columns}
+        np.savez(path, **{df.index.name or 'index': df.index.values}, **arrays)
+    else:
+        raise ValueError("Unknown columnar format '{}' (use .parquet, .feather or .npz)".format(ext))
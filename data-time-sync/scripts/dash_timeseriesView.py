@@ -0,0 +1,522 @@
+"""
+This python module contains the functions used to downsample timeseries data before it is plotted within the Project
+LEO tools. Plotly sends every point of a trace to the browser and this quickly becomes unusable for high-resolution
+data (for instance, 1-second voltage over a number of weeks). The functions below reduce each trace to a fixed
+number of points while keeping the visual shape of the data:
+
+'minmax': Keeps the minimum and maximum value of each bucket so that peaks and troughs are never lost
+'lttb': Largest-Triangle-Three-Buckets, keeps the point in each bucket that forms the largest triangle with its
+        neighbours
+
+The 'Pyramid' class holds precomputed min/max levels of a series so that a zoomed view (e.g. from a Dash 'relayoutData'
+event) only aggregates the visible range of the data instead of the full series.
+
+The 'AggregatePyramid' class holds count/sum/min/max aggregates of a dataframe at calendar resolutions ('30S', 'T',
+'H', 'D', 'M') so that resampled views of the data are returned without resampling the full dataset each time.
+"""
+
+# Importing the relevant modules
+import pandas as pd
+import numpy as np
+
+
+# The maximum number of points per trace sent to the browser
+MAX_PTS = 5000
+
+
+def _to_int64(x):
+    """
+    Simple function to convert the x values of a series (datetime or numeric) into a numeric array so that the
+    triangle areas and searches below can be performed on them.
+
+    :param x: Array-like of datetime or numeric values
+
+    :return: np.ndarray of float values
+    """
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype('datetime64[ns]').view('i8').astype(float)
+    return x.astype(float)
+
+
+def minmax_downsample(x, y, n_out=MAX_PTS):
+    """
+    Downsamples a series by splitting it into equal buckets and keeping the minimum and maximum of each bucket
+    (in the order that they occur). Buckets that only contain 'nan' are kept as a single 'nan' so that gaps in the
+    data still appear as gaps in the plot.
+
+    :param x: Array of x values (time)
+    :param y: Array of y values
+    :param n_out: The maximum number of points to return
+
+    :return: x, y arrays of the downsampled series
+    """
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= n_out:
+        return x, y
+
+    # Two points are kept for each bucket
+    n_bkt = max(n_out // 2, 1)
+    edges = np.linspace(0, n, n_bkt + 1).astype(np.int64)
+    pos_min, pos_max = _bucket_arg_extrema(y, edges)
+
+    return _interleave(x, y, pos_min, pos_max)
+
+
+def lttb(x, y, n_out=MAX_PTS):
+    """
+    Largest-Triangle-Three-Buckets downsampling. The first and last points are always kept and, for every bucket in
+    between, the point forming the largest triangle with the point chosen in the previous bucket and the average of
+    the next bucket is kept. 'nan' values are never selected unless the bucket contains only 'nan'.
+
+    :param x: Array of x values (time)
+    :param y: Array of y values
+    :param n_out: The number of points to return
+
+    :return: x, y arrays of the downsampled series
+    """
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return x, y
+
+    xf = _to_int64(x)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+
+    # The average point of every bucket is needed as the third point of the triangle
+    sums_x = np.add.reduceat(xf[:-1], edges[:-1])
+    valid = ~np.isnan(y[:-1])
+    sums_y = np.add.reduceat(np.where(valid, y[:-1], 0.0), edges[:-1])
+    counts = np.add.reduceat(valid.astype(np.int64), edges[:-1])
+    avg_x = sums_x / np.diff(edges)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        avg_y = sums_y / counts
+
+    # The average of the last point is used as the 'next bucket' for the final bucket
+    avg_x = np.append(avg_x, xf[-1])
+    avg_y = np.append(avg_y, y[-1])
+
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        cx, cy = avg_x[b + 1], avg_y[b + 1]
+        if np.isnan(cy):
+            cy = y[a] if not np.isnan(y[a]) else 0.0
+
+        # Twice the triangle area, the constant factor does not change the argmax
+        area = np.abs((xf[a] - cx) * (y[lo:hi] - y[a]) - (xf[a] - xf[lo:hi]) * (cy - y[a]))
+        if np.isnan(area).all():
+            a = lo
+        else:
+            a = lo + int(np.nanargmax(area))
+        keep[b + 1] = a
+
+    return x[keep], y[keep]
+
+
+def minmax_frame(df, n_out=MAX_PTS):
+    """
+    Downsamples all of the columns of a time indexed dataframe onto a shared index. Each bucket is represented by
+    two rows (the bucket start and mid time) holding the minimum and maximum of every column in the order that they
+    occurred. This keeps the envelope of the data for libraries that plot a dataframe directly (e.g. cufflinks).
+
+    :param df: Time indexed dataframe with numeric columns
+    :param n_out: The maximum number of rows to return
+
+    :return: Downsampled dataframe
+    """
+    n = len(df)
+    if n <= n_out:
+        return df
+
+    n_bkt = max(n_out // 2, 1)
+    edges = np.linspace(0, n, n_bkt + 1).astype(np.int64)
+    starts, ends = edges[:-1], edges[1:]
+    mids = (starts + ends - 1) // 2
+
+    idx = df.index.values
+    new_idx = np.empty(2 * n_bkt, dtype=idx.dtype)
+    new_idx[0::2], new_idx[1::2] = idx[starts], idx[mids]
+
+    out = {}
+    for col in df.columns:
+        y = df[col].to_numpy(dtype=float)
+        pos_min, pos_max = _bucket_arg_extrema(y, edges)
+        first = np.where(pos_min <= pos_max, pos_min, pos_max)
+        second = np.where(pos_min <= pos_max, pos_max, pos_min)
+        vals = np.empty(2 * n_bkt)
+        vals[0::2], vals[1::2] = y[first], y[second]
+        out[col] = vals
+
+    return pd.DataFrame(out, index=pd.Index(new_idx, name=df.index.name))
+
+
+def relayout_range(relayout_data):
+    """
+    Pulls the visible x-axis range out of a Dash 'relayoutData' event. Plotly reports zooming as either
+    'xaxis.range[0]'/'xaxis.range[1]' or 'xaxis.range' and a reset of the axes as 'xaxis.autorange'.
+
+    :param relayout_data: The 'relayoutData' property of a dcc.Graph
+
+    :return: (x0, x1) as pd.Timestamps or None if the full range should be shown
+    """
+    if not relayout_data or relayout_data.get('xaxis.autorange'):
+        return None
+
+    if 'xaxis.range[0]' in relayout_data:
+        x0, x1 = relayout_data['xaxis.range[0]'], relayout_data['xaxis.range[1]']
+    elif 'xaxis.range' in relayout_data:
+        x0, x1 = relayout_data['xaxis.range']
+    else:
+        return None
+
+    return pd.Timestamp(x0), pd.Timestamp(x1)
+
+
+def _bucket_arg_extrema(y, edges):
+    """
+    Finds the position of the minimum and maximum value of each bucket of 'y' where the buckets are defined by the
+    'edges' positions. 'nan' values are ignored and buckets of only 'nan' return the bucket start for both.
+
+    :param y: Array of values
+    :param edges: Array of bucket edges (positions) of length n_buckets + 1
+
+    :return: pos_min, pos_max arrays of positions in 'y'
+    """
+    starts = edges[:-1]
+    sizes = np.diff(edges)
+    n_bkt = len(starts)
+
+    # The buckets differ in size by at most one value so they are padded to a 2D array for a single reduction
+    width = int(sizes.max())
+    cols = np.arange(width)
+    pos = starts[:, None] + cols[None, :]
+    pad = cols[None, :] >= sizes[:, None]
+    pos = np.where(pad, starts[:, None], pos)
+
+    vals = y[pos]
+    nan = np.isnan(vals) | pad
+    pos_min = pos[np.arange(n_bkt), np.argmin(np.where(nan, np.inf, vals), axis=1)]
+    pos_max = pos[np.arange(n_bkt), np.argmax(np.where(nan, -np.inf, vals), axis=1)]
+
+    # Return the start of the bucket where there is no data so that the gap is plotted
+    empty = nan.all(axis=1)
+    pos_min[empty] = starts[empty]
+    pos_max[empty] = starts[empty]
+
+    return pos_min, pos_max
+
+
+def _interleave(x, y, pos_min, pos_max):
+    """
+    Combines the min/max positions of each bucket into a single time ordered selection of points. Buckets where the
+    min and max are the same point (or empty) only contribute one point.
+
+    :return: x, y arrays
+    """
+    first = np.minimum(pos_min, pos_max)
+    second = np.maximum(pos_min, pos_max)
+    keep = np.empty(2 * len(first), dtype=np.int64)
+    keep[0::2], keep[1::2] = first, second
+    dup = np.zeros(len(keep), dtype=bool)
+    dup[1::2] = first == second
+    keep = keep[~dup]
+
+    return x[keep], y[keep]
+
+
+class Pyramid:
+    """
+    This class holds a multi-resolution min/max summary of a single series so that zoomed views of the data can be
+    produced without revisiting the full series. Level 0 has buckets of 'factor' points and each coarser level is
+    computed from the level below it (not from the raw data).
+
+    :param x: Array of x values (time). Must be sorted
+    :param y: Array of y values
+    :param factor: The number of buckets of one level combined into a single bucket of the next level
+    :param min_buckets: Levels stop being added once they have fewer buckets than this
+    """
+
+    def __init__(self, x, y, factor=4, min_buckets=MAX_PTS // 4):
+
+        self.x = np.asarray(x)
+        self.y = np.asarray(y, dtype=float)
+        self.xf = _to_int64(self.x)
+        self.factor = factor
+        self.levels = []
+
+        # Level 0 is built from the raw data, all others from the level below
+        n = len(self.y)
+        if n <= factor:
+            return
+        edges = np.append(np.arange(0, n, factor), n)
+        pos_min, pos_max = _bucket_arg_extrema(self.y, edges)
+        self.levels.append((pos_min, pos_max))
+
+        while len(self.levels[-1][0]) > max(min_buckets, 1):
+            self.levels.append(self._coarsen(*self.levels[-1]))
+
+    def _coarsen(self, pos_min, pos_max):
+        """
+        Combines 'factor' buckets of a level into one bucket of the next level by comparing the values at the stored
+        min/max positions.
+
+        :return: pos_min, pos_max of the new level
+        """
+        n = len(pos_min)
+        n_new = -(-n // self.factor)
+        pad = n_new * self.factor - n
+
+        # Pad with the last bucket so that the reshape is possible. Repeating a bucket does not change the extrema
+        pos_min = np.append(pos_min, np.repeat(pos_min[-1], pad)).reshape(n_new, self.factor)
+        pos_max = np.append(pos_max, np.repeat(pos_max[-1], pad)).reshape(n_new, self.factor)
+
+        vmin, vmax = self.y[pos_min], self.y[pos_max]
+        rows = np.arange(n_new)
+        new_min = pos_min[rows, np.argmin(np.where(np.isnan(vmin), np.inf, vmin), axis=1)]
+        new_max = pos_max[rows, np.argmax(np.where(np.isnan(vmax), -np.inf, vmax), axis=1)]
+
+        # Keep the first position of the group if the whole group is empty
+        empty = np.isnan(vmin).all(axis=1)
+        new_min[empty] = pos_min[empty, 0]
+        new_max[empty] = pos_max[empty, 0]
+
+        return new_min, new_max
+
+    def view(self, x0=None, x1=None, max_pts=MAX_PTS, method='minmax'):
+        """
+        Returns the points of the series that should be plotted for the visible range [x0, x1]. If the range holds
+        fewer than 'max_pts' raw points, the raw data are returned. Otherwise, the finest level with few enough
+        buckets in the range is used so the cost depends on the size of the output and not of the series.
+
+        :param x0: Start of the visible range (None for the start of the series)
+        :param x1: End of the visible range (None for the end of the series)
+        :param max_pts: The maximum number of points to return
+        :param method: 'minmax' or 'lttb' (applied to the min/max points of the chosen level)
+
+        :return: x, y arrays
+        """
+        # The range is converted to the same type as the x values before searching for its positions
+        lo = 0 if x0 is None else \
+            int(np.searchsorted(self.xf, _to_int64(np.asarray([x0], dtype=self.x.dtype))[0], side='left'))
+        hi = len(self.y) if x1 is None else \
+            int(np.searchsorted(self.xf, _to_int64(np.asarray([x1], dtype=self.x.dtype))[0], side='right'))
+
+        # Include one point either side of the range so that lines run to the edge of the plot
+        lo, hi = max(lo - 1, 0), min(hi + 1, len(self.y))
+        if hi - lo <= max_pts:
+            return self.x[lo:hi], self.y[lo:hi]
+
+        # Each bucket produces up to two points. The finest level with up to twice as many buckets as needed is used
+        # and the final selection is made from the min/max points of that level
+        target = max_pts * 2
+        size = self.factor
+        for pos_min, pos_max in self.levels:
+            b_lo, b_hi = lo // size, -(-hi // size)
+            if b_hi - b_lo <= target or size == self.factor ** len(self.levels):
+                break
+            size *= self.factor
+
+        x, y = _interleave(self.x, self.y, pos_min[b_lo:b_hi], pos_max[b_lo:b_hi])
+        if method == 'lttb':
+            return lttb(x, y, max_pts)
+
+        return minmax_downsample(x, y, max_pts)
+
+
+# The default levels of the aggregate pyramid. Each rule must be a multiple of the rule before it
+PYRAMID_RULES = ('30S', 'T', 'H', 'D', 'M')
+
+
+def _floor_times(times, rule):
+    """
+    Floors datetime64[ns] values to the start of their resampling bin. Fixed frequencies are aligned to midnight as
+    in pandas 'resample' and 'M' is treated as a calendar month.
+
+    :param times: np.ndarray of datetime64[ns] values
+    :param rule: Resampling rule (e.g. '30S', 'T', 'H', 'D', 'M')
+
+    :return: np.ndarray of datetime64[ns] bin starts
+    """
+    if rule == 'M':
+        return times.astype('datetime64[M]').astype('datetime64[ns]')
+
+    step = pd.tseries.frequencies.to_offset(rule).nanos
+    ns = times.view('i8')
+
+    return (ns - ns % step).view('datetime64[ns]')
+
+
+class AggregatePyramid:
+    """
+    This class holds count/sum/min/max aggregates of the numeric columns of a time indexed dataframe for a number of
+    resampling rules (levels). The first level is computed from the raw data and every coarser level is computed from
+    the level before it. Once built, a resampled view (e.g. df.resample('H').mean()) is returned without revisiting
+    the raw data, so the cost depends only on the size of the output.
+
+    :param df: Time indexed dataframe. Non-numeric columns are ignored
+    :param rules: The resampling rules to hold, from finest to coarsest
+    """
+
+    def __init__(self, df, rules=PYRAMID_RULES):
+
+        num_df = df.select_dtypes('number')
+        times = df.index.values.astype('datetime64[ns]')
+        vals = num_df.to_numpy(dtype=float)
+
+        # The aggregation below relies on the rows being in time order
+        if len(times) > 1 and (np.diff(times.view('i8')) < 0).any():
+            order = np.argsort(times, kind='stable')
+            times, vals = times[order], vals[order]
+
+        self.columns = list(num_df.columns)
+        self._first_ns = times[0].view('i8') if len(times) else 0
+        self._last_ns = times[-1].view('i8') if len(times) else 0
+        self.index_name = df.index.name
+        self.rules = tuple(rules)
+        self.levels = {}
+
+        # Level inputs: bin starts, number of rows, non-nan counts, sums, mins and maxs
+        nan = np.isnan(vals)
+        bins, rows = times, np.ones(len(times), dtype=np.int64)
+        count, total = (~nan).astype(np.int64), np.where(nan, 0.0, vals)
+        vmin, vmax = vals, vals
+
+        for rule in self.rules:
+            if len(bins) == 0:
+                break
+            new_bins = _floor_times(bins, rule)
+            starts = np.flatnonzero(np.r_[True, new_bins[1:] != new_bins[:-1]])
+
+            bins = new_bins[starts]
+            rows = np.add.reduceat(rows, starts)
+            count = np.add.reduceat(count, starts, axis=0)
+            total = np.add.reduceat(total, starts, axis=0)
+            vmin = np.fmin.reduceat(vmin, starts, axis=0)
+            vmax = np.fmax.reduceat(vmax, starts, axis=0)
+            self.levels[rule] = {'bins': bins, 'rows': rows, 'count': count, 'sum': total, 'min': vmin, 'max': vmax}
+
+    def _positions(self, bins, rule):
+        """
+        Determines the labels of the full (regular) range of bins and the positions of the held bins within it.
+
+        :return: labels, positions
+        """
+        if rule == 'M':
+            months = bins.astype('datetime64[M]')
+            full = np.arange(months[0], months[-1] + 1)
+
+            # Monthly resampling in pandas is labelled with the last day of the month
+            labels = ((full + 1).astype('datetime64[D]') - 1).astype('datetime64[ns]')
+            return labels, (months - months[0]).astype(np.int64)
+
+        step = pd.tseries.frequencies.to_offset(rule).nanos
+        ns = bins.view('i8')
+        pos = (ns - ns[0]) // step
+        labels = (ns[0] + np.arange(pos[-1] + 1) * step).view('datetime64[ns]')
+
+        return labels, pos
+
+    def resample(self, rule, how='mean', columns=None):
+        """
+        Returns the equivalent of df.resample(rule).<how>() from the held aggregates.
+
+        :param rule: One of the rules held by the pyramid
+        :param how: 'mean', 'sum', 'count', 'min' or 'max'
+        :param columns: Optional list of columns to return [default: all numeric columns]
+
+        :return: Resampled dataframe
+        """
+        if rule not in self.levels:
+            raise KeyError("The '{}' rule is not held in this pyramid ({})".format(rule, ', '.join(self.rules)))
+
+        level = self.levels[rule]
+        cols = self.columns if columns is None else list(columns)
+        col_idx = list(range(len(cols))) if columns is None else [self.columns.index(c) for c in cols]
+        labels, pos = self._positions(level['bins'], rule)
+
+        if how == 'mean':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                held = level['sum'][:, col_idx] / level['count'][:, col_idx]
+        else:
+            held = level[how][:, col_idx]
+
+        # Empty bins are 'nan' except for sums and counts (as in pandas)
+        fill = 0 if how in ('sum', 'count') else np.nan
+        out = np.full((len(labels), len(cols)), fill, dtype=held.dtype if how == 'count' else float)
+        out[pos] = held
+
+        return pd.DataFrame(out, index=pd.DatetimeIndex(labels, name=self.index_name), columns=cols)
+
+    def missing_times(self, freq, rule='D'):
+        """
+        Counts the timestamps that are absent from the data (time gaps) for each bin of a level, based on the
+        expected frequency of the data. Only the period between the first and last timestamps is considered.
+
+        :param freq: The expected frequency of the data (pd.Timedelta)
+        :param rule: The level to report on [default: 'D']
+
+        :return: pd.Series of missing timestamps per bin
+        """
+        level = self.levels[rule]
+        step = pd.Timedelta(freq).value
+
+        # Bins without any data are not held in the level, so the full range of bins is rebuilt first
+        if rule == 'M':
+            months = level['bins'].astype('datetime64[M]')
+            full = np.arange(months[0], months[-1] + 1)
+            pos = (months - months[0]).astype(np.int64)
+            bins = full.astype('datetime64[ns]')
+            ends = (full + 1).astype('datetime64[ns]').view('i8')
+        else:
+            width = pd.tseries.frequencies.to_offset(rule).nanos
+            bins, pos = self._positions(level['bins'], rule)
+            ends = bins.view('i8') + width
+
+        rows = np.zeros(len(bins), dtype=np.int64)
+        rows[pos] = level['rows']
+
+        # The expected timestamps lie on the grid of the first timestamp and between the first and last timestamps
+        starts = np.maximum(bins.view('i8'), self._first_ns)
+        starts = self._first_ns + -((self._first_ns - starts) // step) * step
+        ends = np.minimum(ends - 1, self._last_ns)
+        ends = self._first_ns + ((ends - self._first_ns) // step) * step
+        expected = np.maximum((ends - starts) // step + 1, 0)
+
+        return pd.Series(np.maximum(expected - rows, 0), index=pd.DatetimeIndex(bins, name=self.index_name))
+
+
+# The columns of the block (gap) table
+BLOCK_COLS = ['Parameter', 'Start', 'End', 'Gap Size', 'Solutions Method']
+
+
+def block_table(*block_dicts):
+    """
+    Flattens the block dicts of the cleaning scripts (e.g. 'fill_blocks' and 'interp_blocks', where each column holds
+    [blocks, methods] and a block is either a single position or a [start, end] list) into a single table of row
+    positions. The table is sorted by position so that the gaps of a dataset can be stepped through in time order.
+
+    :param block_dicts: Any number of dicts of blocks
+
+    :return: pd.DataFrame with the 'BLOCK_COLS' columns
+    """
+    params, starts, ends, methods = [], [], [], []
+    for blocks in block_dicts:
+        for col, (gaps, fills) in blocks.items():
+            params += [col]*len(gaps)
+            starts += [gap[0] if isinstance(gap, list) else gap for gap in gaps]
+            ends += [gap[1] if isinstance(gap, list) else gap for gap in gaps]
+            methods += list(fills)
+
+    table = pd.DataFrame({'Parameter': params,
+                          'Start': np.asarray(starts, dtype=np.int64),
+                          'End': np.asarray(ends, dtype=np.int64),
+                          'Solutions Method': methods})
+    table['Gap Size'] = table['End'] - table['Start'] + 1
+
+    return table[BLOCK_COLS].sort_values(['Start', 'Parameter'], kind='stable').reset_index(drop=True)
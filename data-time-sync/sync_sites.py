@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Syncs the data of many sites to a reference site in one run.
+
+Each file is read as in the Project LEO Time Syncing Notebook (csv/txt with the
+date/time columns at 'time-cols'), resampled once onto the grid of the
+reference and synced with 'scripts/dash_timeSync.py'. The synced sites are
+written with the reference to one columnar file and the lag of each site is
+printed, e.g.
+
+    python sync_sites.py substation.csv asset1.csv asset2.csv --column P --max-lag 3600 -o feeder.parquet
+
+A '.parquet' or '.feather' output needs pyarrow, a '.npz' output only needs numpy.
+"""
+
+import argparse
+import pathlib
+from concurrent.futures import ProcessPoolExecutor
+
+from scripts.dash_timeSync import read_site, sync_sites, write_columnar, MIN_CORR
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('reference', help='csv/txt file of the reference site')
+    parser.add_argument('sites', nargs='+', help='csv/txt files of the sites to sync')
+    parser.add_argument('--time-cols', default='0', help='positions of the date/time columns, e.g. "0, 1"')
+    parser.add_argument('--column', nargs='+', help='column of the values, one for every file or one per file '
+                                                    '(reference first) [default: the first numeric column]')
+    parser.add_argument('--freq', help='period of the common grid, e.g. "1s" [default: period of the reference]')
+    parser.add_argument('--max-lag', type=int, help='largest absolute lag searched (samples of the grid)')
+    parser.add_argument('--window', type=int, help='samples in each window to follow clock drift')
+    parser.add_argument('--step', type=int, help='samples between the start of each window')
+    parser.add_argument('--kind', default='linear', choices=['linear', 'piecewise'], help='drift model')
+    parser.add_argument('--min-corr', type=float, default=MIN_CORR, help='minimum correlation of a window')
+    parser.add_argument('--processes', type=int, help='number of processes [default: every core]')
+    parser.add_argument('-o', '--output', default='synced_sites.parquet', help='columnar output file')
+    args = parser.parse_args()
+
+    paths = [args.reference] + args.sites
+    time_cols = [int(p) for p in args.time_cols.split(',')]
+    columns = args.column or [None]
+    if len(columns) not in (1, len(paths)):
+        parser.error('--column takes one column or one per file')
+    columns = columns * len(paths) if len(columns) == 1 else columns
+
+    # The files are read in parallel and each series is named after its file
+    with ProcessPoolExecutor(max_workers=args.processes) as executor:
+        series = list(executor.map(read_site, paths, [time_cols] * len(paths), columns))
+    names = [pathlib.Path(path).stem for path in paths]
+    if len(set(names)) < len(names):
+        names = [str(pathlib.Path(path).with_suffix('')) for path in paths]
+    series = [s.rename(name) for s, name in zip(series, names)]
+
+    synced_df, lag_df = sync_sites(series[0], dict(zip(names[1:], series[1:])), args.freq, args.max_lag,
+                                   args.window, args.step, args.kind, args.min_corr, args.processes)
+
+    write_columnar(synced_df, args.output)
+    print(lag_df.to_string())
+    print('{:,} samples of {} sites written to {}'.format(len(synced_df), len(names), args.output))
+
+
+if __name__ == '__main__':
+    main()